@@ -0,0 +1,148 @@
+"""
+# 附件分析：未引用的附件和内容重复的附件
+
+查找重复文件时按以下步骤逐步缩小范围，尽量少读文件：
+
+1. 按文件大小分组，大小唯一的文件不可能重复，不读取；
+2. 同样大小的文件，先在线程池中计算开头一小块内容的哈希；
+3. 开头也相同的文件，再分块计算完整内容的哈希。
+
+"""
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Iterable, Optional, Set, Tuple
+
+from obtool.obsidian import ObVault, ObFile
+
+# 先比较的开头部分大小
+PARTIAL_SIZE = 64 * 1024
+# 计算完整哈希时每次读取的大小
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class AttachmentReport:
+    attachments: List[ObFile]                   # 所有附件（笔记以外的文件）
+    unused: List[ObFile]                        # 没有被任何笔记引用的附件
+    duplicates: List[List[ObFile]]              # 内容完全相同的附件分组
+    sizes: Dict[ObFile, int] = field(repr=False)
+    bytes_read: int = 0                         # 查找重复时实际读取的字节数
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes.values())
+
+    @property
+    def unused_size(self) -> int:
+        return sum(self.sizes[f] for f in self.unused)
+
+    @property
+    def reclaimable(self) -> int:
+        """删除重复的副本（每组保留一个）可以节省的空间"""
+        return sum(self.sizes[group[0]] * (len(group) - 1) for group in self.duplicates)
+
+
+def iter_attachments(vault: ObVault) -> Iterable[ObFile]:
+    """遍历笔记以外的所有文件"""
+    for ob_file in vault.iter_files():
+        if not ob_file.is_note():
+            yield ob_file
+
+
+def find_referenced(vault: ObVault) -> Set[ObFile]:
+    """找出被笔记引用的附件
+
+    主要是 `![[image.png]]` 这样的嵌入，普通链接 `[[file.pdf]]` 也算作引用。
+    链接的文件名如果有重名，则所有同名文件都视为被引用，宁可漏报也不误报。
+    """
+    vault.ensure_all_parsed()
+    referenced = set()
+    seen_targets = set()
+    for note in vault.iter_notes():
+        for link in note.ob_links:
+            target = link.target
+            if not target or target in seen_targets:
+                continue
+            seen_targets.add(target)
+            try:
+                found = vault.get_file(target)
+            except ValueError:  # 仓库外的路径
+                continue
+            for ob_file in found if isinstance(found, list) else [found]:
+                if ob_file.exists and not ob_file.is_note():
+                    referenced.add(ob_file)
+    return referenced
+
+
+def _hash_file(path, limit: Optional[int] = None) -> Tuple[str, int]:
+    """计算文件（开头 limit 字节）的哈希，返回哈希值和读取的字节数"""
+    h = hashlib.blake2b(digest_size=20)
+    read = 0
+    with open(path, 'rb') as f:
+        while limit is None or read < limit:
+            size = CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - read)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            h.update(chunk)
+            read += len(chunk)
+    return h.hexdigest(), read
+
+
+def _group_by_hash(executor, groups: Iterable[List[ObFile]],
+                   limit: Optional[int]) -> Tuple[List[List[ObFile]], int]:
+    """把每组文件按哈希再分组，只保留仍然有多个文件的组"""
+    groups = list(groups)
+    files = [f for group in groups for f in group]
+    results = executor.map(lambda f: _hash_file(f.path, limit), files)
+    hashes = {}
+    bytes_read = 0
+    for ob_file, (digest, read) in zip(files, results):
+        hashes[ob_file] = digest
+        bytes_read += read
+    new_groups = []
+    for group in groups:
+        by_hash = defaultdict(list)
+        for ob_file in group:
+            by_hash[hashes[ob_file]].append(ob_file)
+        new_groups.extend(g for g in by_hash.values() if len(g) > 1)
+    return new_groups, bytes_read
+
+
+def find_duplicates(files: Iterable[ObFile], sizes: Dict[ObFile, int],
+                    workers: Optional[int] = None) -> Tuple[List[List[ObFile]], int]:
+    """查找内容完全相同的文件
+
+    :return: 重复文件分组，以及实际读取的字节数
+    """
+    by_size = defaultdict(list)
+    for ob_file in files:
+        size = sizes[ob_file]
+        if size > 0:  # 空文件不算重复
+            by_size[size].append(ob_file)
+    groups = [g for g in by_size.values() if len(g) > 1]
+    if not groups:
+        return [], 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        groups, bytes_read = _group_by_hash(executor, groups, PARTIAL_SIZE)
+        # 比开头部分还小的文件已经是完整比较了
+        done = [g for g in groups if sizes[g[0]] <= PARTIAL_SIZE]
+        todo = [g for g in groups if sizes[g[0]] > PARTIAL_SIZE]
+        groups, full_read = _group_by_hash(executor, todo, None)
+    for group in done + groups:
+        group.sort(key=lambda f: f.path)
+    return done + groups, bytes_read + full_read
+
+
+def analyse_attachments(vault: ObVault, workers: Optional[int] = None) -> AttachmentReport:
+    """分析仓库中的附件"""
+    attachments = list(iter_attachments(vault))
+    sizes = {f: os.stat(f.path).st_size for f in attachments}
+    referenced = find_referenced(vault)
+    unused = [f for f in attachments if f not in referenced]
+    duplicates, bytes_read = find_duplicates(attachments, sizes, workers=workers)
+    return AttachmentReport(attachments, unused, duplicates, sizes, bytes_read)
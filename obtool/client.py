@@ -0,0 +1,100 @@
+"""
+# 查询服务的客户端
+
+`ob serve` 启动查询服务后，用这里的 `query` 或者命令行 `ob-query` 发送查询。
+客户端只依赖标准库，启动很快，适合编辑器插件等需要频繁查询的场景：
+
+    ob-query MyVault tags              所有标签及笔记数量
+    ob-query MyVault tags work         有标签 #work 的笔记
+    ob-query MyVault resolve "note#标题"
+    ob-query MyVault backlinks note
+    ob-query MyVault search 关键字
+
+结果以 JSON 格式输出。
+"""
+import argparse
+import json
+import socket
+import sys
+from pathlib import Path
+from typing import Any, Optional
+
+from obtool.utils import get_app_dir
+
+SOCKET_NAME = 'serve.sock'
+# 单个请求的最大长度
+MAX_REQUEST_SIZE = 1 << 20
+
+
+def get_socket_path() -> Path:
+    return Path(get_app_dir('obtool')).joinpath(SOCKET_NAME)
+
+
+def query(request: dict, timeout: float = 10.0, socket_path: Optional[Path] = None) -> Any:
+    """发送一个查询，返回结果
+
+    :raises ConnectionError: 查询服务没有启动
+    :raises ValueError: 查询出错，例如仓库或操作不存在
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError('当前系统不支持 Unix socket')
+    socket_path = socket_path or get_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(socket_path))
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise ConnectionError(f'查询服务没有启动，先运行 ob serve: {socket_path}')
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+    response = json.loads(b''.join(chunks))
+    if not response.get('ok'):
+        raise ValueError(response.get('error', '查询失败'))
+    return response.get('result')
+
+
+def _build_request(args) -> dict:
+    request = {'vault': args.vault, 'op': args.op}
+    value = ' '.join(args.args)
+    if args.op == 'tags':
+        if value:
+            request['tag'] = value.lstrip('#')
+    elif args.op == 'resolve':
+        request['target'] = value
+        if args.source:
+            request['source'] = args.source
+    elif args.op == 'backlinks':
+        request['name'] = value
+    elif args.op == 'search':
+        request['query'] = value
+        request['limit'] = args.limit
+    return request
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ob-query', description='向 ob serve 启动的查询服务发送查询')
+    parser.add_argument('vault', help='仓库名称')
+    parser.add_argument('op', choices=('ping', 'tags', 'resolve', 'backlinks', 'search'), help='操作')
+    parser.add_argument('args', nargs='*', help='标签、链接、笔记名称或搜索的关键字')
+    parser.add_argument('--source', help='resolve 时链接所在的笔记')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='search 返回的最大数量')
+    args = parser.parse_args(argv)
+    try:
+        result = query(_build_request(args))
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,7 @@ import os
 import sys
 from typing import List, Optional, Any
 import argparse
+import datetime
 from pathlib import Path
 
 import cmd2
@@ -15,6 +16,18 @@ from cmd2 import (
 )
 
 from obtool.obsidian import get_vaults_list, ObVault, get_uri_from_clip, ObFile
+from obtool.completion import CompletionIndex
+from obtool.export import export_vault
+from obtool.graph import export_graph, GRAPH_FORMATS
+from obtool.attachments import analyse_attachments
+from obtool.tagstats import get_cooccurrence, MEASURES
+from obtool.dupes import find_near_duplicates
+from obtool.server import run_server, POLL_INTERVAL
+from obtool.memory import measure_vault, trace_vault_load
+from obtool.recent import FileStat, SORT_KEYS, parse_since
+from obtool.noteedit import parse_value
+from obtool.snapshot import (take_snapshot, save_snapshot, load_snapshot, latest_snapshot, list_snapshots,
+                             diff_snapshots, iter_snapshot_names)
 from obtool import views
 from obtool.banner import get_banner
 
@@ -32,8 +45,28 @@ class App(cmd2.Cmd):
         self.vault: Optional[ObVault] = None
         self.vault_list = get_vaults_list()
         self._vault_cache = {}
+        self.parse_workers = 1
+        self.parse_in_processes = False
+        self.read_ahead = 0
+        self.scan_manifest = False
+        self.sharded = False
+        self.add_settable(cmd2.Settable('parse_workers', int, '并行解析笔记的数量',
+                                        self, onchange_cb=self._on_parse_setting_change))
+        self.add_settable(cmd2.Settable('parse_in_processes', bool, '使用多进程（而不是多线程）解析笔记',
+                                        self, onchange_cb=self._on_parse_setting_change))
+        self.add_settable(cmd2.Settable('read_ahead', int, '解析时预读的笔记数量（网络或同步盘上的仓库），0 表示不预读',
+                                        self, onchange_cb=self._on_parse_setting_change))
+        self.add_settable(cmd2.Settable('scan_manifest', bool,
+                                        '打开仓库时使用扫描清单，跳过没有变化的文件夹', self))
+        self.add_settable(cmd2.Settable('sharded', bool,
+                                        '按顶层文件夹分片打开仓库，用到时才加载', self))
         self.aliases['cls'] = '!cls'
         self.aliases['exit'] = 'quit'
+        self.aliases['export-graph'] = 'export_graph'
+
+    def _on_parse_setting_change(self, name, old, new):
+        for vault in self._vault_cache.values():
+            setattr(vault, name, new)
 
     def poutput(self, msg: Any = '', *, end: str = '\n') -> None:
         if isinstance(msg, str) and ansi.ANSI_STYLE_RE.match(msg):
@@ -61,18 +94,30 @@ class App(cmd2.Cmd):
         kwargs.pop('cmd2_handler')
         return kwargs
 
-    def vault_folders(self) -> List[str]:
+    def _complete_names(self, index: CompletionIndex, text: str) -> List[str]:
+        # 候选已经按匹配程度排好序了
+        self.matches_sorted = True
+        return index.complete(text)
+
+    def folder_completer(self, text, line, begidx, endidx) -> List[str]:
         if not self.vault:
             return []
-        folders = [f.relative_to(self.vault.path).as_posix() for f in self.vault.folders]
-        return folders
+        return self._complete_names(self.vault.completion.folders, text)
 
     ls_parser = Cmd2ArgumentParser()
     ls_parser.add_argument('-a', '--all', action='store_true', dest='show_all', help='展示详情')
     ls_parser.add_argument('-d', '--directory', action='store_true', dest='show_directory', help='展示文件夹')
     ls_parser.add_argument('-s', '--suffix', help='指定文件后缀，如 .png')
     ls_parser.add_argument('-t', '--tag', action='append', dest='tags', help='指定笔记标签，可多次使用')
-    ls_parser.add_argument('folder', nargs='?', choices_provider=vault_folders, help='指定文件夹')
+    ls_parser.add_argument('-w', '--where', help='按 Frontmatter 属性筛选笔记，如 "status = done and date >= 2026-01-01"')
+    ls_parser.add_argument('-o', '--order-by', help='按 Frontmatter 属性排序')
+    ls_parser.add_argument('--desc', action='store_true', help='和 --order-by 一起使用，倒序排列')
+    ls_parser.add_argument('--sort', choices=SORT_KEYS,
+                           help='按修改时间（从新到旧）、大小（从大到小）或文件名排序')
+    ls_parser.add_argument('-n', '--limit', type=int, help='排序后只显示前 N 个')
+    ls_parser.add_argument('--recent', type=int, metavar='N', help='最近修改的 N 个，同 --sort mtime -n N')
+    ls_parser.add_argument('--since', help='在这之后修改的，如 2026-10-01、7d、12h')
+    ls_parser.add_argument('folder', nargs='?', completer=folder_completer, help='指定文件夹')
 
     @with_argparser(ls_parser)
     @with_category('ObTool 命令')
@@ -91,31 +136,100 @@ class App(cmd2.Cmd):
             else:
                 self.list_vault_files(**self._kwargs(args))
 
-    def list_vault_files(self, show_all=False, suffix=None, tags=None, **kwargs):
+    def list_vault_files(self, show_all=False, suffix=None, tags=None,
+                         where=None, order_by=None, desc=False, **kwargs):
         if not self.vault:
             return
+        live = False
+        folder = kwargs.pop('folder', None)
+        sort, limit, recent, since = (kwargs.pop(k, None) for k in ('sort', 'limit', 'recent', 'since'))
+        if sort or limit or recent or since:
+            if tags or where or order_by:
+                print('--tag、--where、--order-by 选项在按修改时间、大小排序时无效，忽略。')
+            self.list_recent_files(show_all, suffix, folder, sort, limit, recent, since)
+            return
         if show_all or suffix:
+            if tags or where or order_by:
+                print('--tag、--where、--order-by 选项在显示所有文件时无效，忽略。')
+            data = self.vault.iter_files(file_type=suffix, folder=folder)
+            folder = None
+        elif where or order_by:
+            self.vault.ensure_all_parsed()
+            if where:
+                try:
+                    data = self.vault.properties.query(where)
+                except ValueError as e:
+                    print(e)
+                    return
+            else:
+                data = self.vault.iter_notes()
             if tags:
-                print('--tag 选项在显示所有文件时无效，忽略。')
-            data = self.vault.iter_files(file_type=suffix)
+                data = set(data).intersection(self.vault.find_notes_by_tags(tags, op='AND'))
+            if order_by:
+                data = self.vault.properties.sort(sorted(data, key=lambda n: n.name),
+                                                  order_by, reverse=desc)
+            else:
+                data = sorted(data, key=lambda n: n.name)
+        elif tags and not self.vault.all_parsed:
+            # 边解析边显示，指定了文件夹时只解析其中的笔记
+            # 遍历期间标签索引的快照可能还没有包含刚解析的笔记，按笔记自身的标签筛选
+            data = (n for n in self.vault.iter_parsed(self.vault.iter_notes(folder))
+                    if n.has_tags(tags))
+            live = True
+            folder = None
         elif tags:
-            self.vault.ensure_all_parsed()
             # op = 'OR' if union_result else 'AND'
             op = 'AND'
             data = self.vault.find_notes_by_tags(tags, op=op)
         else:
-            data = self.vault.iter_notes()
-        folder = kwargs.pop('folder', None)
+            data = self.vault.iter_notes(folder)
+            folder = None
         if folder:
             folder = Path(folder)
             if not folder.is_absolute():
                 folder = self.vault.path.joinpath(folder)
             data = (f for f in data if f.in_folder(folder=folder))
-        views.display_filenames(f.name for f in data)
+        if live:
+            views.display_filenames_live(f.name for f in data)
+        else:
+            views.display_filenames(f.name for f in data)
+
+    def list_recent_files(self, show_all=False, suffix=None, folder=None, sort=None,
+                          limit=None, recent=None, since=None):
+        """使用按修改时间排序的索引列出文件，不需要读取和排序所有文件的修改时间"""
+        try:
+            since_ns = parse_since(since) if since else None
+        except ValueError as e:
+            print(e)
+            return
+        if recent:
+            limit = recent if limit is None else min(limit, recent)
+        vault = self.vault
+        if folder:
+            folder = Path(folder)
+            if not folder.is_absolute():
+                folder = vault.path.joinpath(folder)
+        suffix = suffix if suffix is None or suffix.startswith('.') else '.' + suffix
+
+        def _wanted(stat: FileStat) -> bool:
+            path = stat.path
+            if suffix:
+                if path.suffix != suffix:
+                    return False
+            elif not show_all and path.suffix != '.md':
+                return False
+            return not folder or folder in path.parents
+
+        # 重新遍历一次，包括在外部（或用 edit 命令）修改、新增的文件
+        stats = vault.refresh_mtime_index().select(sort or 'mtime', limit, since_ns, _wanted)
+        views.display_file_stats(vault, stats)
 
     def get_vault(self, vault_name):
         if vault_name not in self._vault_cache:
-            vault = ObVault.open(vault_name)
+            vault = ObVault.open(vault_name, scan_manifest=self.scan_manifest, sharded=self.sharded)
+            vault.parse_workers = self.parse_workers
+            vault.parse_in_processes = self.parse_in_processes
+            vault.read_ahead = self.read_ahead
             views.setup_vault(vault)
             self._vault_cache[vault_name] = vault
         return self._vault_cache[vault_name]
@@ -143,21 +257,25 @@ class App(cmd2.Cmd):
         return self.basic_complete(text, line, begidx, endidx,
                                    match_against=vault_name_list)
 
-    def file_names(self) -> List[str]:
+    def file_name_completer(self, text, line, begidx, endidx) -> List[str]:
         if not self.vault:
             return []
-        return list(self.vault.moc.keys())
+        return self._complete_names(self.vault.completion.files, text)
 
-    def note_names(self) -> List[str]:
+    def note_name_completer(self, text, line, begidx, endidx) -> List[str]:
         if not self.vault:
             return []
-        return [n.name for n in self.vault.notes]
+        return self._complete_names(self.vault.completion.notes, text)
 
     stat_parser = Cmd2ArgumentParser()
-    stat_parser.add_argument('--name', nargs='?', choices_provider=file_names, help='笔记/文件名称')
+    stat_parser.add_argument('--name', nargs='?', completer=file_name_completer, help='笔记/文件名称')
     stat_parser.add_argument('--same-names', action='store_true', help='显示同名文件')
     stat_parser.add_argument('--tags', action='store_true', help='统计标签数量')
     stat_parser.add_argument('--back-links', action='store_true', help='统计反链（指定文件名有效）')
+    stat_parser.add_argument('--words', action='store_true', help='统计字数、链接数和阅读时间，按文件夹和标签汇总')
+    stat_parser.add_argument('--memory', action='store_true', help='统计仓库各个索引结构占用的内存')
+    stat_parser.add_argument('--trace', action='store_true', help='和 --memory 一起使用，用 tracemalloc 重新加载仓库，记录各阶段分配的内存')
+    stat_parser.add_argument('--dangling-anchors', action='store_true', help='列出指向不存在的标题或块的链接')
 
     @with_argparser(stat_parser)
     @with_category('ObTool 命令')
@@ -166,6 +284,20 @@ class App(cmd2.Cmd):
         if self.vault is None:
             print(f'先使用 vault 指定仓库')
             return
+        if args.dangling_anchors:
+            views.display_dangling_anchors(self.vault)
+            return
+        if args.memory:
+            phases = None
+            vault = self.vault
+            if args.trace:
+                vault, phases = trace_vault_load(vault.path, parse_workers=self.parse_workers,
+                                                 scan_manifest=vault.scan_manifest, sharded=vault.sharded)
+            views.display_memory_report(measure_vault(vault), phases)
+            return
+        if args.words and not args.name:
+            views.display_text_stats(self.vault)
+            return
         if not args.name:
             views.display_vault_stat(self.vault,
                                      show_tags=args.tags,
@@ -176,6 +308,111 @@ class App(cmd2.Cmd):
                                     show_back_links=args.back_links
                                     )
 
+    def tag_completer(self, text, line, begidx, endidx) -> List[str]:
+        if not self.vault:
+            return []
+        return self.basic_complete(text, line, begidx, endidx, match_against=list(self.vault.tags))
+
+    tags_parser = Cmd2ArgumentParser()
+    tags_parser.add_argument('-r', '--related', metavar='TAG', completer=tag_completer, help='显示和指定标签相关的标签')
+    tags_parser.add_argument('-m', '--measure', choices=MEASURES, default='jaccard', help='相似度')
+    tags_parser.add_argument('-n', '--limit', type=int, default=20, help='显示数量')
+
+    @with_argparser(tags_parser)
+    @with_category('ObTool 命令')
+    def do_tags(self, args):
+        """显示标签，或者和指定标签经常一起使用的标签"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        if not args.related:
+            views.display_tags(self.vault)
+            return
+        try:
+            cooccurrence = get_cooccurrence(self.vault)
+        except ImportError as e:
+            self.perror(str(e))
+            return
+        related = cooccurrence.related(args.related, limit=args.limit, measure=args.measure)
+        views.display_related_tags(args.related, related, args.measure)
+
+    dupes_parser = Cmd2ArgumentParser()
+    dupes_parser.add_argument('-t', '--threshold', type=float, default=0.8, help='相似度阈值 (0~1)，缺省 0.8')
+    dupes_parser.add_argument('-n', '--limit', type=int, default=50, help='最多显示的数量')
+
+    @with_argparser(dupes_parser)
+    @with_category('ObTool 命令')
+    def do_dupes(self, args):
+        """查找内容相近（复制粘贴、稍加修改）的笔记"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        try:
+            result = find_near_duplicates(self.vault, threshold=args.threshold)
+        except ImportError as e:
+            self.perror(str(e))
+            return
+        views.display_dupes(result, limit=args.limit)
+
+    tasks_parser = Cmd2ArgumentParser()
+    tasks_status = tasks_parser.add_mutually_exclusive_group()
+    tasks_status.add_argument('--done', action='store_const', const='done', dest='status', help='只显示已完成的任务')
+    tasks_status.add_argument('--all', action='store_const', const='all', dest='status', help='显示所有任务')
+    tasks_parser.add_argument('--overdue', action='store_true', help='只显示已逾期的任务')
+    tasks_parser.add_argument('--due', type=datetime.date.fromisoformat, metavar='YYYY-MM-DD',
+                              help='只显示在此日期之前（含）到期的任务')
+    tasks_parser.add_argument('-t', '--tag', action='append', dest='tags', default=[],
+                              completer=tag_completer, help='指定任务中的标签，可多次使用')
+    tasks_parser.add_argument('-n', '--limit', type=int, default=100, help='最多显示的数量')
+    tasks_parser.add_argument('folder', nargs='?', completer=folder_completer, help='指定文件夹')
+
+    @with_argparser(tasks_parser)
+    @with_category('ObTool 命令')
+    def do_tasks(self, args):
+        """显示仓库中的任务（`- [ ]` 复选框），缺省只显示未完成的"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        if args.folder:
+            # 只需要解析指定文件夹中的笔记
+            for _ in self.vault.iter_parsed(self.vault.iter_notes(args.folder)):
+                pass
+        else:
+            self.vault.ensure_all_parsed()
+        tasks = self.vault.tasks.query(status=args.status or 'open', due_before=args.due,
+                                       overdue=args.overdue, tags=args.tags)
+        if args.folder:
+            folder = Path(args.folder)
+            if not folder.is_absolute():
+                folder = self.vault.path.joinpath(folder)
+            tasks = [(note, task) for note, task in tasks if note.in_folder(folder=folder)]
+        views.display_tasks(tasks, limit=args.limit)
+
+    serve_parser = Cmd2ArgumentParser()
+    serve_parser.add_argument('vaults', nargs='*', help='启动时加载的仓库，缺省为当前仓库')
+    serve_parser.add_argument('-i', '--interval', type=float, default=POLL_INTERVAL,
+                              help=f'检查文件变化的间隔（秒），缺省 {POLL_INTERVAL}')
+
+    @with_argparser(serve_parser)
+    @with_category('ObTool 命令')
+    def do_serve(self, args):
+        """启动查询服务，常驻内存并通过 Unix socket 回答查询，按 Ctrl+C 停止
+
+        使用 `ob-query` 命令或 `obtool.client.query` 查询。
+        """
+        preload = args.vaults or ([self.vault.name] if self.vault else [])
+
+        def _on_ready(socket_path):
+            print(f'查询服务已启动: {socket_path}，按 Ctrl+C 停止')
+
+        try:
+            run_server(preload, poll_interval=args.interval,
+                       parse_workers=self.parse_workers, on_ready=_on_ready)
+        except KeyboardInterrupt:
+            print('查询服务已停止')
+        except (OSError, RuntimeError) as e:
+            self.perror(str(e))
+
     @with_category('ObTool 命令')
     def do_settings(self, args):
         """展示当前仓库的配置文件内容"""
@@ -184,9 +421,210 @@ class App(cmd2.Cmd):
             return
         print(self.vault.settings)
 
+    rename_parser = Cmd2ArgumentParser()
+    rename_parser.add_argument('name', completer=file_name_completer, help='笔记/文件名称')
+    rename_parser.add_argument('new_name', help='新名称，包含 / 时表示相对仓库根目录的路径')
+
+    @with_argparser(rename_parser)
+    @with_category('ObTool 命令')
+    def do_rename(self, args):
+        """重命名（移动）笔记或文件，同时更新所有链接"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        try:
+            result = self.vault.rename(args.name, args.new_name)
+        except (ValueError, OSError) as e:
+            self.perror(str(e))
+            return
+        views.display_rename_result(result)
+
+    retag_parser = Cmd2ArgumentParser()
+    retag_parser.add_argument('old', completer=tag_completer, help='原标签，子标签一起改名')
+    retag_parser.add_argument('new', help='新标签')
+    retag_parser.add_argument('-n', '--dry-run', action='store_true', help='只显示修改内容，不写入')
+    retag_parser.add_argument('-j', '--jobs', type=int, help='读写文件的线程数')
+
+    @with_argparser(retag_parser)
+    @with_category('ObTool 命令')
+    def do_retag(self, args):
+        """标签改名，修改 Frontmatter 和正文中的标签"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        try:
+            result = self.vault.rename_tag(args.old, args.new, dry_run=args.dry_run, workers=args.jobs)
+        except (ValueError, OSError) as e:
+            self.perror(str(e))
+            return
+        views.display_batch_edit_result(result, show_diff=args.dry_run)
+
+    tagedit_parser = Cmd2ArgumentParser()
+    tagedit_parser.add_argument('-a', '--add', action='append', default=[], metavar='TAG',
+                                help='加上标签（写在 Frontmatter 中），可多次使用')
+    tagedit_parser.add_argument('-r', '--remove', action='append', default=[], metavar='TAG',
+                                completer=tag_completer, help='删除标签（Frontmatter 和正文中的），可多次使用')
+    tagedit_parser.add_argument('-t', '--tag', action='append', dest='tags', default=[], completer=tag_completer,
+                                help='只修改带有这个标签的笔记，可多次使用')
+    tagedit_parser.add_argument('-f', '--folder', completer=folder_completer, help='只修改这个文件夹中的笔记')
+    tagedit_parser.add_argument('-n', '--dry-run', action='store_true', help='只显示修改内容，不写入')
+    tagedit_parser.add_argument('-j', '--jobs', type=int, help='读写文件的线程数')
+
+    @with_argparser(tagedit_parser)
+    @with_category('ObTool 命令')
+    def do_tagedit(self, args):
+        """批量给笔记加上或删除标签"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        if not args.add and not args.remove:
+            print('请使用 --add 或 --remove 指定标签')
+            return
+        kwargs = dict(dry_run=args.dry_run, workers=args.jobs)
+        try:
+            notes = self.vault.select_notes(args.folder, args.tags)
+            if args.add:
+                views.display_batch_edit_result(self.vault.tag_notes(notes, args.add, **kwargs),
+                                                show_diff=args.dry_run)
+            if args.remove:
+                views.display_batch_edit_result(self.vault.untag_notes(notes, args.remove, **kwargs),
+                                                show_diff=args.dry_run)
+        except (ValueError, OSError) as e:
+            self.perror(str(e))
+
+    propedit_parser = Cmd2ArgumentParser()
+    propedit_parser.add_argument('key', help='属性名')
+    propedit_parser.add_argument('value', nargs='?', help='属性值，按 YAML 解析，如 3、[a, b]、2026-10-01')
+    propedit_parser.add_argument('-d', '--delete', action='store_true', help='删除属性')
+    propedit_parser.add_argument('-t', '--tag', action='append', dest='tags', default=[], completer=tag_completer,
+                                 help='只修改带有这个标签的笔记，可多次使用')
+    propedit_parser.add_argument('-f', '--folder', completer=folder_completer, help='只修改这个文件夹中的笔记')
+    propedit_parser.add_argument('-n', '--dry-run', action='store_true', help='只显示修改内容，不写入')
+    propedit_parser.add_argument('-j', '--jobs', type=int, help='读写文件的线程数')
+
+    @with_argparser(propedit_parser)
+    @with_category('ObTool 命令')
+    def do_propedit(self, args):
+        """批量设置或删除笔记的 Frontmatter 属性"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        if args.delete == (args.value is not None):
+            print('请指定属性值，或者使用 --delete 删除属性')
+            return
+        value = None if args.delete else parse_value(args.value)
+        try:
+            notes = self.vault.select_notes(args.folder, args.tags)
+            result = self.vault.set_property(notes, args.key, value, dry_run=args.dry_run, workers=args.jobs)
+        except (ValueError, OSError) as e:
+            self.perror(str(e))
+            return
+        views.display_batch_edit_result(result, show_diff=args.dry_run)
+
+    export_parser = Cmd2ArgumentParser()
+    export_parser.add_argument('out_dir', help='输出目录')
+    export_parser.add_argument('-j', '--jobs', type=int, help='渲染进程数，缺省为 CPU 数量')
+    export_parser.add_argument('-f', '--force', action='store_true', help='忽略上次导出记录，全部重新渲染')
+    export_parser.add_argument('-e', '--embeds', action='store_true', help='展开嵌入的笔记 ![[...]]（在当前进程中渲染）')
+
+    @with_argparser(export_parser)
+    @with_category('ObTool 命令')
+    def do_export(self, args):
+        """导出仓库为静态 HTML 网站（增量）"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        result = export_vault(self.vault, Path(args.out_dir),
+                              workers=args.jobs, force=args.force, embeds=args.embeds)
+        views.display_export_result(result)
+
+    export_graph_parser = Cmd2ArgumentParser()
+    export_graph_parser.add_argument('out_file', help='输出文件，后缀 .graphml、.gexf 或 .jsonl')
+    export_graph_parser.add_argument('-F', '--format', choices=GRAPH_FORMATS, help='输出格式，缺省按后缀确定')
+    export_graph_parser.add_argument('--no-tags', action='store_true', help='不导出标签节点')
+    export_graph_parser.add_argument('--folders', action='store_true', help='导出文件夹节点')
+
+    @with_argparser(export_graph_parser)
+    @with_category('ObTool 命令')
+    def do_export_graph(self, args):
+        """导出链接关系图（文件、标签、文件夹和它们之间的链接），用于外部工具分析"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        try:
+            result = export_graph(self.vault, Path(args.out_file), args.format,
+                                  with_tags=not args.no_tags, with_folders=args.folders)
+        except (ValueError, OSError) as e:
+            self.perror(str(e))
+            return
+        views.display_graph_export_result(result)
+
+    def snapshot_completer(self, text, line, begidx, endidx) -> List[str]:
+        if not self.vault:
+            return []
+        return [name for name in iter_snapshot_names(self.vault.path) if name.startswith(text)]
+
+    diff_parser = Cmd2ArgumentParser()
+    diff_parser.add_argument('old', nargs='?', completer=snapshot_completer, help='原快照，缺省为最近保存的快照')
+    diff_parser.add_argument('new', nargs='?', completer=snapshot_completer, help='新快照，缺省为仓库当前的状态')
+    diff_parser.add_argument('-s', '--save', nargs='?', const='', metavar='NAME',
+                             help='保存仓库当前状态的快照，缺省用当前时间命名')
+    diff_parser.add_argument('-l', '--list', action='store_true', help='列出保存的快照')
+    diff_parser.add_argument('-n', '--limit', type=int, default=100, help='每一类变化最多显示的数量')
+
+    @with_argparser(diff_parser)
+    @with_category('ObTool 命令')
+    def do_diff(self, args):
+        """比较仓库快照：新增、删除、修改、移动的文件，以及增加、减少的标签和链接"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        vault = self.vault
+        if args.list:
+            views.display_snapshot_list(list_snapshots(vault.path))
+            return
+        try:
+            latest = latest_snapshot(vault.path)
+            current = None
+            if args.save is not None:
+                current = take_snapshot(vault, args.save or None, previous=latest)
+                save_snapshot(vault.path, current)
+                print(f'已保存快照 {current.name}（{len(current.entries)} 个文件，读取 {current.hashed} 个）')
+                if args.old is None:
+                    return
+            old = load_snapshot(vault.path, args.old) if args.old else latest
+            if old is None:
+                print('还没有保存快照，使用 diff --save 保存。')
+                return
+            if args.new:
+                new = load_snapshot(vault.path, args.new)
+            else:
+                new = current or take_snapshot(vault, '当前', previous=latest)
+        except ValueError as e:
+            self.perror(str(e))
+            return
+        views.display_snapshot_diff(diff_snapshots(old, new), limit=args.limit)
+
+    attachments_parser = Cmd2ArgumentParser()
+    attachments_parser.add_argument('-u', '--unused', action='store_true', help='列出未被引用的附件')
+    attachments_parser.add_argument('-d', '--duplicates', action='store_true', help='列出内容重复的附件')
+    attachments_parser.add_argument('-j', '--jobs', type=int, help='计算哈希的线程数')
+
+    @with_argparser(attachments_parser)
+    @with_category('ObTool 命令')
+    def do_attachments(self, args):
+        """分析附件：未引用的附件和内容重复的附件"""
+        if self.vault is None:
+            print(f'先使用 vault 指定仓库')
+            return
+        report = analyse_attachments(self.vault, workers=args.jobs)
+        views.display_attachment_report(report,
+                                        show_unused=args.unused,
+                                        show_duplicates=args.duplicates)
+
     edit_parser = Cmd2ArgumentParser()
     edit_parser.add_argument(
-        'name', nargs=argparse.OPTIONAL, choices_provider=note_names, help="要打开的笔记名",
+        'name', nargs=argparse.OPTIONAL, completer=note_name_completer, help="要打开的笔记名",
     )
 
     @with_category('ObTool 命令')
@@ -0,0 +1,230 @@
+"""
+# 名称补全索引
+
+命令行补全时，每次都从仓库生成完整的名称列表再逐个比较，名称很多时会明显卡顿。
+这里把名称保存在前缀树中，随仓库映射增量更新：
+
+- 前缀匹配（忽略大小写）直接定位到前缀节点，按长度从短到长取前 N 个；
+- 前缀匹配不够时，再用子序列（模糊）匹配补充，按匹配的紧凑程度排序。
+  每个字符记录含有它的名称（倒排），模糊匹配只检查含有查询中所有字符的名称，不扫描全部名称。
+
+"""
+import heapq
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from obtool.utils import locked
+
+# 补全时缺省返回的候选数量
+DEFAULT_LIMIT = 50
+
+
+class PrefixTrie:
+    """前缀树
+
+    节点是 dict，子节点以字符为 key，`None` 为 key 时保存以该节点结尾的单词及其计数。
+    """
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: dict = {}
+        self._size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and None in node
+
+    def _find(self, prefix: str) -> Optional[dict]:
+        node = self._root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def add(self, word: str):
+        node = self._root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        if None not in node:
+            node[None] = 0
+            self._size += 1
+        node[None] += 1
+
+    def remove(self, word: str):
+        """移除单词，同一单词添加多次则要移除同样次数"""
+        path = []
+        node = self._root
+        for ch in word:
+            path.append((node, ch))
+            node = node.get(ch)
+            if node is None:
+                return
+        if None not in node:
+            return
+        node[None] -= 1
+        if node[None] > 0:
+            return
+        del node[None]
+        self._size -= 1
+        # 删除不再使用的节点
+        for parent, ch in reversed(path):
+            if parent[ch]:
+                break
+            del parent[ch]
+
+    def iter_prefix(self, prefix: str) -> Iterable[str]:
+        """按长度从短到长遍历以 prefix 开头的单词"""
+        node = self._find(prefix)
+        if node is None:
+            return
+        queue = deque([(prefix, node)])
+        while queue:
+            word, node = queue.popleft()
+            if None in node:
+                yield word
+            for ch in sorted(k for k in node if k is not None):
+                queue.append((word + ch, node[ch]))
+
+
+def _min_span(key: str, pattern: str) -> Optional[Tuple[int, int]]:
+    """pattern 作为子序列在 key 中最短的匹配：(跨度, 起始位置)，不匹配返回 None"""
+    best = None
+    start = key.find(pattern[0])
+    while start >= 0:
+        end = start
+        for ch in pattern[1:]:
+            end = key.find(ch, end + 1)
+            if end < 0:
+                # 从更靠后的位置开始也不可能匹配
+                return best
+        # 从结尾向前收紧起始位置
+        first = end
+        for ch in reversed(pattern[:-1]):
+            first = key.rfind(ch, start, first)
+        span = (end - first + 1, first)
+        if best is None or span < best:
+            best = span
+        start = key.find(pattern[0], first + 1)
+    return best
+
+
+class CompletionIndex:
+    """名称补全索引
+
+    前缀树中保存的是小写的名称，再映射回原始名称。
+    修改（随仓库映射）和查询（例如查询服务）可能在不同的线程中，都在 `_lock` 中进行。
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._trie = PrefixTrie()
+        self._names: Dict[str, Dict[str, int]] = {}   # 小写名称 -> {原始名称: 计数}
+        self._chars: Dict[str, Set[str]] = {}         # 字符 -> 含有这个字符的小写名称
+        self._lock = threading.RLock()
+        for name in names:
+            self.add(name)
+
+    @locked
+    def __len__(self):
+        return sum(len(v) for v in self._names.values())
+
+    @locked
+    def __contains__(self, name):
+        return name in self._names.get(name.casefold(), ())
+
+    @locked
+    def add(self, name: str):
+        key = name.casefold()
+        originals = self._names.get(key)
+        if originals is None:
+            originals = self._names[key] = {}
+            for ch in set(key):
+                self._chars.setdefault(ch, set()).add(key)
+        originals[name] = originals.get(name, 0) + 1
+        self._trie.add(key)
+
+    @locked
+    def remove(self, name: str):
+        key = name.casefold()
+        originals = self._names.get(key)
+        if not originals or name not in originals:
+            return
+        originals[name] -= 1
+        if originals[name] == 0:
+            del originals[name]
+        if not originals:
+            del self._names[key]
+            for ch in set(key):
+                keys = self._chars[ch]
+                keys.discard(key)
+                if not keys:
+                    del self._chars[ch]
+        self._trie.remove(key)
+
+    @locked
+    def prefix(self, text: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """前缀匹配，短的在前"""
+        result = []
+        for key in self._trie.iter_prefix(text.casefold()):
+            originals = self._names[key]
+            # 大小写完全匹配的优先
+            result.extend(sorted(originals, key=lambda n: not n.startswith(text)))
+            if len(result) >= limit:
+                break
+        return result[:limit]
+
+    @locked
+    def fuzzy(self, text: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """子序列匹配：text 中的字符按顺序出现在名称中
+
+        按最短的匹配跨度、起始位置、名称长度排序，跨度越小说明匹配越紧凑。
+        只检查含有 text 中所有字符的名称（倒排集合的交集，从最小的集合开始）。
+        """
+        if not text:
+            return []
+        pattern = text.casefold()
+        postings = []
+        for ch in set(pattern):
+            keys = self._chars.get(ch)
+            if not keys:
+                return []
+            postings.append(keys)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        scored = []
+        for key in candidates:
+            span = _min_span(key, pattern)
+            if span is not None:
+                scored.append((*span, len(key), key))
+        result = []
+        for *_, key in heapq.nsmallest(limit, scored):
+            result.extend(sorted(self._names[key]))
+        return result[:limit]
+
+    @locked
+    def complete(self, text: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """补全候选：先前缀匹配，不够再用模糊匹配补充"""
+        result = self.prefix(text, limit)
+        if len(result) < limit and text:
+            seen = set(result)
+            for name in self.fuzzy(text, limit):
+                if name not in seen:
+                    result.append(name)
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+class VaultCompletion:
+    """仓库的补全索引：文件名（仓库映射的 key）、笔记名、文件夹"""
+
+    def __init__(self):
+        self.files = CompletionIndex()
+        self.notes = CompletionIndex()
+        self.folders = CompletionIndex()
@@ -0,0 +1,280 @@
+"""
+# 查找内容相近的笔记（MinHash + LSH）
+
+1. 逐段读取笔记正文，切分为词（中日韩文字每个字算一个词），相邻的 `SHINGLE_SIZE` 个词组成一个片段，
+   不需要解析笔记，也不需要把整篇笔记读入内存；
+2. 对每篇笔记的片段集合计算 MinHash 签名，片段哈希按批（每批最多 `BATCH_SHINGLES` 个，
+   可以包括多篇小笔记，或者一篇大笔记的一部分）向量化计算，再用 `np.minimum` 合并到签名中，内存占用有上限；
+3. 把签名分成若干段（band），任何一段完全相同的笔记成为候选对，
+   这样不需要两两比较所有笔记；
+4. 候选对再用签名估算 Jaccard 相似度，超过阈值的作为结果。
+
+签名保存在仓库的缓存目录中，再次运行时只计算有变化的笔记。
+
+需要安装 NumPy。
+"""
+import itertools
+import re
+import zlib
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from obtool.obmark import iter_note_body
+from obtool.obsidian import ObVault, ObNote
+from obtool.utils import get_cache_dir
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 16                      # BANDS * ROWS == NUM_PERM
+ROWS = NUM_PERM // BANDS
+BATCH_SHINGLES = 1 << 15        # 每批计算的片段数量上限，控制内存
+SIGNATURES_FILE = 'minhash.npz'
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SEED = 20220101
+
+_TOKEN_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|\w+')
+_NON_WORD_RE = re.compile(r'\W')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('查找相似笔记需要安装 numpy: pip install numpy')
+
+
+def _iter_tokens(chunks: Iterable[str]) -> Iterator[str]:
+    """逐段切分为词，段尾可能没有结束的词留到下一段"""
+    rest = ''
+    for chunk in chunks:
+        text = rest + chunk.casefold()
+        # 从段尾往前找到第一个不是词的字符
+        m = _NON_WORD_RE.search(text[::-1])
+        cut = len(text) - m.start() if m else 0
+        if cut == 0 and len(text) > BATCH_SHINGLES:
+            # 很长的一个“词”，不再等待
+            cut = len(text)
+        rest = text[cut:]
+        yield from _TOKEN_RE.findall(text, 0, cut)
+    if rest:
+        yield from _TOKEN_RE.findall(rest)
+
+
+def iter_shingle_hashes(chunks: Iterable[str], k: int = SHINGLE_SIZE,
+                        batch: int = BATCH_SHINGLES) -> Iterator[List[int]]:
+    """正文的片段哈希，每次最多返回 batch 个（可能有重复，不影响 MinHash）"""
+    window: deque = deque(maxlen=k)
+    hashes = []
+    for token in _iter_tokens(chunks):
+        window.append(token)
+        if len(window) == k:
+            hashes.append(zlib.crc32(' '.join(window).encode('utf-8')))
+            if len(hashes) >= batch:
+                yield hashes
+                hashes = []
+    if hashes:
+        yield hashes
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> 'np.ndarray':
+    """笔记正文的片段哈希（去重后的 uint64 数组）"""
+    hashes = {h for chunk in iter_shingle_hashes([text], k) for h in chunk}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def _permutations():
+    rng = np.random.RandomState(_SEED)
+    a = rng.randint(1, _MAX_HASH, size=NUM_PERM, dtype=np.uint64)
+    b = rng.randint(0, _MAX_HASH, size=NUM_PERM, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+
+class MinHasher:
+    """累积片段哈希，按批计算 MinHash 签名
+
+    每批的片段总数不超过 `BATCH_SHINGLES`，一篇笔记的片段可以分在多批中，
+    每批的结果用 `np.minimum` 合并到签名中。
+    """
+
+    def __init__(self, n: int):
+        self.signatures = np.full((n, NUM_PERM), _MAX_HASH, dtype=np.uint32)
+        self.counts = np.zeros(n, dtype=np.int64)      # 每篇笔记的片段数量，为 0 的没有签名
+        self._a, self._b = _permutations()
+        self._rows: List[int] = []
+        self._values: List[List[int]] = []
+        self._size = 0
+
+    def add(self, row: int, hashes: List[int]):
+        """添加第 row 篇笔记的片段哈希"""
+        while hashes:
+            part = hashes[:BATCH_SHINGLES - self._size]
+            hashes = hashes[len(part):]
+            self._rows.append(row)
+            self._values.append(part)
+            self._size += len(part)
+            self.counts[row] += len(part)
+            if self._size >= BATCH_SHINGLES:
+                self.flush()
+
+    def flush(self):
+        if not self._size:
+            return
+        # 哈希值限制在 32 位，a、b 也小于 2^32，a * x + b < 2^64 不会溢出，
+        # 对梅森素数取模之后才是有效的 (a * x + b) mod p 哈希
+        values = np.fromiter(itertools.chain.from_iterable(self._values), dtype=np.uint64,
+                             count=self._size) & np.uint64(_MAX_HASH)
+        offsets = np.cumsum([0] + [len(v) for v in self._values[:-1]])
+        # 原地计算，每批只占用一个 (NUM_PERM, BATCH_SHINGLES) 的数组
+        hv = self._a * values[None, :]
+        hv += self._b
+        hv %= np.uint64(_MERSENNE_PRIME)
+        hv &= np.uint64(_MAX_HASH)
+        mins = np.minimum.reduceat(hv, offsets, axis=1).T.astype(np.uint32)
+        np.minimum.at(self.signatures, np.array(self._rows), mins)
+        self._rows = []
+        self._values = []
+        self._size = 0
+
+
+def minhash_batch(shingle_sets: List['np.ndarray']) -> 'np.ndarray':
+    """批量计算 MinHash 签名，每个集合都不能为空
+
+    :return: (len(shingle_sets), NUM_PERM) 的 uint32 数组
+    """
+    hasher = MinHasher(len(shingle_sets))
+    for row, shingles in enumerate(shingle_sets):
+        hasher.add(row, shingles.tolist())
+    hasher.flush()
+    return hasher.signatures
+
+
+@dataclass
+class SignatureStore:
+    """持久化的签名：路径 -> (大小, 修改时间, 签名)"""
+    paths: List[str]
+    stats: 'np.ndarray'         # (n, 2) int64: size, mtime_ns
+    signatures: 'np.ndarray'    # (n, NUM_PERM) uint32
+
+    @classmethod
+    def load(cls, path: Path) -> 'SignatureStore':
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if data['signatures'].shape[1:] != (NUM_PERM,):
+                    raise ValueError
+                return cls(list(data['paths']), data['stats'], data['signatures'])
+        except (OSError, ValueError, KeyError):
+            return cls([], np.empty((0, 2), dtype=np.int64),
+                       np.empty((0, NUM_PERM), dtype=np.uint32))
+
+    def save(self, path: Path):
+        np.savez_compressed(path, paths=np.array(self.paths, dtype=str),
+                            stats=self.stats, signatures=self.signatures)
+
+
+@dataclass
+class DupesResult:
+    pairs: List[Tuple[ObNote, ObNote, float]]   # 相似的笔记对及估算的相似度
+    notes: int          # 参与比较的笔记数量
+    computed: int       # 本次重新计算签名的笔记数量
+    candidates: int     # LSH 得到的候选对数量
+
+
+def _note_stat(note: ObNote) -> Tuple[int, int]:
+    st = note.path.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+def compute_signatures(vault: ObVault) -> Tuple[List[ObNote], 'np.ndarray', int]:
+    """计算（或从缓存读取）所有笔记的签名
+
+    :return: 有签名的笔记、签名数组、本次重新计算的数量
+    """
+    _require_numpy()
+    store_path = get_cache_dir(vault.path).joinpath(SIGNATURES_FILE)
+    store = SignatureStore.load(store_path)
+    cached: Dict[str, int] = {p: i for i, p in enumerate(store.paths)}
+
+    notes = []
+    stats = []
+    rows: List[Optional[int]] = []
+    changed = []
+    for note in vault.iter_notes():
+        rel = note.path.relative_to(vault.path).as_posix()
+        stat = _note_stat(note)
+        i = cached.get(rel)
+        if i is not None and tuple(store.stats[i]) == stat:
+            rows.append(i)
+        else:
+            rows.append(None)
+            changed.append(len(notes))
+        notes.append(note)
+        stats.append(stat)
+
+    # 只读取有变化的笔记，逐段读取，大笔记也一样
+    hasher = MinHasher(len(changed))
+    for j, k in enumerate(changed):
+        for hashes in iter_shingle_hashes(iter_note_body(notes[k].path)):
+            hasher.add(j, hashes)
+    hasher.flush()
+    new_rows = {k: j for j, k in enumerate(changed) if hasher.counts[j]}
+
+    keep = []
+    signatures = []
+    for k, note in enumerate(notes):
+        if rows[k] is not None:
+            signatures.append(store.signatures[rows[k]])
+        elif k in new_rows:
+            signatures.append(hasher.signatures[new_rows[k]])
+        else:
+            # 内容太短，没有签名
+            continue
+        keep.append(k)
+    signatures = np.array(signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+
+    SignatureStore(
+        [notes[k].path.relative_to(vault.path).as_posix() for k in keep],
+        np.array([stats[k] for k in keep], dtype=np.int64).reshape(-1, 2),
+        signatures,
+    ).save(store_path)
+    return [notes[k] for k in keep], signatures, len(changed)
+
+
+def candidate_pairs(signatures: 'np.ndarray') -> set:
+    """LSH：任意一段签名完全相同的笔记作为候选对"""
+    pairs = set()
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        band_sigs = np.ascontiguousarray(signatures[:, band * ROWS:(band + 1) * ROWS])
+        for i, row in enumerate(band_sigs):
+            buckets[row.tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) > 1:
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pairs.add((members[x], members[y]))
+    return pairs
+
+
+def find_near_duplicates(vault: ObVault, threshold: float = 0.8) -> DupesResult:
+    """查找内容相近的笔记
+
+    :param threshold: 估算的 Jaccard 相似度阈值
+    """
+    notes, signatures, computed = compute_signatures(vault)
+    pairs = candidate_pairs(signatures)
+    result = []
+    if pairs:
+        left, right = np.array(sorted(pairs)).T
+        similarity = (signatures[left] == signatures[right]).mean(axis=1)
+        for i, j, s in zip(left, right, similarity):
+            if s >= threshold:
+                result.append((notes[i], notes[j], float(s)))
+    result.sort(key=lambda p: p[2], reverse=True)
+    return DupesResult(result, len(notes), computed, len(pairs))
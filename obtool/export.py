@@ -0,0 +1,275 @@
+"""
+# 把笔记库导出为静态 HTML 网站
+
+- 笔记渲染为 `.html`，内部链接通过仓库的文件映射解析为真实的相对路径，
+  标题和块 ID 生成 `id`，作为 `[[note#标题]]`、`[[note#^块]]` 链接的目标；标签不生成页面，只是 <span>；
+- 附件原样复制；
+- 渲染在多个进程中并行执行；
+- 增量构建：只有内容变化的笔记，以及链接目标发生变化的笔记才会重新渲染；
+- 可选展开嵌入的笔记（`embeds=True`，见 `obtool.transclusion`），在当前进程中渲染以共享片段缓存，
+  嵌入的笔记（包括嵌套嵌入的）变化时重新渲染。
+
+"""
+import functools
+import html
+import json
+import posixpath
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import frontmatter
+
+from obtool.obmark import ObMarkdown, ObLink, WIKILINK_RE, anchor_id
+from obtool.obsidian import ObVault, ObFile, ObNote
+from obtool.transclusion import Transcluder, TransclusionStats
+
+# 记录上次导出状态的文件，放在输出目录下
+EXPORT_MANIFEST = '.obtool-export.json'
+MANIFEST_VERSION = 2
+
+PAGE_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+<article>
+{body}
+</article>
+</body>
+</html>
+"""
+
+# 导出时不生成标签页面，标签渲染为 <span>
+TAG_CONFIG = {'as_link': False}
+
+
+@dataclass
+class ExportResult:
+    out_dir: Path
+    rendered: List[str] = field(default_factory=list)   # 重新渲染的笔记
+    skipped: int = 0        # 没有变化而跳过的笔记数量
+    copied: int = 0         # 复制的附件数量
+    removed: int = 0        # 删除的过期输出文件数量
+    embeds: Optional[TransclusionStats] = None  # 展开嵌入时的片段计数
+
+
+def output_path_of(rel: str) -> str:
+    """源文件相对路径对应的输出路径，笔记替换后缀为 `.html`"""
+    return rel[:-3] + '.html' if rel.endswith('.md') else rel
+
+
+def output_path(ob_file: ObFile) -> str:
+    """文件在导出目录中的相对路径（posix 格式）"""
+    return output_path_of(ob_file.path.relative_to(ob_file.vault.path).as_posix())
+
+
+def _file_sig(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def scan_link_targets(note: ObNote) -> List[str]:
+    """笔记中所有链接的目标名称
+
+    已经解析过的笔记直接使用解析结果，否则用正则快速扫描原文，
+    这里只需要目标名称，多出来的（例如代码块中的）也没有关系。
+    """
+    if note.parsed:
+        labels = note.links
+    else:
+        labels = WIKILINK_RE.findall(note.path.read_text(encoding='utf-8'))
+    return sorted({ObLink.from_label(label).target for label in labels})
+
+
+def _build_href(hrefs: Dict[str, str], label: str, base: str, end: str) -> str:
+    """作为 `ObsidianLinkExtension` 的 `build_url` 使用"""
+    href = hrefs.get(label.rstrip('\\').strip())
+    if href is None:
+        # 未创建的笔记
+        return '#'
+    if end.startswith('#'):
+        href += '#' + quote(anchor_id(end[1:]))
+    return href
+
+
+def _render_note(job: Tuple[str, str, str, Dict[str, str]]) -> str:
+    """渲染一篇笔记并写入输出文件，在子进程中运行"""
+    src, dst, title, hrefs = job
+    with open(src, 'r', encoding='utf-8') as f:
+        post = frontmatter.load(f)
+    link_config = {
+        'base_url': '',
+        'end_url': '',
+        'build_url': functools.partial(_build_href, hrefs),
+    }
+    body = ObMarkdown(link_config=link_config, tag_config=TAG_CONFIG, anchors=True).convert(post.content)
+    _write_page(Path(dst), title, body)
+    return src
+
+
+def _write_page(dst: Path, title: str, body: str):
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.write_text(PAGE_TEMPLATE.format(title=html.escape(title), body=body),
+                   encoding='utf-8')
+
+
+def _page_href(vault: ObVault, note_dir: str, source: Optional[ObNote], target: str, end: str) -> str:
+    """展开嵌入时页面中的链接地址，链接可能来自嵌入的其它笔记"""
+    linked = vault.resolve_target(target, source)
+    if linked is None:
+        return '#'
+    href = quote(posixpath.relpath(output_path(linked), note_dir or '.'))
+    if end.startswith('#'):
+        href += '#' + quote(anchor_id(end[1:]))
+    return href
+
+
+def _render_with_embeds(transcluder: Transcluder, job: Tuple[ObNote, Path]) -> str:
+    note, dst = job
+    note_dir = posixpath.dirname(output_path(note))
+    body = transcluder.render(note, functools.partial(_page_href, transcluder.vault, note_dir))
+    _write_page(dst, note.name, body)
+    return str(note.path)
+
+
+def _embed_sigs(vault: ObVault, sources: Dict[Path, object]) -> Dict[str, Optional[List[int]]]:
+    return {p.relative_to(vault.path).as_posix(): list(sig) if sig else None
+            for p, sig in sources.items()}
+
+
+def _load_manifest(out_dir: Path) -> dict:
+    manifest_path = out_dir.joinpath(EXPORT_MANIFEST)
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def export_vault(vault: ObVault, out_dir: Path, workers: Optional[int] = None,
+                 force=False, progress_bar=None, embeds=False) -> ExportResult:
+    """导出整个仓库为静态 HTML
+
+    :param vault: 笔记仓库
+    :param out_dir: 输出目录
+    :param workers: 渲染进程数，缺省为 CPU 数量，1 表示在当前进程渲染
+    :param force: 忽略上次导出的记录，全部重新渲染
+    :param progress_bar: 进度条
+    :param embeds: 展开嵌入的笔记，此时 `workers` 无效
+    """
+    out_dir = Path(out_dir).absolute()
+    try:
+        out_dir.relative_to(vault.path)
+    except ValueError:
+        pass
+    else:
+        raise ValueError(f'输出目录不能在仓库内：{out_dir}')
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    old = {} if force else _load_manifest(out_dir)
+    if old.get('embeds', False) != embeds:
+        # 是否展开嵌入和上次不同，全部重新渲染
+        old = {}
+    old_notes = old.get('notes', {})
+    old_files = old.get('files', {})
+    result = ExportResult(out_dir)
+    notes = {}
+    files = {}
+    jobs = []
+    embed_jobs = []
+    transcluder = Transcluder(vault) if embeds else None
+    if transcluder:
+        result.embeds = transcluder.stats
+
+    for ob_file in vault.iter_files():
+        rel = ob_file.path.relative_to(vault.path).as_posix()
+        dst = out_dir.joinpath(output_path(ob_file))
+        sig = _file_sig(ob_file.path)
+        if not ob_file.is_note():
+            files[rel] = sig
+            if old_files.get(rel) != sig or not dst.exists():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(ob_file.path, dst)
+                result.copied += 1
+            continue
+
+        note = ob_file
+        prev = old_notes.get(rel)
+        changed = prev is None or prev['sig'] != sig or not dst.exists()
+        # 内容没变则链接也没变，直接沿用上次记录的链接目标
+        targets = scan_link_targets(note) if changed else list(prev['deps'])
+        deps = {}
+        hrefs = {}
+        note_dir = posixpath.dirname(output_path(note))
+        for target in targets:
+            linked = vault.resolve_target(target, note)
+            if linked is None:
+                deps[target] = None
+                continue
+            linked_rel = output_path(linked)
+            deps[target] = [linked_rel, _file_sig(linked.path)]
+            hrefs[target] = quote(posixpath.relpath(linked_rel, note_dir or '.'))
+        notes[rel] = {'sig': sig, 'deps': deps}
+        if transcluder:
+            # 上次渲染时嵌入的笔记，没有记录（上次没有展开嵌入）的需要重新渲染
+            prev_embeds = prev.get('embeds') if prev else None
+            notes[rel]['embeds'] = prev_embeds
+            changed = changed or prev_embeds is None or any(
+                _file_sig(vault.path.joinpath(p)) != s for p, s in prev_embeds.items())
+        if changed or prev['deps'] != deps:
+            jobs.append((str(note.path), str(dst), note.name, hrefs))
+            embed_jobs.append((note, dst))
+        else:
+            result.skipped += 1
+
+    # 仓库中已经不存在的文件，删除对应的输出
+    stale = [output_path_of(rel) for rel in old_notes.keys() - notes.keys()]
+    stale += [rel for rel in old_files.keys() - files.keys()]
+    for rel in stale:
+        try:
+            out_dir.joinpath(rel).unlink()
+        except FileNotFoundError:
+            continue
+        result.removed += 1
+
+    progress_bar = progress_bar or vault.progress_bar
+    if transcluder:
+        # 片段缓存在进程内共享，不使用进程池
+        rendered = map(functools.partial(_render_with_embeds, transcluder), embed_jobs)
+        executor = None
+    elif workers == 1 or len(jobs) <= 1:
+        rendered = map(_render_note, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        rendered = executor.map(_render_note, jobs, chunksize=8)
+    try:
+        if progress_bar and jobs:
+            rendered = progress_bar(rendered, total=len(jobs))
+        for src in rendered:
+            result.rendered.append(src)
+    finally:
+        if executor:
+            executor.shutdown()
+    if transcluder:
+        for note, _ in embed_jobs:
+            rel = note.path.relative_to(vault.path).as_posix()
+            sources = transcluder.sources_of(note)
+            sources.pop(note.path, None)
+            notes[rel]['embeds'] = _embed_sigs(vault, sources)
+
+    manifest = {'version': MANIFEST_VERSION, 'embeds': embeds, 'notes': notes, 'files': files}
+    out_dir.joinpath(EXPORT_MANIFEST).write_text(json.dumps(manifest), encoding='utf-8')
+    return result
@@ -0,0 +1,284 @@
+"""
+# 导出链接关系图
+
+把仓库导出为图，用于在 Gephi、Cytoscape、NetworkX 等外部工具中分析：
+
+- 节点：文件（笔记和附件），可选标签、文件夹；
+- 边：笔记的链接（解析为实际的文件，找不到目标的链接不导出）、嵌入，
+  笔记 -> 标签、子标签 -> 父标签，文件 -> 所在的文件夹、文件夹 -> 上级文件夹。
+
+支持 GraphML、GEXF 和 JSON Lines（每行一个节点或一条边）三种格式。
+写入是流式的：先逐个写出所有节点，再逐篇笔记写出它的边，不在内存中保存整个图，
+边的数量再多内存占用也不会增长。节点的 ID 是文件的相对路径，
+`tag:` 和 `folder:` 开头的分别是标签和文件夹，写边时不需要查表。
+
+链接和标签使用仓库已有的解析结果（没有解析的笔记先解析），文件大小使用 `ObVault.mtime_index`。
+"""
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, TextIO, Tuple
+from html import escape
+
+from obtool.obsidian import ObVault, ObNote
+
+GRAPH_FORMATS = ('graphml', 'gexf', 'jsonl')
+_SUFFIXES = {'.graphml': 'graphml', '.gexf': 'gexf', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# 节点和边的属性：名称 -> 类型
+NODE_ATTRS: Dict[str, str] = {
+    'kind': 'string',       # note、file、tag、folder
+    'label': 'string',
+    'size': 'long',         # 文件大小
+    'tags': 'int',          # 笔记的标签数量
+    'links': 'int',         # 笔记的链接数量
+    'words': 'int',         # 笔记的字数
+    'notes': 'int',         # 使用标签的笔记数量
+}
+EDGE_ATTRS: Dict[str, str] = {
+    'kind': 'string',       # link、embed、tag、parent、in
+}
+_GEXF_TYPES = {'string': 'string', 'long': 'long', 'int': 'integer'}
+
+Attrs = Dict[str, object]
+
+
+def _quote(value: object) -> str:
+    """XML 属性值，数字不需要转义"""
+    if isinstance(value, int):
+        return f'"{value}"'
+    return f'"{escape(str(value))}"'
+
+
+class GraphWriter:
+    """流式写出节点和边，所有节点必须在边之前写出"""
+
+    def __init__(self, out: TextIO):
+        self.out = out
+
+    def begin(self):
+        pass
+
+    def node(self, node_id: str, attrs: Attrs):
+        raise NotImplementedError
+
+    def begin_edges(self):
+        pass
+
+    def edge(self, edge_id: int, source: str, target: str, attrs: Attrs):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+
+class GraphMLWriter(GraphWriter):
+
+    def begin(self):
+        w = self.out.write
+        w('<?xml version="1.0" encoding="UTF-8"?>\n')
+        w('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for name, kind in NODE_ATTRS.items():
+            w(f'  <key id="n_{name}" for="node" attr.name="{name}" attr.type="{kind}"/>\n')
+        for name, kind in EDGE_ATTRS.items():
+            w(f'  <key id="e_{name}" for="edge" attr.name="{name}" attr.type="{kind}"/>\n')
+        w('  <graph edgedefault="directed">\n')
+
+    @staticmethod
+    def _data(prefix: str, attrs: Attrs) -> str:
+        return ''.join(f'<data key="{prefix}_{k}">{escape(str(v), quote=False)}</data>'
+                       for k, v in attrs.items() if v is not None)
+
+    def node(self, node_id: str, attrs: Attrs):
+        self.out.write(f'    <node id={_quote(node_id)}>{self._data("n", attrs)}</node>\n')
+
+    def edge(self, edge_id: int, source: str, target: str, attrs: Attrs):
+        self.out.write(f'    <edge id="e{edge_id}" source={_quote(source)} target={_quote(target)}>'
+                       f'{self._data("e", attrs)}</edge>\n')
+
+    def end(self):
+        self.out.write('  </graph>\n</graphml>\n')
+
+
+class GEXFWriter(GraphWriter):
+    """GEXF 1.3，`label` 是节点自身的属性，其它的是自定义属性"""
+
+    def begin(self):
+        w = self.out.write
+        w('<?xml version="1.0" encoding="UTF-8"?>\n')
+        w('<gexf xmlns="http://gexf.net/1.3" version="1.3">\n')
+        w('  <graph defaultedgetype="directed">\n')
+        for cls, attrs in (('node', NODE_ATTRS), ('edge', EDGE_ATTRS)):
+            w(f'    <attributes class="{cls}">\n')
+            for name, kind in attrs.items():
+                if name != 'label':
+                    w(f'      <attribute id="{name}" title="{name}" type="{_GEXF_TYPES[kind]}"/>\n')
+            w('    </attributes>\n')
+        w('    <nodes>\n')
+
+    @staticmethod
+    def _attvalues(attrs: Attrs) -> str:
+        values = ''.join(f'<attvalue for="{k}" value={_quote(v)}/>'
+                         for k, v in attrs.items() if k != 'label' and v is not None)
+        return f'<attvalues>{values}</attvalues>' if values else ''
+
+    def node(self, node_id: str, attrs: Attrs):
+        label = _quote(str(attrs.get('label', node_id)))
+        self.out.write(f'      <node id={_quote(node_id)} label={label}>{self._attvalues(attrs)}</node>\n')
+
+    def begin_edges(self):
+        self.out.write('    </nodes>\n    <edges>\n')
+
+    def edge(self, edge_id: int, source: str, target: str, attrs: Attrs):
+        self.out.write(f'      <edge id="{edge_id}" source={_quote(source)} target={_quote(target)}>'
+                       f'{self._attvalues(attrs)}</edge>\n')
+
+    def end(self):
+        self.out.write('    </edges>\n  </graph>\n</gexf>\n')
+
+
+class JSONLinesWriter(GraphWriter):
+    """每行一个 JSON 对象：`{"type": "node", "id": ...}` 或 `{"type": "edge", "source": ..., "target": ...}`"""
+
+    def node(self, node_id: str, attrs: Attrs):
+        item = {'type': 'node', 'id': node_id}
+        item.update((k, v) for k, v in attrs.items() if v is not None)
+        self.out.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    def edge(self, edge_id: int, source: str, target: str, attrs: Attrs):
+        item = {'type': 'edge', 'id': edge_id, 'source': source, 'target': target}
+        item.update((k, v) for k, v in attrs.items() if v is not None)
+        self.out.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+
+_WRITERS = {'graphml': GraphMLWriter, 'gexf': GEXFWriter, 'jsonl': JSONLinesWriter}
+
+
+def graph_format_of(path: Path, fmt: Optional[str] = None) -> str:
+    """指定的格式，或者按输出文件的后缀确定"""
+    if fmt:
+        if fmt not in GRAPH_FORMATS:
+            raise ValueError(f'不支持的格式: {fmt}，可选 {", ".join(GRAPH_FORMATS)}')
+        return fmt
+    found = _SUFFIXES.get(path.suffix.lower())
+    if found is None:
+        raise ValueError(f'无法从后缀确定格式: {path.name}，请指定格式（{", ".join(GRAPH_FORMATS)}）')
+    return found
+
+
+@dataclass
+class GraphExportResult:
+    path: Path
+    format: str
+    nodes: int = 0
+    edges: int = 0
+    unresolved: int = 0     # 找不到目标而没有导出的链接数量
+
+
+def _rel_path(vault: ObVault):
+    """相对仓库的路径（`/` 分隔），比 `Path.relative_to` 快，导出时每个文件要用到两次"""
+    start = len(os.fspath(vault.path)) + 1
+    if os.sep == '/':
+        return lambda path: os.fspath(path)[start:]
+    return lambda path: os.fspath(path)[start:].replace(os.sep, '/')
+
+
+def _tag_id(tag: str) -> str:
+    return 'tag:' + tag
+
+
+def _folder_id(rel: str) -> str:
+    return 'folder:' + rel
+
+
+def _iter_nodes(vault: ObVault, with_tags: bool, with_folders: bool) -> Iterable[Tuple[str, Attrs]]:
+    sizes = vault.mtime_index
+    rel_path = _rel_path(vault)
+    for ob_file in vault.iter_files():
+        rel = rel_path(ob_file.path)
+        stat = sizes.get(ob_file.path)
+        attrs: Attrs = {'kind': 'file', 'label': ob_file.name, 'size': stat.size if stat else None}
+        if ob_file.is_note():
+            note: ObNote = ob_file  # type: ignore[assignment]
+            attrs.update(kind='note', tags=len(note.tags or ()), links=len(note.links or ()),
+                         words=note.text_stats.total_words)
+        yield rel, attrs
+    if with_tags:
+        for tag, notes in vault.tags.items():
+            yield _tag_id(tag), {'kind': 'tag', 'label': '#' + tag, 'notes': len(notes)}
+    if with_folders:
+        for folder in vault.folders:
+            rel = folder.relative_to(vault.path).as_posix()
+            yield _folder_id(rel), {'kind': 'folder', 'label': folder.name}
+
+
+def _parent_folder(rel: str) -> Optional[str]:
+    parent = os.path.dirname(rel)
+    return parent or None
+
+
+def export_graph(vault: ObVault, path: Path, fmt: Optional[str] = None,
+                 with_tags=True, with_folders=False) -> GraphExportResult:
+    """把仓库的链接关系导出为图
+
+    :param fmt: `graphml`、`gexf` 或 `jsonl`，缺省按文件后缀确定
+    :param with_tags: 导出标签节点和笔记 -> 标签的边
+    :param with_folders: 导出文件夹节点和文件 -> 文件夹的边
+    """
+    fmt = graph_format_of(path, fmt)
+    vault.ensure_all_parsed()
+    result = GraphExportResult(path, fmt)
+    tmp = path.with_name(f'.{path.name}.tmp')
+    with open(tmp, 'w', encoding='utf-8', newline='\n') as out:
+        writer = _WRITERS[fmt](out)
+        writer.begin()
+        for node_id, attrs in _iter_nodes(vault, with_tags, with_folders):
+            writer.node(node_id, attrs)
+            result.nodes += 1
+        writer.begin_edges()
+
+        def _edge(source: str, target: str, kind: str):
+            writer.edge(result.edges, source, target, {'kind': kind})
+            result.edges += 1
+
+        rel_path = _rel_path(vault)
+        for ob_file in vault.iter_files():
+            rel = rel_path(ob_file.path)
+            if with_folders:
+                parent = _parent_folder(rel)
+                if parent:
+                    _edge(rel, _folder_id(parent), 'in')
+            if not ob_file.is_note():
+                continue
+            note: ObNote = ob_file  # type: ignore[assignment]
+            # 同一篇笔记中多次链接（或嵌入）同一个目标只导出一条边，既链接又嵌入的各导出一条
+            seen: Set[Tuple[str, str]] = set()
+            for link in note.ob_links:
+                if not link.target:
+                    continue
+                found = vault.resolve_target(link.target, note)
+                if found is None:
+                    result.unresolved += 1
+                    continue
+                edge = (rel_path(found.path), 'embed' if link.embedded else 'link')
+                if edge not in seen:
+                    seen.add(edge)
+                    _edge(rel, *edge)
+            if with_tags:
+                for tag in dict.fromkeys(note.tags or ()):
+                    _edge(rel, _tag_id(tag), 'tag')
+
+        if with_tags:
+            for tag in vault.tags:
+                if '/' in tag:
+                    _edge(_tag_id(tag), _tag_id(tag[:tag.rfind('/')]), 'parent')
+        if with_folders:
+            for folder in vault.folders:
+                rel = folder.relative_to(vault.path).as_posix()
+                parent = _parent_folder(rel)
+                if parent:
+                    _edge(_folder_id(rel), _folder_id(parent), 'parent')
+        writer.end()
+    os.replace(tmp, path)
+    return result
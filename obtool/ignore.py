@@ -0,0 +1,113 @@
+"""
+# 遍历仓库时忽略的文件和文件夹
+
+忽略规则有两个来源，编译成一个正则表达式一次匹配：
+
+1. Obsidian 设置中的 `userIgnoreFilters`（设置 - 文件与链接 - 排除的文件）：
+   普通字符串表示路径前缀，例如 `Archive/`；`/.../` 包围的是正则表达式。
+
+2. 仓库根目录下的 `.obtoolignore` 文件，每行一个类似 `.gitignore` 的通配符：
+
+       # 注释
+       node_modules        不含 / 时匹配任意层级的文件或文件夹名
+       *.log
+       exports/site/       以 / 结尾只匹配文件夹
+       /drafts             包含 / 时相对仓库根目录
+
+匹配的对象是相对仓库根目录的 posix 路径，文件夹在末尾加上 `/`。
+"""
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+IGNORE_FILE = '.obtoolignore'
+
+
+def _glob_to_re(glob: str) -> str:
+    """把通配符转换为正则，`*` 和 `?` 不匹配 `/`，`**` 匹配任意层级"""
+    i, n = 0, len(glob)
+    res = []
+    while i < n:
+        c = glob[i]
+        i += 1
+        if c == '*':
+            if i < n and glob[i] == '*':
+                i += 1
+                res.append('.*')
+            else:
+                res.append('[^/]*')
+        elif c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            j = glob.find(']', i)
+            if j < 0:
+                res.append('\\[')
+            else:
+                stuff = glob[i:j].replace('\\', '\\\\')
+                if stuff.startswith('!'):
+                    stuff = '^' + stuff[1:]
+                res.append(f'[{stuff}]')
+                i = j + 1
+        else:
+            res.append(re.escape(c))
+    return ''.join(res)
+
+
+def compile_glob(pattern: str) -> Optional[str]:
+    """`.obtoolignore` 中的一行转换为正则，空行和注释返回 None"""
+    pattern = pattern.strip()
+    if not pattern or pattern.startswith('#'):
+        return None
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    anchored = '/' in pattern
+    body = _glob_to_re(pattern.lstrip('/'))
+    prefix = '' if anchored else '(?:.*/)?'
+    suffix = '/' if dir_only else '/?'
+    return f'{prefix}{body}{suffix}\\Z'
+
+
+def compile_filter(user_filter: str) -> Optional[str]:
+    """Obsidian 的 userIgnoreFilters 中的一项转换为正则"""
+    if not user_filter:
+        return None
+    if len(user_filter) > 2 and user_filter.startswith('/') and user_filter.endswith('/'):
+        return f'.*?(?:{user_filter[1:-1]})'
+    return re.escape(user_filter)
+
+
+class IgnoreMatcher:
+    """编译好的忽略规则"""
+
+    def __init__(self, user_filters: Iterable[str] = (), patterns: Iterable[str] = ()):
+        regexes: List[str] = []
+        for f in user_filters:
+            r = compile_filter(f)
+            if r:
+                regexes.append(r)
+        for p in patterns:
+            r = compile_glob(p)
+            if r:
+                regexes.append(r)
+        self.rules = regexes
+        self._re = re.compile('|'.join(f'(?:{r})' for r in regexes)) if regexes else None
+
+    def __bool__(self):
+        return self._re is not None
+
+    @classmethod
+    def from_vault(cls, vault_path: Path, settings: dict) -> 'IgnoreMatcher':
+        user_filters = settings.get('userIgnoreFilters') or []
+        ignore_file = vault_path.joinpath(IGNORE_FILE)
+        patterns = []
+        if ignore_file.is_file():
+            patterns = ignore_file.read_text(encoding='utf-8').splitlines()
+        return cls(user_filters, patterns)
+
+    def match(self, rel_path: str, is_dir=False) -> bool:
+        """判断相对仓库根目录的 posix 路径是否被忽略"""
+        if self._re is None:
+            return False
+        if is_dir:
+            rel_path += '/'
+        return self._re.match(rel_path) is not None
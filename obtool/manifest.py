@@ -0,0 +1,88 @@
+"""
+# 文件夹扫描清单
+
+记录每个文件夹的修改时间和其中的文件、子文件夹，保存在仓库的缓存目录中。
+再次打开仓库时，修改时间没有变化的文件夹直接使用记录的内容，不再列出目录；
+只有新增、删除、改名了文件的文件夹（修改时间会变化）才重新扫描。
+
+文件内容的修改不影响文件夹的修改时间，也不影响扫描结果，笔记内容的变化由解析缓存负责。
+
+修改时间的精度有限，扫描时刚刚修改过的文件夹不记录修改时间，下次总是重新扫描，
+避免在同一个时间刻度内的再次修改被漏掉。忽略规则变化时整个清单作废。
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from obtool.utils import get_cache_dir, atomic_write
+
+MANIFEST_FILE = 'scan-manifest.json'
+MANIFEST_VERSION = 1
+# 距离扫描时间不到这么多纳秒的修改时间不可信
+RACY_NS = 2 * 10 ** 9
+
+# 文件夹 -> (修改时间, 文件名列表, 子文件夹名列表, 忽略的子文件夹数量, 忽略的文件数量)
+FolderEntry = Tuple[Optional[int], List[str], List[str], int, int]
+ScanResult = Tuple[List[Path], List[Path], int, int]
+
+
+def rules_key(rules: List[str]) -> str:
+    """忽略规则的摘要"""
+    return hashlib.sha1(json.dumps(rules).encode('utf-8')).hexdigest()
+
+
+class ScanManifest:
+
+    def __init__(self, vault_path: Path, key: str, folders: Optional[Dict[str, FolderEntry]] = None):
+        self.vault_path = vault_path
+        self.key = key
+        self._old = folders or {}
+        self._new: Dict[str, FolderEntry] = {}
+        self.reused = 0         # 使用记录的文件夹数量
+        self.rescanned = 0      # 重新扫描的文件夹数量
+
+    @property
+    def manifest_path(self) -> Path:
+        return get_cache_dir(self.vault_path).joinpath(MANIFEST_FILE)
+
+    @classmethod
+    def load(cls, vault_path: Path, key: str) -> 'ScanManifest':
+        manifest = cls(vault_path, key)
+        try:
+            data = json.loads(manifest.manifest_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return manifest
+        if data.get('version') == MANIFEST_VERSION and data.get('key') == key:
+            manifest._old = {k: tuple(v) for k, v in data.get('folders', {}).items()}
+        return manifest
+
+    def scan(self, folder: Path, scan_folder: Callable[[Path], ScanResult]) -> ScanResult:
+        """列出文件夹的内容，修改时间没有变化时使用记录"""
+        rel = '' if folder == self.vault_path else folder.relative_to(self.vault_path).as_posix()
+        mtime = os.stat(folder).st_mtime_ns
+        entry = self._old.get(rel)
+        if entry is not None and entry[0] == mtime:
+            self.reused += 1
+            self._new[rel] = entry
+            _, files, folders, pruned, ignored = entry
+            return ([folder.joinpath(name) for name in files],
+                    [folder.joinpath(name) for name in folders], pruned, ignored)
+
+        self.rescanned += 1
+        files, folders, pruned, ignored = scan_folder(folder)
+        trusted = time.time_ns() - mtime >= RACY_NS
+        self._new[rel] = (mtime if trusted else None,
+                          [p.name for p in files], [p.name for p in folders], pruned, ignored)
+        return files, folders, pruned, ignored
+
+    @property
+    def changed(self) -> bool:
+        return self.rescanned > 0 or len(self._new) != len(self._old)
+
+    def save(self):
+        """只保存这次遍历到的文件夹，已经删除的文件夹不再保留"""
+        data = {'version': MANIFEST_VERSION, 'key': self.key, 'folders': self._new}
+        atomic_write(self.manifest_path, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
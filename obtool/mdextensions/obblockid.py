@@ -0,0 +1,50 @@
+"""
+Obsidian Block ID Extension for Python-Markdown
+===============================================
+
+A paragraph or list item ending with `^block-id` can be linked by `[[note#^block-id]]`.
+
+The `^block-id` is removed from the text and set as the `id` of the element (`^block-id`,
+with the caret, so that the `#%5Eblock-id` fragment of the link points to it).
+
+"""
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+import re
+
+# same as `BLOCK_ID_RE` in `obtool.obmark`, at the end of the text of an element
+BLOCK_ID_RE = re.compile(r'(?:^|\s)\^([A-Za-z0-9-]+)[ \t]*$')
+
+
+class ObsidianBlockIdExtension(Extension):
+    def extendMarkdown(self, md):
+        md.treeprocessors.register(ObBlockIdTreeprocessor(md), 'ob_block_id', 5)
+
+
+class ObBlockIdTreeprocessor(Treeprocessor):
+    def run(self, root):
+        for element in root.iter():
+            if element.tag not in ('p', 'li'):
+                continue
+            if len(element):
+                # the text after the last child
+                last = element[-1]
+                if last.tag in ('ul', 'ol', 'p'):
+                    continue
+                text = last.tail
+            else:
+                last = None
+                text = element.text
+            m = BLOCK_ID_RE.search(text or '')
+            if not m:
+                continue
+            text = text[:m.start()].rstrip()
+            if last is None:
+                element.text = text
+            else:
+                last.tail = text
+            element.set('id', '^' + m.group(1))
+
+
+def makeExtension(**kwargs):  # pragma: no cover
+    return ObsidianBlockIdExtension(**kwargs)
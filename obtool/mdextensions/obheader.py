@@ -6,22 +6,72 @@ The original Header ignore the space between # and header text.
 
 In Obsidian, when there is no space, it's a tag.
 
+The headers are also collected to `md.ob_headings` as `(level, text)`,
+so that `[[note#header]]` links can be checked.
+
+With `anchors=True` the headers get an `id` made by `heading_slug`,
+so that `[[note#header]]` links in exported pages have a target.
+
 """
 
 from markdown.extensions import Extension
 from markdown.blockprocessors import HashHeaderProcessor
 import re
 
+# characters ignored by Obsidian in header links
+_ANCHOR_IGNORED_RE = re.compile(r'[#|^:%\[\]]')
+
+
+def heading_slug(text):
+    """ The `id` of a header, also used for the fragment of `[[note#header]]` links. """
+    return '-'.join(_ANCHOR_IGNORED_RE.sub(' ', text).split()).casefold()
+
 
 class ObsidianHeaderExtension(Extension):
+    def __init__(self, **kwargs):
+        self.config = {
+            'anchors': [False, 'Add `id` attributes to the headers. Default: False']
+        }
+        super().__init__(**kwargs)
+
     def extendMarkdown(self, md):
-        md.parser.blockprocessors.register(ObHashHeaderProcessor(md.parser), 'hashheader', 70)
+        processor = ObHashHeaderProcessor(md.parser, self.getConfig('anchors'))
+        md.parser.blockprocessors.register(processor, 'hashheader', 70)
 
 
 class ObHashHeaderProcessor(HashHeaderProcessor):
     # there must be at least one space after #{1,6}
     RE = re.compile(r'(?:^|\n)(?P<level>#{1,6}) +(?P<header>(?:\\.|[^\\])*?)#*(?:\n|$)')
 
+    def __init__(self, parser, anchors=False):
+        super().__init__(parser)
+        self.anchors = anchors
+        self.ids = set()
+
+    def run(self, parent, blocks):
+        m = self.RE.search(blocks[0])
+        # lines before the header may contain other headers, they are collected first
+        super().run(parent, blocks)
+        if m:
+            md = self.parser.md
+            if not hasattr(md, 'ob_headings'):
+                md.ob_headings = []
+            text = m.group('header').strip()
+            md.ob_headings.append((len(m.group('level')), text))
+            if self.anchors:
+                # the header is the last element added by `HashHeaderProcessor.run`
+                self._set_id(parent[-1], heading_slug(text))
+
+    def _set_id(self, element, slug):
+        # links go to the first header with the text, the others get a suffix
+        anchor = slug
+        n = 0
+        while anchor in self.ids:
+            n += 1
+            anchor = f'{slug}-{n}'
+        self.ids.add(anchor)
+        element.set('id', anchor)
+
 
 def makeExtension(**kwargs):  # pragma: no cover
     return ObsidianHeaderExtension(**kwargs)
@@ -87,11 +87,17 @@ class ObLinksInlineProcessor(InlineProcessor):
             a.set('href', url)
             if html_class:
                 a.set('class', html_class)
-            if m.group(0).startswith('!'):
-                a.set('embed', 'true')
             if not hasattr(self.md, 'ob_links'):
                 self.md.ob_links = []
+                self.md.ob_embedded = []
             self.md.ob_links.append(label)
+            # whether this occurrence is an embed, the same label may also be linked
+            self.md.ob_embedded.append(m.group(0).startswith('!'))
+            if m.group(0).startswith('!'):
+                a.set('embed', 'true')
+                if not hasattr(self.md, 'ob_embeds'):
+                    self.md.ob_embeds = []
+                self.md.ob_embeds.append(label)
         else:
             a = ''
         return a, m.start(0), m.end(0)
@@ -21,6 +21,7 @@ class ObsidianTagExtension(Extension):
             'end_url': ['/', 'String to append to end of URL.'],
             'html_class': ['tag', 'CSS hook. Leave blank for none.'],
             'build_url': [build_url, 'Callable formats URL from label.'],
+            'as_link': [True, 'Render tags as links, otherwise as `<span>`. Default: True'],
         }
 
         super().__init__(**kwargs)
@@ -55,6 +56,13 @@ class ObTagsInlineProcessor(InlineProcessor):
         if '/' in label:
             # TODO: 也许不需要处理？
             pass
+        if not self.config['as_link']:
+            # there is no page for the tag to link to
+            span = etree.Element('span')
+            span.text = '#' + label
+            if html_class:
+                span.set('class', html_class)
+            return span, m.start(0), m.end(0)
         url = self.config['build_url'](label, base_url, end_url)
         a = etree.Element('a')
         a.text = label
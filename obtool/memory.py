@@ -0,0 +1,182 @@
+"""
+# 内存统计
+
+1. `measure_vault`：按索引结构统计仓库占用的内存（深度大小），
+   每个对象只算一次，算在第一个引用它的结构上，统计顺序见 `measure_vault`；
+2. `trace_vault_load`：用 tracemalloc 记录加载仓库各个阶段（遍历、建立映射、解析）分配的内存。
+
+深度大小是 `sys.getsizeof` 的累加，不包含解释器和内存分配器的额外开销，
+用于比较各个结构的相对大小和估算内存预算。
+"""
+import contextlib
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FunctionType, ModuleType
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from obtool.obsidian import ObVault
+
+# 不深入统计的类型：仓库本身通过笔记的 vault 属性可以访问到，类、函数和模块是共享的
+_STOP_TYPES = (ObVault, type, FunctionType, ModuleType)
+# 每个阶段记录的分配最多的代码位置数量
+TRACE_TOP = 5
+# 不统计 tracemalloc 自身（快照）、这里记录阶段的代码和来源未知的分配
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """对象及其引用的所有对象的大小之和，`seen` 中已经统计过的对象不再统计"""
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _STOP_TYPES):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float, bool)) or o is None:
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            d = getattr(o, '__dict__', None)
+            if d is not None:
+                stack.append(d)
+            for cls in type(o).__mro__:
+                for name in getattr(cls, '__slots__', ()):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+    return size
+
+
+@dataclass
+class VaultMemoryReport:
+    sizes: Dict[str, int]       # 结构名称 -> 字节数，按统计顺序
+    notes: int                  # 笔记数量
+    parsed: int                 # 已经解析的笔记数量
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes.values())
+
+    def per_note(self, key: str) -> float:
+        return self.sizes.get(key, 0) / self.parsed if self.parsed else 0.0
+
+
+def measure_vault(vault: ObVault) -> VaultMemoryReport:
+    """统计仓库各个索引结构的内存
+
+    先统计笔记的解析结果（正文、HTML、其它），再统计各个索引，
+    映射中的文件对象算在 `_map` 上，其它索引中只算容器本身和 key。
+    """
+    gc.collect()
+    seen: Set[int] = set()
+    sizes: Dict[str, int] = {'笔记正文': 0, '笔记 HTML': 0, '其它解析结果': 0}
+    notes = parsed = 0
+    for note in vault.iter_notes():
+        notes += 1
+        marks = note._marks
+        if marks is None:
+            continue
+        parsed += 1
+        sizes['笔记正文'] += deep_sizeof(marks.content, seen)
+        sizes['笔记 HTML'] += deep_sizeof(marks.html, seen)
+        sizes['其它解析结果'] += deep_sizeof(marks, seen)
+    snapshot = vault.snapshot()
+    structures: Iterable[Tuple[str, Any]] = (
+        ('_map', snapshot.map),
+        ('_same_names', snapshot.same_names),
+        ('_files', vault.files),
+        ('_folders', vault.folders),
+        ('_tags', snapshot.tags),
+        ('_back_links', snapshot.back_links),
+        ('properties', vault.properties),
+        ('tasks', vault.tasks),
+        ('completion', vault._completion),
+        ('mtime_index', vault._mtime_index),
+        ('_cache', vault._cache),
+    )
+    for name, obj in structures:
+        sizes[name] = deep_sizeof(obj, seen)
+    return VaultMemoryReport(sizes, notes, parsed)
+
+
+@dataclass
+class PhaseMemory:
+    """加载仓库的一个阶段分配的内存"""
+    name: str
+    allocated: int      # 阶段结束时比开始时多占用的内存
+    peak: int           # 阶段中的峰值，相对阶段开始时
+    seconds: float
+    top: List[Tuple[str, int]] = field(default_factory=list)   # (代码位置, 字节数)
+
+
+class _TracedVault(ObVault):
+    """记录 `_walk` 和 `_build_map` 阶段内存的仓库"""
+
+    def __init__(self, path: Path, phases: List[PhaseMemory], **kwargs):
+        self.phases = phases
+        super().__init__(path, **kwargs)
+
+    def _walk(self):
+        with _trace_phase('_walk', self.phases):
+            super()._walk()
+
+    def _build_map(self):
+        with _trace_phase('_build_map', self.phases):
+            super()._build_map()
+
+
+@contextlib.contextmanager
+def _trace_phase(name: str, phases: List[PhaseMemory]):
+    gc.collect()
+    if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+        tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+    start = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    diff = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS).compare_to(before, 'lineno')
+    top = [(f'{Path(stat.traceback[0].filename).name}:{stat.traceback[0].lineno}', stat.size_diff)
+           for stat in diff[:TRACE_TOP] if stat.size_diff > 0]
+    phases.append(PhaseMemory(name, current - start, max(peak - start, 0), seconds, top))
+
+
+def trace_vault_load(path: Union[str, Path], parse_workers: int = 1,
+                     scan_manifest=False, sharded=False) -> Tuple[ObVault, List[PhaseMemory]]:
+    """用 tracemalloc 重新加载仓库，记录每个阶段分配的内存
+
+    tracemalloc 会明显拖慢加载速度，只用于分析。进程池解析时，
+    子进程中的分配不会被记录，只记录传回的解析结果。
+
+    :param scan_manifest: 同 `ObVault`，和要分析的仓库使用相同的设置才是同样的加载过程
+    :param sharded: 同 `ObVault`，分片在 `ensure_all_parsed` 阶段加载
+    """
+    phases: List[PhaseMemory] = []
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    try:
+        vault = _TracedVault(Path(path), phases, scan_manifest=scan_manifest, sharded=sharded)
+        vault.parse_workers = parse_workers
+        with _trace_phase('ensure_all_parsed', phases):
+            vault.ensure_all_parsed()
+    finally:
+        if not started:
+            tracemalloc.stop()
+    return vault, phases
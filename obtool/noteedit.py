@@ -0,0 +1,239 @@
+"""
+# 笔记文本的修改：标签和 Frontmatter 属性
+
+这里的函数只处理文本，输入笔记原文，返回修改后的原文，没有变化时原样返回。
+批量读取、写入和更新索引见 `ObVault.batch_edit`。
+
+- Frontmatter 中只改写涉及的属性，其它行保持原样；改写的属性用 YAML 重新生成（列表用块格式）；
+- 正文中的 `#标签` 跳过代码块和行内代码；
+- 标签区分大小写，改名时嵌套的子标签一起改名（`a/b` -> `a/c` 时 `a/b/x` -> `a/c/x`）。
+"""
+import re
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import yaml
+
+from obtool.obmark import TAG_RE, FENCE_RE
+
+_FRONTMATTER_END = ('---', '...')
+_CODE_SPAN_RE = re.compile(r'`[^`\n]*`')
+# 顶层的属性行
+_KEY_LINE_RE = re.compile(r'^([^\s#:][^:]*?)\s*:(?:\s|$)')
+# 删除的标签先替换为这个标记，再处理两边的空白
+_DELETED = '\x00'
+_DELETED_RE = re.compile(r'[ \t]*\x00(?:[ \t]*\x00)*[ \t]*')
+
+
+def normalize_tag(tag: str) -> str:
+    """去掉开头的 `#` 和空白"""
+    tag = tag.strip().lstrip('#').strip()
+    if not tag or not TAG_RE.fullmatch('#' + tag):
+        raise ValueError(f'无效的标签: {tag!r}')
+    return tag
+
+
+def split_frontmatter(text: str) -> Tuple[Optional[List[str]], str, str]:
+    """拆分为 (Frontmatter 的行, Frontmatter 之前的部分, 正文)
+
+    没有 Frontmatter 时第一项是 None；之前的部分是 BOM 和 `---` 分隔行
+    """
+    bom = '\ufeff' if text.startswith('\ufeff') else ''
+    rest = text[len(bom):]
+    first, sep, rest = rest.partition('\n')
+    if first.rstrip() != '---' or not sep:
+        return None, '', text
+    lines = rest.split('\n')
+    for i, line in enumerate(lines):
+        if line.rstrip() in _FRONTMATTER_END:
+            head = bom + first + '\n'
+            return lines[:i], head, '\n'.join(lines[i:])
+    return None, '', text
+
+
+def join_frontmatter(fm_lines: List[str], head: str, body: str) -> str:
+    if not head:
+        head, body = '---\n', '---\n' + body
+    return head + ''.join(line + '\n' for line in fm_lines) + body
+
+
+def _load_meta(fm_lines: List[str]) -> dict:
+    try:
+        meta = yaml.safe_load('\n'.join(fm_lines))
+    except yaml.YAMLError as e:
+        raise ValueError(f'无法解析 Frontmatter: {e}')
+    return meta if isinstance(meta, dict) else {}
+
+
+def _key_span(fm_lines: List[str], key: str) -> Optional[Tuple[int, int]]:
+    """属性在 Frontmatter 中占的行 [start, end)，包括其后缩进的行和块格式的列表项"""
+    for i, line in enumerate(fm_lines):
+        m = _KEY_LINE_RE.match(line)
+        if m and m.group(1).strip('\'"') == key:
+            end = i + 1
+            while end < len(fm_lines) and not _KEY_LINE_RE.match(fm_lines[end]):
+                end += 1
+            # 属性之后的空行和注释不算在内
+            while end > i + 1 and (not fm_lines[end - 1].strip() or fm_lines[end - 1].lstrip().startswith('#')):
+                end -= 1
+            return i, end
+    return None
+
+
+def _dump_value(key: str, value: Any) -> List[str]:
+    dumped = yaml.safe_dump({key: value}, allow_unicode=True, default_flow_style=False, sort_keys=False)
+    return dumped.rstrip('\n').split('\n')
+
+
+def set_property(text: str, key: str, value: Any) -> str:
+    """设置 Frontmatter 属性，`value` 为 None 时删除属性；没有 Frontmatter 时新建"""
+    fm_lines, head, body = split_frontmatter(text)
+    if fm_lines is None:
+        if value is None:
+            return text
+        fm_lines = []
+    span = _key_span(fm_lines, key)
+    if span is None:
+        if value is None:
+            return text
+        start = end = len(fm_lines)
+    else:
+        start, end = span
+        if value is not None and _load_meta(fm_lines).get(key) == value:
+            return text
+    new_lines = [] if value is None else _dump_value(key, value)
+    return join_frontmatter(fm_lines[:start] + new_lines + fm_lines[end:], head, body)
+
+
+def _meta_tags(fm_lines: Optional[List[str]]) -> List[str]:
+    if fm_lines is None:
+        return []
+    tags = _load_meta(fm_lines).get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    elif not isinstance(tags, list):
+        tags = [tags]
+    return [str(t).strip().lstrip('#') for t in tags if t is not None and str(t).strip()]
+
+
+def _set_meta_tags(text: str, tags: List[str]) -> str:
+    return set_property(text, 'tags', tags or None)
+
+
+def _sub_body_tags(body: str, replace: Callable[[str], Optional[str]]) -> str:
+    """替换正文中代码以外的 `#标签`
+
+    :param replace: 传入标签（不含 `#`），返回新的标签，返回空字符串表示删除，None 表示不修改
+    """
+    if '#' not in body:
+        return body
+
+    def _sub(m: 're.Match') -> str:
+        new = replace(m.group(1))
+        if new is None:
+            return m.group(0)
+        return '#' + new if new else _DELETED
+
+    def _sub_text(text: str) -> str:
+        if '#' not in text:
+            return text
+        if '`' not in text:
+            return _sub_line(text)
+        # 行内代码保持原样
+        parts = []
+        pos = 0
+        for m in _CODE_SPAN_RE.finditer(text):
+            parts.append(_sub_line(text[pos:m.start()]))
+            parts.append(m.group(0))
+            pos = m.end()
+        parts.append(_sub_line(text[pos:]))
+        return ''.join(parts)
+
+    def _sub_line(text: str) -> str:
+        new_text = TAG_RE.sub(_sub, text)
+        if _DELETED not in new_text:
+            return new_text
+        # 删除的标签连同两边的空白去掉，在文字中间时保留一个空格
+        return _DELETED_RE.sub(lambda m: ' ' if 0 < m.start() and m.end() < len(new_text) else '', new_text)
+
+    lines = body.split('\n')
+    fence = None
+    for i, line in enumerate(lines):
+        m = FENCE_RE.match(line)
+        if m:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            continue
+        if fence is None:
+            lines[i] = _sub_text(line)
+    return '\n'.join(lines)
+
+
+def body_tags(body: str) -> List[str]:
+    """正文中代码以外的标签"""
+    found: List[str] = []
+
+    def _collect(tag: str) -> None:
+        found.append(tag)
+        return None
+
+    _sub_body_tags(body, _collect)
+    return found
+
+
+def add_tags(text: str, tags: Iterable[str]) -> str:
+    """笔记中还没有的标签加到 Frontmatter 的 `tags` 中"""
+    fm_lines, _, body = split_frontmatter(text)
+    meta_tags = _meta_tags(fm_lines)
+    existing = set(meta_tags).union(body_tags(body))
+    new_tags = [t for t in dict.fromkeys(tags) if t not in existing]
+    if not new_tags:
+        return text
+    return _set_meta_tags(text, meta_tags + new_tags)
+
+
+def remove_tags(text: str, tags: Iterable[str]) -> str:
+    """从 Frontmatter 和正文中删除标签，不包括子标签"""
+    tags = set(tags)
+    fm_lines, head, body = split_frontmatter(text)
+    meta_tags = _meta_tags(fm_lines)
+    kept = [t for t in meta_tags if t not in tags]
+    if len(kept) != len(meta_tags):
+        text = _set_meta_tags(text, kept)
+        fm_lines, head, body = split_frontmatter(text)
+    new_body = _sub_body_tags(body, lambda t: '' if t in tags else None)
+    if new_body == body:
+        return text
+    return join_frontmatter(fm_lines, head, new_body) if fm_lines is not None else new_body
+
+
+def _renamed(tag: str, old: str, new: str) -> Optional[str]:
+    if tag == old:
+        return new
+    if tag.startswith(old + '/'):
+        return new + tag[len(old):]
+    return None
+
+
+def rename_tag(text: str, old: str, new: str) -> str:
+    """标签改名，子标签一起改名；改名后重复的 Frontmatter 标签只保留一个"""
+    fm_lines, head, body = split_frontmatter(text)
+    meta_tags = _meta_tags(fm_lines)
+    renamed = [_renamed(t, old, new) or t for t in meta_tags]
+    if renamed != meta_tags:
+        text = _set_meta_tags(text, list(dict.fromkeys(renamed)))
+        fm_lines, head, body = split_frontmatter(text)
+    new_body = _sub_body_tags(body, lambda t: _renamed(t, old, new))
+    if new_body == body:
+        return text
+    return join_frontmatter(fm_lines, head, new_body) if fm_lines is not None else new_body
+
+
+def parse_value(text: str) -> Any:
+    """命令行中的属性值按 YAML 解析：`3` 是数字，`[a, b]` 是列表，`2026-10-01` 是日期"""
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError:
+        return text
@@ -1,8 +1,15 @@
 """解析 Obsidian 的 Markdown 文件
 """
+import datetime
+import functools
+import itertools
+import os
+import re
 import sys
 from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
 import frontmatter
 from markdown import Markdown
 
@@ -10,8 +17,10 @@ from obtool.mdextensions.oblinks import ObsidianLinkExtension
 from obtool.mdextensions.obcomments import ObsidianCommentExtension
 from obtool.mdextensions.obinlinecomment import ObsidianInlineCommentExtension
 from obtool.mdextensions.obtags import ObsidianTagExtension
-from obtool.mdextensions.obheader import ObsidianHeaderExtension
+from obtool.mdextensions.obheader import ObsidianHeaderExtension, heading_slug
+from obtool.mdextensions.obblockid import ObsidianBlockIdExtension
 from obtool.mdextensions.obautolink import ObsidianAutoLinkExtension
+from obtool.textstats import TextStats, EMPTY_STATS, text_stats
 
 
 @dataclass
@@ -21,9 +30,21 @@ class ObMarks:
     meta: dict          # Frontmatter 元数据
     tags: list          # 标签（只包含正文中的）
     links: list         # 内部链接
-    # blocks: list        # 块
     comments: list      # 注释内容
     html: str = field(repr=False)
+    embeds: list = field(default_factory=list)  # 嵌入 ![[]] 的链接，同时也包含在 links 中
+    headings: list = field(default_factory=list)    # 标题 (level, text)
+    blocks: list = field(default_factory=list)      # 块 ID（^block-id，不含 ^）
+    tasks: list = field(default_factory=list)       # 任务 ObTask
+    full: bool = True   # False 表示预扫描没有发现标记，没有经过 Markdown 解析（只提取了标题）
+    stats: Optional[TextStats] = None   # 正文的字数等统计
+    streamed: bool = False  # 大文件逐行提取，不保留正文和 HTML，见 `stream_note`
+    embedded: list = field(default_factory=list)    # 和 links 一一对应，这一处链接是否是嵌入
+
+    @classmethod
+    def empty(cls, path: Path, content: str = ''):
+        """没有任何 Obsidian 标记的笔记，不需要经过 Markdown 解析"""
+        return cls(path, content, {}, [], [], [], '', full=False)
 
 
 @dataclass
@@ -51,6 +72,124 @@ class ObLink:
     image_size: str
     embedded: bool
 
+    @classmethod
+    def from_label(cls, label: str, embedded=False):
+        """从 [[]] 中的内容构造链接"""
+        target, anchor, alias = parse_link(label)
+        target = target.rstrip('\\').strip()  # 表格中转义的 `\|`
+        if alias == anchor:
+            # parse_link 在没有别名时用 anchor 代替
+            alias = ''
+        section = block = image_size = ''
+        if anchor.startswith('^'):
+            block = anchor[1:].strip()
+        else:
+            section = anchor.strip()
+        if alias and IMAGE_SIZE_RE.fullmatch(alias):
+            image_size, alias = alias, ''
+        return cls(target, alias, section, block, image_size, embedded)
+
+    @property
+    def heading(self) -> str:
+        """链接的标题，嵌套的标题 [[note#h1#h2]] 只取最后一级"""
+        return self.section.rsplit('#', 1)[-1].strip()
+
+
+@dataclass(frozen=True)
+class ObTask:
+    """任务列表中的一项
+
+    - [ ] 写周报 📅 2026-01-09 #work
+    - [x] 已完成的任务
+
+    """
+    line: int           # 在文件中的行号，从 1 开始（包含 Frontmatter）
+    status: str         # 方括号中的字符，空格表示未完成
+    text: str
+    due: Optional[datetime.date] = None
+    tags: Tuple[str, ...] = ()
+
+    @property
+    def done(self) -> bool:
+        return self.status in 'xX'
+
+    @property
+    def cancelled(self) -> bool:
+        return self.status == '-'
+
+    @property
+    def open(self) -> bool:
+        return not (self.done or self.cancelled)
+
+
+# 列表项中的复选框: `- [ ]`、`* [x]`、`1. [ ]`
+TASK_RE = re.compile(r'^[ \t>]*(?:[-*+]|\d+[.)])[ \t]+\[(.)\][ \t]+(.*?)[ \t]*$')
+TASK_DUE_RE = re.compile(r'📅\s*(\d{4}-\d{2}-\d{2})')
+# 和 ObsidianTagExtension 中的正则保持一致
+TAG_RE = re.compile(r'(?<!\w)#([^#\s|\[\]\(\)=+,;.\'"\{}!@$%^&*]+)')
+FENCE_RE = re.compile(r'^[ \t]*(`{3,}|~{3,})')
+
+
+def _frontmatter_lines(lines: List[str]) -> int:
+    """文件开头 Frontmatter 占用的行数"""
+    if not lines or lines[0].lstrip('\ufeff').rstrip() != '---':
+        return 0
+    for i in range(1, len(lines)):
+        if lines[i].rstrip() in ('---', '...'):
+            return i + 1
+    return 0
+
+
+def extract_tasks(text: str) -> List[ObTask]:
+    """从笔记原文（包含 Frontmatter）中提取任务，跳过代码块"""
+    lines = text.splitlines()
+    tasks = []
+    fence = None
+    for i in range(_frontmatter_lines(lines), len(lines)):
+        line = lines[i]
+        m = FENCE_RE.match(line)
+        if m:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            continue
+        if fence is not None:
+            continue
+        m = TASK_RE.match(line)
+        if not m:
+            continue
+        status, body = m.groups()
+        due = None
+        m = TASK_DUE_RE.search(body)
+        if m:
+            try:
+                due = datetime.date.fromisoformat(m.group(1))
+            except ValueError:
+                pass
+        tasks.append(ObTask(i + 1, status, body, due, tuple(TAG_RE.findall(body))))
+    return tasks
+
+
+IMAGE_SIZE_RE = re.compile(r'\d+(x\d+)?')
+# 块 ID 在段落（行）的末尾: `some text ^block-id`
+BLOCK_ID_RE = re.compile(r'(?:^|\s)\^([A-Za-z0-9-]+)[ \t]*$', re.MULTILINE)
+# 标题链接中会被 Obsidian 忽略的字符
+_ANCHOR_IGNORED_RE = re.compile(r'[#|^:%\[\]]')
+
+
+def normalize_heading(text: str) -> str:
+    """标题归一化，用于比较 [[note#heading]] 和笔记中的标题"""
+    return ' '.join(_ANCHOR_IGNORED_RE.sub(' ', text).split()).casefold()
+
+
+def anchor_id(anchor: str) -> str:
+    """链接中 `#` 之后的部分对应的 HTML `id`：块是 `^block-id`，标题见 `heading_slug`（嵌套的标题取最后一级）"""
+    if anchor.startswith('^'):
+        return '^' + anchor[1:].strip()
+    return heading_slug(anchor.rsplit('#', 1)[-1])
+
 
 def parse_link(link):
     """
@@ -71,16 +210,114 @@ def parse_link(link):
     return target, block, alias
 
 
+# 和 ObsidianLinkExtension 中的正则保持一致
+WIKILINK_RE = re.compile(r'!?\[\[(.*?)\]\]')
+# 链接目标的结束位置：标题/块、别名、表格中转义的别名
+_LINK_TARGET_END_RE = re.compile(r'#|\\?\|')
+# 行内代码，其中的链接和标签不算
+_CODE_SPAN_RE = re.compile(r'`[^`\n]*`')
+
+
+def replace_link_targets(text: str, replace: Callable[[str], Optional[str]]) -> Tuple[str, int]:
+    """替换文本中 [[]] 链接的目标部分，保留 `#section`、`|alias` 等其余部分
+
+    代码块和行内代码中的 [[]] 不是链接，保持原样，也不计数。
+
+    :param text: Markdown 原文
+    :param replace: 传入链接目标，返回新的目标，返回 None 表示不修改
+    :return: 替换后的文本和替换的链接数量
+    """
+    count = 0
+
+    def _sub(m):
+        nonlocal count
+        label = m.group(1)
+        end = _LINK_TARGET_END_RE.search(label)
+        i = end.start() if end else len(label)
+        new_target = replace(label[:i].strip())
+        if new_target is None:
+            return m.group(0)
+        count += 1
+        start = m.start(1) - m.start(0)
+        return f'{m.group(0)[:start]}{new_target}{label[i:]}]]'
+
+    def _sub_line(line: str) -> str:
+        if '[[' not in line:
+            return line
+        if '`' not in line:
+            return WIKILINK_RE.sub(_sub, line)
+        parts = []
+        pos = 0
+        for m in _CODE_SPAN_RE.finditer(line):
+            parts.append(WIKILINK_RE.sub(_sub, line[pos:m.start()]))
+            parts.append(m.group(0))
+            pos = m.end()
+        parts.append(WIKILINK_RE.sub(_sub, line[pos:]))
+        return ''.join(parts)
+
+    lines = text.split('\n')
+    fence = None
+    for i, line in enumerate(lines):
+        m = FENCE_RE.match(line)
+        if m:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            continue
+        if fence is None:
+            lines[i] = _sub_line(line)
+    return '\n'.join(lines), count
+
+
+# 预扫描时查找的标记，只要出现其中之一就需要完整解析
+# `[[` 链接，`%%` 注释，以及任务列表的复选框
+PRESCAN_MARKERS = (b'[[', b'%%', b'- [', b'* [', b'+ [', b'. [', b') [')
+# 标签（`#` 后面紧跟非空白、非 `#` 的字符，`# 标题`、`## 标题` 不算）和行尾的块 ID。
+# 只有标题的笔记不需要完整解析，标题在跳过解析时另外提取，见 `extract_headings`
+PRESCAN_MARKER_RE = re.compile(rb'#[^#\s]|\^[A-Za-z0-9-]+[ \t]*(?:\r?\n|\r|$)')
+# Frontmatter 只能出现在文件开头
+FRONTMATTER_MARKER = b'---'
+
+
+def _has_markers(data: bytes) -> bool:
+    """以字节方式快速扫描笔记，判断是否含有需要解析的标记
+
+    返回 False 表示笔记中没有链接、标签、注释和 Frontmatter，
+    可以直接生成空的 `ObMarks` 而不必运行 Markdown 解析（见 `parse_note`）。
+    """
+    start = 3 if data[:3] == b'\xef\xbb\xbf' else 0  # UTF-8 BOM
+    if data[start:start + 3] == FRONTMATTER_MARKER:
+        return True
+    if any(data.find(marker) >= 0 for marker in PRESCAN_MARKERS):
+        return True
+    return PRESCAN_MARKER_RE.search(data) is not None
+
+
 class ObMarkdown:
 
-    def __init__(self, ignore_comment=False):
+    def __init__(self, ignore_comment=False, link_config=None, tag_config=None, anchors=False):
+        """
+        :param ignore_comment: 生成 HTML 时去掉注释
+        :param link_config: 传给 `ObsidianLinkExtension` 的配置，
+            例如导出时用 `build_url` 把链接转换成真实的相对路径
+        :param tag_config: 传给 `ObsidianTagExtension` 的配置，例如导出时 `as_link=False`
+        :param anchors: 标题和块加上 `id`（见 `anchor_id`），作为 `[[note#标题]]` 链接的目标
+        """
         self.extensions = ['extra',
-                           ObsidianTagExtension(),
-                           ObsidianLinkExtension(),
+                           ObsidianTagExtension(**(tag_config or {})),
+                           ObsidianLinkExtension(**(link_config or {})),
                            ObsidianCommentExtension(keep=not ignore_comment),
-                           ObsidianHeaderExtension(),
+                           ObsidianHeaderExtension(anchors=anchors),
                            ObsidianAutoLinkExtension(),
                            ObsidianInlineCommentExtension()]
+        if anchors:
+            self.extensions.append(ObsidianBlockIdExtension())
+
+    def convert(self, text: str) -> str:
+        """只把 Markdown 正文转换为 HTML"""
+        return Markdown(extensions=self.extensions).convert(text)
 
     def parse(self, md_file):
         if not isinstance(md_file, Path):
@@ -88,17 +325,262 @@ class ObMarkdown:
         if not (md_file.exists() and md_file.is_file()):
             raise ValueError(f'File {md_file} not exists.')
         with open(md_file, 'r', encoding='utf-8') as f:
-            post = frontmatter.load(f)
-            md = Markdown(extensions=self.extensions)
-            html = md.convert(post.content)
-            ob_comments = getattr(md, 'ob_comments', [])
-            ob_links = getattr(md, 'ob_links', [])
-            ob_tags = getattr(md, 'ob_tags', [])
-            # if ob_comments:
-            #     print(ob_comments)
+            text = f.read()
+        return self.parse_text(md_file, text)
+
+    def parse_text(self, md_file: Path, text: str) -> ObMarks:
+        """解析已经读取的笔记内容"""
+        post = frontmatter.loads(text)
+        md = Markdown(extensions=self.extensions)
+        html = md.convert(post.content)
+        ob_comments = getattr(md, 'ob_comments', [])
+        ob_links = getattr(md, 'ob_links', [])
+        ob_tags = getattr(md, 'ob_tags', [])
+        ob_embeds = getattr(md, 'ob_embeds', [])
+        ob_embedded = getattr(md, 'ob_embedded', [])
+        ob_headings = getattr(md, 'ob_headings', [])
+        ob_blocks = BLOCK_ID_RE.findall(post.content)
+        ob_tasks = extract_tasks(text)
 
         return ObMarks(md_file, post.content, post.metadata,
-                       ob_tags, ob_links, ob_comments, html)
+                       ob_tags, ob_links, ob_comments, html, ob_embeds,
+                       ob_headings, ob_blocks, ob_tasks, embedded=ob_embedded)
+
+
+def decode_note(data: bytes) -> str:
+    """把读取的字节转换成文本，和以文本方式打开文件读到的相同（换行统一为 `\\n`）"""
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+# 超过这个大小的笔记逐行提取，不经过 Markdown 解析，见 `stream_note`
+STREAM_NOTE_SIZE = 2 * 1024 * 1024
+# 逐行提取时每次最多读取的字符数，超长的行分成多段处理
+STREAM_LINE_LIMIT = 64 * 1024
+# 逐行提取时每累积这么多字符统计一次字数
+STREAM_STATS_CHUNK = 64 * 1024
+# 逐行提取时 Frontmatter 和注释最多保留的字符数
+STREAM_FRONTMATTER_LIMIT = 1024 * 1024
+STREAM_COMMENT_LIMIT = 64 * 1024
+_INLINE_COMMENT_RE = re.compile(r'%%([^%]*%?[^%]*)%%')
+# 和 ObHashHeaderProcessor 中的正则保持一致
+_HEADING_RE = re.compile(r'^(#{1,6}) +((?:\\.|[^\\])*?)#*$')
+
+
+def stream_note(md_file: Path) -> ObMarks:
+    """逐行提取大笔记中的标记，内存占用和文件大小无关
+
+    提取 Frontmatter、链接、嵌入、标签、注释、标题、块 ID 和任务，跳过代码块和行内代码，
+    字数等统计逐行累加。不生成 HTML，也不保留正文（`content` 为空，需要时见 `read_note_body`）。
+    和 Markdown 解析相比是近似的：不识别 Setext 标题和缩进代码块，超长的行分段处理。
+    """
+    links: List[str] = []
+    embeds: List[str] = []
+    embedded: List[bool] = []
+    tags: List[str] = []
+    comments: List[str] = []
+    headings: List[Tuple[int, str]] = []
+    blocks: List[str] = []
+    tasks: List[ObTask] = []
+    stats = EMPTY_STATS
+    pending: List[str] = []     # 还没有统计字数的行
+    pending_size = 0
+    meta: dict = {}
+    fence: Optional[str] = None
+    comment: Optional[List[str]] = None     # 正在读取的多行注释
+    comment_size = 0
+    lineno = 0
+
+    def _extract(text: str):
+        """提取一行中代码以外的链接、标签和行内注释"""
+        if '`' in text:
+            text = _CODE_SPAN_RE.sub('', text)
+        if '%%' in text:
+            for m in _INLINE_COMMENT_RE.finditer(text):
+                if m.group(1).strip():
+                    comments.append(m.group(1).strip())
+            text = _INLINE_COMMENT_RE.sub('', text)
+        if '[[' in text:
+            for m in WIKILINK_RE.finditer(text):
+                label = m.group(1).strip()
+                if label:
+                    links.append(label)
+                    embedded.append(m.group(0).startswith('!'))
+                    if embedded[-1]:
+                        embeds.append(label)
+        if '#' in text:
+            tags.extend(t for t in TAG_RE.findall(text) if not t.isdigit())
+
+    def _feed(line: str):
+        nonlocal fence, comment, comment_size, stats, pending_size
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= STREAM_STATS_CHUNK:
+            stats += text_stats(''.join(pending))
+            pending.clear()
+            pending_size = 0
+        m = FENCE_RE.match(line)
+        if m and comment is None:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            return
+        if fence is not None:
+            return
+        m = TASK_RE.match(line) if '[' in line else None
+        if m:
+            status, body = m.groups()
+            due = None
+            m = TASK_DUE_RE.search(body)
+            if m:
+                try:
+                    due = datetime.date.fromisoformat(m.group(1))
+                except ValueError:
+                    pass
+            tasks.append(ObTask(lineno, status, body, due, tuple(TAG_RE.findall(body))))
+        line = line.rstrip('\n')
+        if comment is not None:
+            # 注释中的链接和标签也算，同 Markdown 解析
+            end = line.find('%%')
+            if end < 0:
+                _extract(line)
+                if comment_size < STREAM_COMMENT_LIMIT:
+                    comment.append(line)
+                    comment_size += len(line)
+                return
+            _extract(line[:end])
+            comment.append(line[:end])
+            comments.append('\n'.join(comment))
+            comment = None
+            line = line[end:].lstrip('%')
+        elif line.startswith('%%'):
+            rest = line.lstrip('%')
+            end = rest.find('%%')
+            if end < 0:
+                _extract(rest)
+                comment = [rest]
+                comment_size = len(rest)
+                return
+            _extract(rest[:end])
+            comments.append(rest[:end])
+            line = rest[end:].lstrip('%')
+        if line.startswith('#'):
+            m = _HEADING_RE.match(line)
+            if m:
+                headings.append((len(m.group(1)), m.group(2).strip()))
+        if '^' in line:
+            m = BLOCK_ID_RE.search(line)
+            if m:
+                blocks.append(m.group(1))
+        _extract(line)
+
+    with open(md_file, 'r', encoding='utf-8') as f:
+        read_line = functools.partial(f.readline, STREAM_LINE_LIMIT)
+        head: List[str] = []
+        first = read_line()
+        if first.lstrip('\ufeff').rstrip() == '---':
+            # Frontmatter 先缓存，没有结束（或者太长）就当作正文
+            head.append(first)
+            size = len(first)
+            for line in iter(read_line, ''):
+                head.append(line)
+                size += len(line)
+                if line.rstrip() == '---':
+                    meta = frontmatter.loads(''.join(head)).metadata
+                    lineno = len(head)
+                    head = []
+                    break
+                if size > STREAM_FRONTMATTER_LIMIT:
+                    break
+        elif first:
+            head.append(first)
+        at_line_start = True    # 超长的行分段读取时，只有第一段是新的一行
+        for line in itertools.chain(head, iter(read_line, '')):
+            if at_line_start:
+                lineno += 1
+            at_line_start = line.endswith('\n')
+            _feed(line)
+    if comment is not None:
+        comments.append('\n'.join(comment))
+    if pending:
+        stats += text_stats(''.join(pending))
+    stats = TextStats(stats.words, stats.cjk, stats.chars, stats.links, notes=1)
+    return ObMarks(md_file, '', meta, tags, links, comments, '', embeds,
+                   headings, blocks, tasks, stats=stats, streamed=True, embedded=embedded)
+
+
+def extract_headings(text: str) -> List[Tuple[int, str]]:
+    """逐行提取 `#` 标题 (level, text)，跳过代码块，用于预扫描时跳过解析的笔记"""
+    headings = []
+    fence = None
+    lines = text.split('\n')
+    for line in lines[_frontmatter_lines(lines):]:
+        m = FENCE_RE.match(line)
+        if m:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            continue
+        if fence is None and line.startswith('#'):
+            m = _HEADING_RE.match(line)
+            if m:
+                headings.append((len(m.group(1)), m.group(2).strip()))
+    return headings
+
+
+def iter_note_body(md_file: Path, chunk_size: int = STREAM_LINE_LIMIT) -> Iterator[str]:
+    """逐段读取笔记的正文（不含 Frontmatter），每段最多 chunk_size 个字符，内存占用和文件大小无关"""
+    with open(md_file, 'r', encoding='utf-8') as f:
+        read_line = functools.partial(f.readline, chunk_size)
+        head: List[str] = []
+        first = read_line()
+        head.append(first)
+        if first.lstrip('\ufeff').rstrip() == '---':
+            # 同 `stream_note`，没有结束（或者太长）的 Frontmatter 当作正文
+            size = len(first)
+            for line in iter(read_line, ''):
+                head.append(line)
+                size += len(line)
+                if line.rstrip() == '---':
+                    head = []
+                    break
+                if size > STREAM_FRONTMATTER_LIMIT:
+                    break
+        yield from filter(None, head)
+        yield from iter(functools.partial(f.read, chunk_size), '')
+
+
+def read_note_body(md_file: Path) -> str:
+    """读取笔记的正文（不含 Frontmatter）"""
+    with open(md_file, 'r', encoding='utf-8') as f:
+        return frontmatter.load(f).content
+
+
+def parse_note(md_file: Path, use_prescan=True, data: Optional[bytes] = None) -> ObMarks:
+    """解析一篇笔记，可以在线程池或进程池中调用
+
+    :param use_prescan: 先预扫描，没有标记的笔记直接返回空的 `ObMarks`
+    :param data: 已经读取（预读）的文件内容，不再打开文件。
+        没有提供时，超过 `STREAM_NOTE_SIZE` 的笔记逐行提取（`stream_note`）
+    """
+    if data is None:
+        if os.path.getsize(md_file) > STREAM_NOTE_SIZE:
+            return stream_note(md_file)
+        # 预扫描和解析使用同一次读取的内容
+        with open(md_file, 'rb') as f:
+            data = f.read()
+    text = decode_note(data)
+    if use_prescan and not _has_markers(data):
+        marks = ObMarks.empty(md_file, text)
+        if b'#' in data:
+            marks.headings = extract_headings(text)
+    else:
+        marks = ObMarkdown().parse_text(md_file, text)
+    marks.stats = text_stats(marks.content)
+    return marks
 
 
 if __name__ == '__main__':
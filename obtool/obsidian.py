@@ -2,15 +2,21 @@
 # 关于 Obsidian 的对象接口都在这里
 
 """
+import contextlib
+import difflib
 import functools
 import json
+import os
+import sys
+import threading
 import warnings
 import datetime
 from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from dataclasses import dataclass
 from pathlib import Path
 from urllib.parse import urlparse, parse_qsl
-from typing import Optional, Union, List, Dict, Set, Iterable, Callable, Any
+from typing import Optional, Union, List, Dict, Set, FrozenSet, Iterable, Callable, Any, NamedTuple, Tuple, cast
 
 try:
     from rich import print
@@ -19,8 +25,20 @@ except ImportError:
 
 import pyperclip
 
-from obtool.obmark import ObMarkdown, ObMarks
-from obtool.utils import get_app_dir
+from obtool.obmark import (ObMarks, ObLink, parse_note, read_note_body, normalize_heading,
+                           replace_link_targets, STREAM_NOTE_SIZE)
+from obtool.utils import get_app_dir, atomic_write_batch
+from obtool.completion import VaultCompletion
+from obtool.ignore import IgnoreMatcher
+from obtool.manifest import ScanManifest, rules_key
+from obtool import noteedit
+from obtool.noteedit import normalize_tag
+from obtool.prefetch import ReadAhead, ReadAheadStats
+from obtool.properties import PropertyIndex
+from obtool.recent import MtimeIndex, FileStat
+from obtool.shards import NameDirectory, build_directory
+from obtool.tasks import TaskIndex
+from obtool.textstats import TextStats, EMPTY_STATS
 
 """
 https://help.obsidian.md/Advanced+topics/Accepted+file+formats
@@ -34,6 +52,14 @@ Video files: mp4, webm, ogv, mov, mkv;
 PDF files: pdf.
 """
 
+# 并行解析时，每个线程/进程最多排队的任务数量
+PARSE_PENDING_PER_WORKER = 4
+# 批量解析时至少每解析这么多篇笔记发布一次索引快照，见 `ObVault.writer`
+PUBLISH_EVERY = 500
+# 发布后第一次修改要复制整个字典，所以发布的间隔还至少是已解析笔记数量的 1/PUBLISH_FRACTION，
+# 间隔随索引增大，全部解析时复制的总量和笔记数量成正比
+PUBLISH_FRACTION = 4
+
 NOTE_FORMATS = ['.md']
 IMAGE_FORMATS = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg']
 AUDIO_FORMATS = ['.mp3', '.wav', '.m4a', '.ogg', '.3gp', '.flac']
@@ -86,6 +112,150 @@ class ObVaultState:
         return datetime.datetime.fromtimestamp(self.ts // 1000)
 
 
+@dataclass
+class ObWalkStats:
+    """遍历仓库时忽略的数量"""
+    pruned_folders: int = 0     # 匹配忽略规则而没有进入的文件夹
+    ignored_files: int = 0      # 匹配忽略规则的文件
+    reused_folders: int = 0     # 使用扫描清单而没有重新列出的文件夹
+
+
+@dataclass
+class ObParseStats:
+    """笔记解析计数"""
+    parsed: int = 0     # 完整解析的笔记数量
+    skipped: int = 0    # 预扫描没有发现标记而跳过解析的笔记数量
+
+    @property
+    def total(self):
+        return self.parsed + self.skipped
+
+
+class ObAnchors(NamedTuple):
+    """笔记中可以被链接的位置"""
+    headings: FrozenSet[str]    # 归一化后的标题，见 `normalize_heading`
+    blocks: FrozenSet[str]      # 块 ID
+
+
+EMPTY_ANCHORS = ObAnchors(frozenset(), frozenset())
+
+
+@dataclass(frozen=True)
+class ObIndexSnapshot:
+    """某一时刻的仓库索引
+
+    发布之后其中的字典、集合和列表都不会再被修改，其它线程可以不加锁地读取。
+    """
+    version: int
+    map: Dict[str, 'ObFile']
+    same_names: Dict[str, List['ObFile']]
+    tags: Dict[str, Set['ObNote']]
+    back_links: Dict[str, Set['ObNote']]
+
+
+class ObIndexDraft:
+    """正在修改的仓库索引，写时复制
+
+    发布快照后，字典和其中的集合、列表都和快照共享；
+    修改前先复制一份，发布之前同一个对象只复制一次。
+    """
+    FIELDS = ('map', 'same_names', 'tags', 'back_links')
+
+    def __init__(self):
+        self.map: Dict[str, ObFile] = {}
+        self.same_names: Dict[str, List[ObFile]] = {}
+        self.tags: Dict[str, Set[ObNote]] = {}
+        self.back_links: Dict[str, Set[ObNote]] = {}
+        self._copied: Set[str] = set(self.FIELDS)
+        self._copied_items: Dict[str, Set[str]] = defaultdict(set)
+
+    def _own(self, field: str) -> dict:
+        if field not in self._copied:
+            setattr(self, field, dict(getattr(self, field)))
+            self._copied.add(field)
+        return getattr(self, field)
+
+    def _own_item(self, field: str, key: str, factory: Callable) -> Any:
+        d = self._own(field)
+        copied = self._copied_items[field]
+        if key not in copied:
+            d[key] = factory(d.get(key, ()))
+            copied.add(key)
+        return d[key]
+
+    def set(self, field: str, key: str, value):
+        self._own(field)[key] = value
+        self._copied_items[field].add(key)
+
+    def pop(self, field: str, key: str):
+        self._copied_items[field].discard(key)
+        return self._own(field).pop(key)
+
+    def add_member(self, field: str, key: str, member):
+        self._own_item(field, key, set).add(member)
+
+    def append_member(self, field: str, key: str, member):
+        self._own_item(field, key, list).append(member)
+
+    def discard_member(self, field: str, key: str, member):
+        """从集合或列表中移除，空了就删除 key"""
+        if member not in getattr(self, field).get(key, ()):
+            return
+        items = self._own_item(field, key, type(getattr(self, field)[key]))
+        if isinstance(items, list):
+            items.remove(member)
+        else:
+            items.discard(member)
+        if not items:
+            self.pop(field, key)
+
+    def publish(self, version: int) -> ObIndexSnapshot:
+        """生成快照，之后的修改都要重新复制"""
+        self._copied.clear()
+        self._copied_items.clear()
+        return ObIndexSnapshot(version, self.map, self.same_names, self.tags, self.back_links)
+
+
+@dataclass
+class ObResolvedLink:
+    """链接的解析结果"""
+    link: ObLink
+    file: Optional['ObFile']        # None 表示链接的文件不存在
+    anchor_found: Optional[bool]    # 链接的标题/块是否存在，没有标题/块时为 None
+
+    @property
+    def dangling(self):
+        return self.anchor_found is False
+
+
+@dataclass
+class ObRenameResult:
+    """重命名的结果"""
+    file: 'ObFile'                  # 重命名后的文件
+    old_name: str                   # 原来的相对路径名称
+    changed_notes: List['ObNote']   # 修改了链接的笔记
+    links: int                      # 修改的链接数量
+
+
+@dataclass
+class ObBatchEditResult:
+    """批量修改的结果"""
+    changes: List[Tuple['ObNote', str, str]]    # (笔记, 原文, 修改后的内容)
+    unchanged: int                  # 没有变化的笔记数量
+    dry_run: bool                   # 只是预览，没有写入
+
+    @property
+    def changed_notes(self) -> List['ObNote']:
+        return [note for note, _, _ in self.changes]
+
+    def iter_diff(self, context: int = 3) -> Iterable[str]:
+        """统一格式（unified diff）的修改内容"""
+        for note, old, new in self.changes:
+            name = note.path.relative_to(note.vault.path).as_posix()
+            yield from difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True),
+                                            f'a/{name}', f'b/{name}', n=context)
+
+
 @dataclass
 class ObURI:
     url: str
@@ -141,17 +311,36 @@ def get_uri_from_clip():
         return parse_obsidian_url(txt)
 
 
+def iter_tag_levels(tag: str) -> Iterable[str]:
+    """嵌套标签要逐个加上: `a/b/c` -> `a/b/c`, `a`, `a/b`"""
+    yield tag
+    if '/' in tag:
+        i = 0
+        while True:
+            i = tag.find('/', i)
+            if i < 0:
+                break
+            yield tag[:i]
+            i += 1
+
+
 class ObVault:
     """
     """
     ignores = ['.obsidian']
 
     @classmethod
-    def open(cls, name_or_path):
+    def open(cls, name_or_path, **kwargs):
         vs = find_vault(name_or_path)
-        return cls(vs.path)
+        return cls(vs.path, **kwargs)
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, scan_manifest=False, sharded=False):
+        """
+        :param scan_manifest: 使用缓存目录中的扫描清单，修改时间没有变化的文件夹不再列出，
+            见 `obtool.manifest`
+        :param sharded: 按顶层文件夹分片，用到时才加载，见 `obtool.shards`。
+            分片模式下不使用扫描清单
+        """
         self.path = path
         self.name = self.path.name
         self._settings = self.load_settings()
@@ -160,16 +349,46 @@ class ObVault:
             warnings.warn("当前库的链接格式没有启用 Wiki 链接格式，笔记无法准确解析。",
                           UseMarkdownLinkWarning)
 
+        # 索引每次修改都加 1，依赖索引的计算结果可以据此缓存，见 `cached`
+        self.index_version = 0
+        self._cache: Dict[str, Tuple[int, Any]] = {}
+        self.ignore = IgnoreMatcher.from_vault(self.path, self._settings)
+        self.walk_stats = ObWalkStats()
+        self.scan_manifest = scan_manifest
+        self.sharded = sharded
+        # 分片模式下还没有加载的顶层文件夹，以及所有分片中文件名称的目录
+        self._pending_shards: FrozenSet[str] = frozenset()
+        self._directory: Optional[NameDirectory] = None
         self._folders: List[Path] = []
         self._files: List[Path] = []
-        self._tags: Dict[str, Set['ObNote']] = defaultdict(set)
+        # 补全索引，第一次使用时才创建，之后随映射增量更新
+        self._completion: Optional[VaultCompletion] = None
+        # 按修改时间排序的文件索引，第一次使用时才创建，之后随映射增量更新
+        self._mtime_index: Optional[MtimeIndex] = None
+        # 映射、重名、标签和反链索引：修改在 `writer` 中进行，读取使用最新发布的快照
+        self._lock = threading.RLock()
+        self._writer_thread: Optional[int] = None
+        self._writer_depth = 0
+        self._draft = ObIndexDraft()
+        self._snapshot = self._draft.publish(0)
+        # Frontmatter 属性索引，按属性分列保存
+        self.properties = PropertyIndex()
+        # 任务列表中的复选框
+        self.tasks = TaskIndex()
         self._walk()
-        self._map: Dict[str, ObFile] = {}
-        self._back_links: Dict[str, Set[ObNote]] = defaultdict(set)
-        self._same_names: Dict[str, List[ObFile]] = {}
-        self._build_map()
+        with self.writer():
+            self._build_map()
         # 耗时任务的进度条
         self.progress_bar: Optional[Callable[[Iterable], Any]] = None
+        # 解析前先预扫描，没有任何标记的笔记跳过 Markdown 解析
+        self.prescan = True
+        self.parse_stats = ObParseStats()
+        # 并行解析的数量，以及是否使用进程池，见 `iter_parsed`
+        self.parse_workers = 1
+        self.parse_in_processes = False
+        # 解析时预读的笔记数量，0 表示不预读，见 `obtool.prefetch`
+        self.read_ahead = 0
+        self.read_ahead_stats: Optional[ReadAheadStats] = None
 
     def __repr__(self):
         return f'<ObVault: {self.name}>'
@@ -183,53 +402,347 @@ class ObVault:
         return _settings
 
     def _walk(self):
+        """广度优先遍历仓库，文件夹从外到内排列
+
+        以 `.` 开头的以及匹配忽略规则的文件和文件夹都跳过，被忽略的文件夹不再进入。
+        分片模式下只列出根目录，顶层文件夹只记录其中的文件名称，见 `load_shards`。
+        """
+        if self.sharded:
+            files, folders, pruned, ignored = self._scan_counted(self.path)
+            self.walk_stats.pruned_folders += pruned
+            self.walk_stats.ignored_files += ignored
+            self._files = files
+            shards = sorted(f.name for f in folders)
+            self._directory = build_directory(self.path, shards, self.ignore)
+            self._pending_shards = frozenset(shards)
+            return
+
+        manifest = None
+        if self.scan_manifest:
+            manifest = ScanManifest.load(self.path, rules_key(self.ignore.rules))
+        self._files, self._folders = self._walk_tree(self.path, manifest)
+        if manifest is not None:
+            self.walk_stats.reused_folders = manifest.reused
+            if manifest.changed:
+                try:
+                    manifest.save()
+                except OSError as e:
+                    warnings.warn(f'保存扫描清单失败: {e}')
+
+    def _walk_tree(self, root: Path,
+                   manifest: Optional[ScanManifest] = None) -> Tuple[List[Path], List[Path]]:
+        """遍历 root 之下的文件和文件夹（不含 root 本身），忽略的数量计入 `walk_stats`"""
+        _files = []
         _folders = []
-        for p in self.path.glob('*'):
-            if p.name.startswith('.'):
-                continue
-            if p.is_dir():
-                _folders.append(p)
-            elif p.is_file():
-                self._files.append(p)
-        _queue = deque(_folders)
+        _queue = deque([root])
         while _queue:
-            f = _queue.popleft()
-            for p in f.glob('*'):
-                if p.name.startswith('.'):
+            folder = _queue.popleft()
+            if manifest is not None:
+                files, folders, pruned, ignored = manifest.scan(folder, self._scan_counted)
+            else:
+                files, folders, pruned, ignored = self._scan_counted(folder)
+            self.walk_stats.pruned_folders += pruned
+            self.walk_stats.ignored_files += ignored
+            _files.extend(files)
+            _queue.extend(folders)
+            _folders.extend(folders)
+        return _files, _folders
+
+    def _scan_counted(self, folder: Path) -> Tuple[List[Path], List[Path], int, int]:
+        """列出文件夹的内容，同时返回忽略的子文件夹和文件的数量"""
+        stats = ObWalkStats()
+        files, folders = self._scan_folder(folder, stats)
+        return files, folders, stats.pruned_folders, stats.ignored_files
+
+    def _scan_folder(self, folder: Path, stats: Optional[ObWalkStats] = None,
+                     file_stats: Optional[List[FileStat]] = None) -> Tuple[List[Path], List[Path]]:
+        """列出文件夹中没有被忽略的文件和子文件夹，忽略的数量计入 `stats`
+
+        :param file_stats: 指定时，文件的修改时间和大小（目录项的 `stat`）加到其中
+        """
+        files = []
+        folders = []
+        ignore = self.ignore
+        rel_folder = '' if folder == self.path else folder.relative_to(self.path).as_posix() + '/'
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                is_dir = entry.is_dir()
+                if ignore and ignore.match(rel_folder + entry.name, is_dir):
+                    if stats is not None and is_dir:
+                        stats.pruned_folders += 1
+                    elif stats is not None:
+                        stats.ignored_files += 1
                     continue
-                if p.is_dir():
-                    _queue.append(p)
-                    _folders.append(p)
-                elif p.is_file():
-                    self._files.append(p)
-        self._folders = _folders
+                p = folder.joinpath(entry.name)
+                if is_dir:
+                    folders.append(p)
+                elif entry.is_file():
+                    if file_stats is not None:
+                        try:
+                            st = entry.stat()
+                        except OSError:  # 遍历时被删除
+                            continue
+                        file_stats.append(FileStat(p, st.st_mtime_ns, st.st_size))
+                    files.append(p)
+        return files, folders
+
+    def sync_folder(self, folder: Path) -> Tuple[List['ObFile'], List['ObFile']]:
+        """文件夹的内容在外部变化后（新建、删除、移动了文件），同步映射和索引
+
+        只比较这个文件夹的直接内容，新建的子文件夹会整个加入，删除的子文件夹整个移除。
+        :return: 新增的文件和删除的文件
+        """
+        if folder == self.path:
+            self.load_all_shards()
+        else:
+            self.load_shards([self._shard_of(folder)])
+        with self.writer():
+            known_files = {p for p in self._files if p.parent == folder}
+            known_folders = {p for p in self._folders if p.parent == folder}
+            files, folders = self._scan_folder(folder) if folder.is_dir() else ([], [])
+            added_paths = [p for p in files if p not in known_files]
+            removed_paths = known_files.difference(files)
+            for sub in known_folders.difference(folders):
+                removed_paths.update(p for p in self._files if sub in p.parents)
+                self._folders = [f for f in self._folders if f != sub and sub not in f.parents]
+            queue = deque(f for f in folders if f not in known_folders)
+            while queue:
+                sub = queue.popleft()
+                self._add_folders(sub)
+                sub_files, sub_folders = self._scan_folder(sub)
+                added_paths.extend(sub_files)
+                queue.extend(sub_folders)
+
+            removed = [f for f in map(self.get_file_by_path, removed_paths) if f is not None]
+            for ob_file in removed:
+                if ob_file.is_note() and cast(ObNote, ob_file).parsed:
+                    self._unindex_note(cast(ObNote, ob_file))
+                self._map_remove(ob_file)
+            if removed_paths:
+                self._files = [p for p in self._files if p not in removed_paths]
+            added = []
+            if added_paths:
+                self._files = self._files + added_paths
+                for p in added_paths:
+                    ob_file = self._new_file(p)
+                    self._map_add(ob_file)
+                    added.append(ob_file)
+        return added, removed
 
     def _build_map(self):
         for p in self._files:
-            if p.suffix == '.md':
-                ob_file = ObNote(p, self)
-            else:
-                ob_file = ObFile(p, self)
+            self._map_add(self._new_file(p))
 
-            key = ob_file.name
+    def _shard_of(self, path: Path) -> str:
+        """路径所在的分片，即相对仓库根目录的第一级名称"""
+        try:
+            parts = path.relative_to(self.path).parts
+        except ValueError:
+            return ''
+        return parts[0] if parts else ''
 
-            if key in self._same_names:
-                # 已经有重名记录了，说明这至少是第 3 个重名的了
-                self._map[ob_file.long_name] = ob_file
-                self._same_names[key].append(ob_file)
-            elif key not in self._map:
-                # 没有重名也没有记录，完美
-                self._map[key] = ob_file
-            else:
-                # 没有重名但是有记录，说明这是刚发现的重名
-                exist = self._map.pop(key)
-                self._same_names[key] = [exist, ob_file]
-                self._map[exist.long_name] = exist
-                self._map[ob_file.long_name] = ob_file
+    def load_shards(self, shards: Iterable[str]):
+        """加载分片（顶层文件夹）：遍历并建立映射，已经加载的和不是分片的名称跳过"""
+        if not self._pending_shards:
+            return
+        with self._lock:
+            todo = [s for s in shards if s in self._pending_shards]
+            if not todo:
+                return
+            with self.writer():
+                for shard in todo:
+                    folder = self.path.joinpath(shard)
+                    files, folders = self._walk_tree(folder)
+                    self._files = self._files + files
+                    self._folders = self._folders + [folder] + folders
+                    if self._completion:
+                        for f in [folder, *folders]:
+                            self._completion.folders.add(f.relative_to(self.path).as_posix())
+                    for p in files:
+                        self._map_add(self._new_file(p))
+            # 新的映射发布之后，其它线程才不再等待加载
+            self._pending_shards = self._pending_shards.difference(todo)
+
+    def load_all_shards(self):
+        """加载所有还没有加载的分片，不是分片模式时什么也不做"""
+        self.load_shards(sorted(self._pending_shards))
+
+    def _load_shards_of_name(self, name: str):
+        """加载包含这个名称的分片，之后按名称查找映射的结果是完整的"""
+        if self._pending_shards:
+            self.load_shards(self._directory.shards_of(name))
+
+    def _new_file(self, p: Path) -> 'ObFile':
+        if p.suffix == '.md':
+            return ObNote(p, self)
+        else:
+            return ObFile(p, self)
+
+    @contextlib.contextmanager
+    def writer(self, publish=True):
+        """修改索引的上下文，同一时间只有一个线程可以修改
+
+        在上下文中读到的是正在修改的索引，其它线程读到的仍然是之前发布的快照；
+        最外层的上下文退出时发布新的快照。可以嵌套使用。
+
+        :param publish: False 表示退出时不发布，修改留到之后的 `writer` 退出时一起发布
+        """
+        with self._lock:
+            self._writer_thread = threading.get_ident()
+            self._writer_depth += 1
+            try:
+                yield self._draft
+            finally:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    if publish:
+                        self.publish()
+                    self._writer_thread = None
+
+    def publish(self):
+        """发布当前的索引，需要在 `writer` 中调用"""
+        self._snapshot = self._draft.publish(self.index_version)
+
+    def snapshot(self) -> ObIndexSnapshot:
+        """最新发布的索引快照，适合在其它线程中做多次一致的查询"""
+        return self._snapshot
+
+    def _index(self) -> Union[ObIndexSnapshot, ObIndexDraft]:
+        """当前线程应该读取的索引：修改索引的线程读取正在修改的，其它线程读取快照"""
+        if self._writer_thread == threading.get_ident():
+            return self._draft
+        return self._snapshot
+
+    @property
+    def _map(self) -> Dict[str, 'ObFile']:
+        return self._index().map
+
+    @property
+    def _same_names(self) -> Dict[str, List['ObFile']]:
+        return self._index().same_names
+
+    @property
+    def _tags(self) -> Dict[str, Set['ObNote']]:
+        return self._index().tags
+
+    @property
+    def _back_links(self) -> Dict[str, Set['ObNote']]:
+        return self._index().back_links
+
+    def _map_set(self, key: str, ob_file: 'ObFile'):
+        self._draft.set('map', key, ob_file)
+        self.index_version += 1
+        if self._completion:
+            self._completion.files.add(key)
+
+    def _map_del(self, key: str) -> 'ObFile':
+        self.index_version += 1
+        if self._completion:
+            self._completion.files.remove(key)
+        return self._draft.pop('map', key)
+
+    def _map_add(self, ob_file: 'ObFile'):
+        key = ob_file.name
+
+        if key in self._same_names:
+            # 已经有重名记录了，说明这至少是第 3 个重名的了
+            self._map_set(ob_file.long_name, ob_file)
+            self._draft.append_member('same_names', key, ob_file)
+        elif key not in self._map:
+            # 没有重名也没有记录，完美
+            self._map_set(key, ob_file)
+        else:
+            # 没有重名但是有记录，说明这是刚发现的重名
+            exist = self._map_del(key)
+            self._draft.set('same_names', key, [exist, ob_file])
+            self._map_set(exist.long_name, exist)
+            self._map_set(ob_file.long_name, ob_file)
+        if self._completion and ob_file.is_note():
+            self._completion.notes.add(key)
+        if self._mtime_index is not None:
+            self._mtime_index.update(ob_file.path)
+
+    def _map_remove(self, ob_file: 'ObFile'):
+        """从映射中移除文件，是 `_map_add` 的逆操作"""
+        key = ob_file.name
+        if self._completion and ob_file.is_note():
+            self._completion.notes.remove(key)
+        if self._mtime_index is not None:
+            self._mtime_index.remove(ob_file.path)
+
+        if key not in self._same_names:
+            self._map_del(key)
+            return
+        self._draft.discard_member('same_names', key, ob_file)
+        self._map_del(ob_file.long_name)
+        same = self._same_names[key]
+        if len(same) == 1:
+            # 只剩一个了，不再重名，恢复用短名称记录
+            exist = same[0]
+            self._draft.pop('same_names', key)
+            self._map_del(exist.long_name)
+            self._map_set(key, exist)
+
+    @property
+    def completion(self) -> VaultCompletion:
+        """名称补全索引"""
+        if self._completion is None:
+            self.load_all_shards()
+            # 在写锁中建立，建立期间其它线程不会修改文件映射，之后的修改都会同步到补全索引
+            with self.writer(publish=False):
+                if self._completion is None:
+                    completion = VaultCompletion()
+                    for key, ob_file in self._map.items():
+                        completion.files.add(key)
+                        if ob_file.is_note():
+                            completion.notes.add(ob_file.name)
+                    for folder in self._folders:
+                        completion.folders.add(folder.relative_to(self.path).as_posix())
+                    self._completion = completion
+        return self._completion
+
+    @property
+    def mtime_index(self) -> MtimeIndex:
+        """按修改时间排序的文件索引，见 `obtool.recent`"""
+        if self._mtime_index is None:
+            self.load_all_shards()
+            self._mtime_index = MtimeIndex.build(self._files)
+        return self._mtime_index
+
+    def refresh_mtime_index(self) -> MtimeIndex:
+        """重新遍历仓库，发现在外部新增、删除、修改的文件
+
+        新增、删除了文件的文件夹用 `sync_folder` 同步，
+        `mtime_index` 用遍历时读取的修改时间和大小更新，不需要重新排序。
+        """
+        self.load_all_shards()
+        stats: List[FileStat] = []
+        files: Set[Path] = set()
+        folders: Set[Path] = set()
+        queue = deque([self.path])
+        while queue:
+            folder = queue.popleft()
+            sub_files, sub_folders = self._scan_folder(folder, file_stats=stats)
+            files.update(sub_files)
+            folders.update(sub_folders)
+            queue.extend(sub_folders)
+        # 直接内容有变化的文件夹，从外到内同步，新的子文件夹在同步上级时整个加入
+        changed = {p.parent for p in files.symmetric_difference(self._files)}
+        changed.update(f.parent for f in folders.symmetric_difference(self._folders))
+        for folder in sorted(changed, key=lambda f: len(f.parts)):
+            if folder == self.path or folder in folders:
+                self.sync_folder(folder)
+        if self._mtime_index is None:
+            self._mtime_index = MtimeIndex()
+        self._mtime_index.revalidate(stats)
+        return self._mtime_index
 
     @property
     def moc(self):
         """map of contents"""
+        self.load_all_shards()
         return self._map
 
     @property
@@ -255,6 +768,7 @@ class ObVault:
         'X.png': [Path('E:/Vault/../X.png'), Path('E:/Vault/.../X.png.md')]
         这种情况如果不是特意构造可能不会出现,但是一旦出现,逻辑无法处理
         """
+        self.load_all_shards()
         return self._same_names
 
     def get_file(self, name: str) -> Union['ObFile', List['ObFile']]:
@@ -263,6 +777,7 @@ class ObVault:
         这里的 name 主要是从链接 [[]] 解析出来的值
         """
         input_name = name
+        self._load_shards_of_name(name)
         if name in self._map:
             if name in self._same_names:
                 # 此时表示根目录下有重名笔记的情况出现，应该给与一定的提示
@@ -291,6 +806,7 @@ class ObVault:
                 raise ValueError(f'仓库外的路径：{input_name}')
 
             name = pth.name
+            self._load_shards_of_name(name)
             p = self._map.get(name)
             if p:
                 return p
@@ -311,16 +827,39 @@ class ObVault:
         # 不存在的文件夹也是自动创建
         return ObNote(None, self, input_name)
 
-    def iter_files(self, file_type='') -> Iterable["ObFile"]:
-        """遍历所有笔记(.md)"""
+    def get_file_by_path(self, path: Path) -> Optional['ObFile']:
+        """根据路径查找仓库中的文件，不存在返回 None"""
+        self.load_shards([self._shard_of(path)])
+        name = path.stem if path.suffix == '.md' else path.name
+        for ob_file in self._same_names.get(name) or [self._map.get(name)]:
+            if ob_file is not None and ob_file.path == path:
+                return ob_file
+        return None
+
+    def iter_files(self, file_type='', folder: Union[str, Path, None] = None) -> Iterable["ObFile"]:
+        """遍历文件
+
+        :param file_type: 文件类型（如 note、image）或后缀（如 .png），缺省是所有文件
+        :param folder: 只遍历这个文件夹中的文件，相对路径是相对仓库根目录的。
+            分片模式下只加载这个文件夹所在的分片
+        """
+        if folder is not None:
+            folder = self.path.joinpath(folder)
+        if folder is None or folder == self.path:
+            folder = None
+            self.load_all_shards()
+        else:
+            self.load_shards([self._shard_of(folder)])
         for ob_file in self._map.values():
+            if folder is not None and not ob_file.in_folder(folder):
+                continue
             if not file_type \
                     or getattr(ob_file, 'file_type', None) == file_type \
                     or getattr(ob_file, 'suffix', None) == file_type:
                 yield ob_file
 
-    def iter_notes(self) -> Iterable["ObNote"]:
-        yield from self.iter_files('note')
+    def iter_notes(self, folder: Union[str, Path, None] = None) -> Iterable["ObNote"]:
+        yield from self.iter_files('note', folder)
 
     @property
     def notes(self):
@@ -328,10 +867,12 @@ class ObVault:
 
     @property
     def folders(self):
+        self.load_all_shards()
         return self._folders
 
     @property
     def files(self):
+        self.load_all_shards()
         return self._files
 
     @property
@@ -339,10 +880,235 @@ class ObVault:
         return self._tags
 
     def add_tag(self, tag, note):
-        self._tags[tag].add(note)
+        with self.writer() as index:
+            index.add_member('tags', tag, note)
+            self.index_version += 1
 
     def add_back_link(self, name, note):
-        self._back_links[name].add(note)
+        with self.writer() as index:
+            index.add_member('back_links', name, note)
+            self.index_version += 1
+
+    def cached(self, key: str, factory: Callable[['ObVault'], Any]) -> Any:
+        """缓存依赖索引的计算结果，索引修改后重新计算"""
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == self.index_version:
+            return cached[1]
+        value = factory(self)
+        self._cache[key] = (self.index_version, value)
+        return value
+
+    def _unindex_note(self, note: 'ObNote'):
+        """移除笔记在标签、反链、属性和任务索引中的记录"""
+        with self.writer() as index:
+            self.index_version += 1
+            self.properties.remove(note)
+            self.tasks.remove(note)
+            for tag in note.tags or []:
+                for t in iter_tag_levels(tag):
+                    index.discard_member('tags', t, note)
+            for link in note.ob_links:
+                index.discard_member('back_links', link.target, note)
+
+    def _link_keys(self, ob_file: 'ObFile') -> Set[str]:
+        """链接到这个文件时可能使用的目标写法，即反链索引中可能的 key"""
+        keys = {ob_file.name, ob_file.long_name}
+        if ob_file.is_note():
+            keys.add(ob_file.long_name + '.md')
+            keys.add(ob_file.name + '.md')
+        return keys
+
+    def rename(self, name: str, new_name: str) -> 'ObRenameResult':
+        """重命名（移动）文件，并更新所有链接到它的笔记
+
+        通过反链索引只修改引用了该文件的笔记，链接中的 `#标题` 和 `|别名` 保持不变。
+        所有笔记的修改都先写入临时文件，全部成功后再替换。
+
+        :param name: 文件名称，同 `get_file`
+        :param new_name: 新名称，不含 `/` 时在原文件夹中改名，否则是相对仓库根目录的路径。
+            笔记可以省略 `.md` 后缀，其它文件需要包含后缀
+        """
+        ob_file = self.get_file(name)
+        if isinstance(ob_file, list):
+            raise ValueError(f'有重名文件，请使用相对路径: {[f.long_name for f in ob_file]}')
+        if not ob_file.exists:
+            raise FileNotFoundError(f'文件不存在：{name}')
+        new_name = new_name.strip().replace('\\', '/').strip('/')
+        if ob_file.is_note() and not new_name.endswith('.md'):
+            new_name += '.md'
+        if '/' in new_name:
+            new_path = self.path.joinpath(new_name)
+        else:
+            new_path = ob_file.path.with_name(new_name)
+        new_path = new_path.resolve()
+        try:
+            new_path.relative_to(self.path)
+        except ValueError:
+            raise ValueError(f'仓库外的路径：{new_name}')
+        if new_path.exists():
+            raise FileExistsError(f'文件已存在：{new_path}')
+        if new_path.suffix != ob_file.path.suffix:
+            raise ValueError(f'不能修改文件类型：{ob_file.path.suffix} -> {new_path.suffix}')
+
+        # 反链索引依赖解析结果
+        self.ensure_all_parsed()
+        referencing = self.get_back_links_of(ob_file)
+
+        old_path = ob_file.path
+        old_long_name = ob_file.long_name
+        new_short = new_path.stem if ob_file.is_note() else new_path.name
+        new_long_name = new_path.relative_to(self.path).as_posix()
+        if ob_file.is_note():
+            new_long_name = new_long_name[:-3]
+        # 新名称和其它文件重名时，链接需要使用相对路径
+        others = self._same_names.get(new_short, [self._map.get(new_short)])
+        duplicated = any(f is not None and f is not ob_file for f in others)
+        new_link_text = new_long_name if duplicated else new_short
+
+        changes = []
+        links_count = 0
+        for note in referencing:
+            def _replace(target, _note=note):
+                # `[[b.md]]` 这样带后缀的链接，去掉后缀再查找，替换时保留后缀
+                with_suffix = ob_file.is_note() and target.endswith('.md')
+                if self.resolve_target(target[:-3] if with_suffix else target, _note) is not ob_file:
+                    return None
+                with_path = '/' in target
+                new_target = new_long_name if with_path else new_link_text
+                if with_suffix:
+                    new_target += '.md'
+                return new_target
+
+            with open(note.path, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+            new_text, count = replace_link_targets(text, _replace)
+            if count:
+                changes.append((note, new_text))
+                links_count += count
+
+        # 笔记自身可能也在修改列表中，所以先写笔记再移动文件
+        atomic_write_batch((note.path, text) for note, text in changes)
+        new_path.parent.mkdir(parents=True, exist_ok=True)
+        os.rename(old_path, new_path)
+
+        # 增量更新映射和索引
+        with self.writer():
+            self._map_remove(ob_file)
+            files = list(self._files)
+            files[files.index(old_path)] = new_path
+            self._files = files
+            self._add_folders(new_path.parent)
+            ob_file.path = new_path
+            ob_file.name = ob_file._short_name()
+            self._map_add(ob_file)
+            changed_notes = [note for note, _ in changes]
+            to_refresh = set(changed_notes)
+            if ob_file.is_note():
+                to_refresh.add(ob_file)
+            for note in to_refresh:
+                self.refresh_note(note)
+        return ObRenameResult(ob_file, old_long_name, changed_notes, links_count)
+
+    def select_notes(self, folder: Union[str, Path, None] = None, tags: Iterable[str] = ()) -> List['ObNote']:
+        """批量修改的目标：文件夹中（缺省整个仓库）带有所有指定标签的笔记
+
+        指定文件夹时只解析其中的笔记。
+        """
+        notes = list(self.iter_notes(folder))
+        tags = list(tags)
+        if not tags:
+            return notes
+        for _ in self.iter_parsed(notes):
+            pass
+        tagged = self.find_notes_by_tags(tags, op='AND')
+        return [note for note in notes if note in tagged]
+
+    def batch_edit(self, notes: Iterable['ObNote'], edit: Callable[[str], str],
+                   dry_run=False, workers: Optional[int] = None) -> ObBatchEditResult:
+        """批量修改笔记的内容
+
+        读取和修改在线程池中进行，任何一篇笔记出错都不会写入。
+        修改后的内容先全部写入临时文件，再逐个替换（见 `atomic_write_batch`），
+        之后重新解析有变化的笔记，增量更新标签、反链等索引。
+
+        :param edit: 传入笔记原文，返回修改后的内容，见 `obtool.noteedit`
+        :param dry_run: 只计算修改，不写入，可以用 `ObBatchEditResult.iter_diff` 预览
+        :param workers: 线程数量，缺省同 `ThreadPoolExecutor`
+        """
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+
+        def _edit(note: 'ObNote') -> Tuple['ObNote', str, str]:
+            with open(note.path, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+            try:
+                return note, text, edit(text)
+            except ValueError as e:
+                raise ValueError(f'{note.long_name}: {e}') from e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_edit, notes))
+        changes = [(note, old, new) for note, old, new in results if new != old]
+        if changes and not dry_run:
+            atomic_write_batch(((note.path, new) for note, _, new in changes), workers=workers)
+            with self.writer():
+                for note, _, _ in changes:
+                    self.refresh_note(note)
+        return ObBatchEditResult(changes, len(results) - len(changes), dry_run)
+
+    def tag_notes(self, notes: Iterable['ObNote'], tags: Iterable[str], **kwargs) -> ObBatchEditResult:
+        """给笔记加上标签（写在 Frontmatter 中），已经有这个标签的笔记不修改"""
+        tags = [normalize_tag(t) for t in tags]
+        return self.batch_edit(notes, functools.partial(noteedit.add_tags, tags=tags), **kwargs)
+
+    def untag_notes(self, notes: Iterable['ObNote'], tags: Iterable[str], **kwargs) -> ObBatchEditResult:
+        """从笔记的 Frontmatter 和正文中删除标签"""
+        tags = [normalize_tag(t) for t in tags]
+        return self.batch_edit(notes, functools.partial(noteedit.remove_tags, tags=tags), **kwargs)
+
+    def rename_tag(self, old: str, new: str, **kwargs) -> ObBatchEditResult:
+        """标签改名，子标签一起改名，通过标签索引找到要修改的笔记"""
+        old, new = normalize_tag(old), normalize_tag(new)
+        if old == new:
+            raise ValueError(f'新旧标签相同: {old}')
+        self.ensure_all_parsed()
+        notes = sorted(self.tags.get(old, ()), key=lambda n: n.path)
+        return self.batch_edit(notes, functools.partial(noteedit.rename_tag, old=old, new=new), **kwargs)
+
+    def set_property(self, notes: Iterable['ObNote'], key: str, value: Any, **kwargs) -> ObBatchEditResult:
+        """设置笔记的 Frontmatter 属性，`value` 为 None 时删除属性"""
+        key = key.strip()
+        if not key:
+            raise ValueError('属性名不能为空')
+        return self.batch_edit(notes, functools.partial(noteedit.set_property, key=key, value=value), **kwargs)
+
+    def _add_folders(self, folder: Path):
+        """新建的文件夹加入到文件夹列表中，保持从外到内的顺序"""
+        new_folders = []
+        while folder != self.path and folder not in self._folders:
+            new_folders.append(folder)
+            folder = folder.parent
+        # 复制后替换，其它线程可能正在遍历
+        self._folders = self._folders + new_folders[::-1]
+        if self._completion:
+            for folder in new_folders:
+                self._completion.folders.add(folder.relative_to(self.path).as_posix())
+
+    def refresh_note(self, note: 'ObNote'):
+        """笔记内容变化后重新解析，更新索引
+
+        解析在写锁外进行，只有替换索引中的记录时持有写锁，不阻塞其它修改索引的线程。
+        """
+        if self.use_markdown_links:
+            raise ValueError("Obsidian 仓库的链接设置没有开启 Wiki 链接格式。")
+        marks = parse_note(note.path, self.prescan) if note.exists else None
+        with self.writer() as index:
+            if note.parsed:
+                self._unindex_note(note)
+            note.reset()
+            if marks is not None:
+                note._apply_marks(marks, index)
+        if self._mtime_index is not None:
+            self._mtime_index.update(note.path)
 
     def count_by_suffix(self):
         """按后缀统计文件数量"""
@@ -356,17 +1122,104 @@ class ObVault:
             func = set.union
         else:
             func = set.intersection
-        return functools.reduce(func, (self.tags[t] for t in tags))
+        vault_tags = self.tags
+        return functools.reduce(func, (set(vault_tags.get(t, ())) for t in tags))
 
     def ensure_all_parsed(self, progress_bar=None):
         """解析所有笔记"""
         if not self.all_parsed:
             not_parsed = [n for n in self.iter_notes() if not n.parsed]
+            parsed = self.iter_parsed(not_parsed)
             progress_bar = progress_bar or self.progress_bar
             if progress_bar:
-                not_parsed = progress_bar(not_parsed)
-            for note in not_parsed:
-                note.parse()
+                parsed = progress_bar(parsed, total=len(not_parsed))
+            for _ in parsed:
+                pass
+
+    def iter_parsed(self, notes: Optional[Iterable['ObNote']] = None,
+                    workers: Optional[int] = None,
+                    use_processes: Optional[bool] = None) -> Iterable['ObNote']:
+        """解析笔记，按完成的顺序逐个返回
+
+        已经解析过的笔记直接返回。并行解析时同时提交的任务数量有上限，
+        结果在调用方的线程中应用到索引，只在应用每一批结果时持有索引的写锁，
+        调用方提前结束遍历也不会影响其它线程。
+        快照分批发布（见 `PUBLISH_EVERY`），其它线程可以看到已经解析的部分；
+        遍历期间仓库的标签、反链索引可能还没有包含刚返回的笔记，遍历结束（或提前结束）时全部发布。
+        `read_ahead` 大于 0 时用线程池提前读取后面的笔记，计数记录在 `read_ahead_stats`。
+
+        :param notes: 要解析的笔记，缺省是所有笔记
+        :param workers: 并行数量，1 表示在当前线程解析，缺省使用 `parse_workers`
+        :param use_processes: 使用进程池还是线程池，缺省使用 `parse_in_processes`
+        """
+        if self.use_markdown_links:
+            raise ValueError("Obsidian 仓库的链接设置没有开启 Wiki 链接格式。")
+        if notes is None:
+            notes = self.iter_notes()
+        workers = workers or self.parse_workers
+        if use_processes is None:
+            use_processes = self.parse_in_processes
+
+        unpublished = 0
+        try:
+            for batch in self._iter_parsed_batches(notes, workers, use_processes):
+                self._apply_batch(batch)
+                unpublished += len(batch)
+                if unpublished >= max(PUBLISH_EVERY, self.parse_stats.total // PUBLISH_FRACTION):
+                    # 写锁退出时发布
+                    with self.writer():
+                        unpublished = 0
+                for note, _ in batch:
+                    yield note
+        finally:
+            if unpublished:
+                with self.writer():
+                    pass
+
+    def _apply_batch(self, batch: List[Tuple['ObNote', Optional[ObMarks]]]):
+        """应用一批解析结果，不发布"""
+        if not any(marks is not None for _, marks in batch):
+            return
+        with self.writer(publish=False) as index:
+            for note, marks in batch:
+                # 同一篇笔记可能在解析期间已经被其它线程解析了
+                if marks is not None and not note.parsed:
+                    note._apply_marks(marks, index)
+
+    def _iter_parsed_batches(self, notes: Iterable['ObNote'], workers: int,
+                             use_processes: bool) -> Iterable[List[Tuple['ObNote', Optional[ObMarks]]]]:
+        """在锁外解析，逐批返回 (笔记, 解析结果)，已经解析过（或不存在）的笔记结果为 None"""
+        if self.read_ahead > 0:
+            # 大笔记不预读，解析时逐行提取
+            reader = ReadAhead(self.read_ahead, max_file_bytes=STREAM_NOTE_SIZE)
+            self.read_ahead_stats = reader.stats
+            items = reader.iter(notes, lambda n: None if n.parsed else n.path)
+        else:
+            items = ((note, None) for note in notes)
+        if workers <= 1:
+            for note, data in items:
+                if note.parsed or (data is None and not note.exists):
+                    yield [(note, None)]
+                else:
+                    yield [(note, parse_note(note.path, self.prescan, data))]
+            return
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        max_pending = workers * PARSE_PENDING_PER_WORKER
+        pending = {}
+        with executor_class(max_workers=workers) as executor:
+            for note, data in items:
+                if note.parsed or (data is None and not note.exists):
+                    yield [(note, None)]
+                    continue
+                future = executor.submit(parse_note, note.path, self.prescan, data)
+                pending[future] = note
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield [(pending.pop(future), future.result()) for future in done]
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield [(pending.pop(future), future.result()) for future in done]
 
     @property
     def all_parsed(self):
@@ -375,6 +1228,65 @@ class ObVault:
     def get_back_links(self, name):
         return list(self._back_links.get(name, []))
 
+    def get_back_links_of(self, ob_file: 'ObFile') -> Set['ObNote']:
+        """可能链接到这个文件的笔记，包括用相对路径、带 `.md` 后缀链接的
+
+        结果只是按链接目标的写法查找，有重名文件时需要再用 `resolve_target` 确认。
+        """
+        referencing = set()
+        for key in self._link_keys(ob_file):
+            referencing.update(self._back_links.get(key, ()))
+        return referencing
+
+    def resolve_target(self, target: str, source: Optional['ObNote'] = None) -> Optional['ObFile']:
+        """解析链接目标对应的已存在的文件，不存在返回 None
+
+        :param target: 链接目标，即 [[target#section|alias]] 中的 target
+        :param source: 链接所在的笔记，用于 [[#heading]] 这样链接自身的情况，
+            以及有重名文件时优先选择同一文件夹下的
+        """
+        if not target:
+            return source
+        try:
+            ob_file = self.get_file(target)
+        except ValueError:  # 仓库外的路径
+            return None
+        if isinstance(ob_file, list):
+            same_folder = [f for f in ob_file if source and f.parent == source.parent]
+            ob_file = (same_folder or ob_file)[0]
+        if not ob_file.exists:
+            return None
+        return ob_file
+
+    def resolve_link(self, link: Union[str, ObLink],
+                     source: Optional['ObNote'] = None) -> ObResolvedLink:
+        """解析链接，同时检查链接的标题或块是否存在
+
+        目标笔记已经解析过时，标题和块的查找都是集合查找。
+        """
+        if isinstance(link, str):
+            link = ObLink.from_label(link)
+        ob_file = self.resolve_target(link.target, source)
+        anchor_found = None
+        if ob_file is not None and (link.section or link.block) and ob_file.is_note():
+            anchors = cast(ObNote, ob_file).anchors
+            if link.block:
+                anchor_found = link.block in anchors.blocks
+            else:
+                anchor_found = normalize_heading(link.heading) in anchors.headings
+        return ObResolvedLink(link, ob_file, anchor_found)
+
+    def iter_dangling_anchors(self) -> Iterable[Tuple['ObNote', ObResolvedLink]]:
+        """遍历所有指向不存在的标题或块的链接"""
+        self.ensure_all_parsed()
+        for note in self.iter_notes():
+            for link in note.ob_links:
+                if not (link.section or link.block):
+                    continue
+                resolved = self.resolve_link(link, note)
+                if resolved.dangling:
+                    yield note, resolved
+
 
 class ObFile:
     """Obsidian 笔记库中的文件"""
@@ -460,45 +1372,124 @@ class ObFile:
 class ObNote(ObFile):
     def __init__(self, path: Optional[Path], vault: ObVault, name=None):
         super().__init__(path, vault, name)
+        self.reset()
+
+    def reset(self):
+        """清除解析结果"""
         self._marks: Optional[ObMarks] = None
         self._tags = None
         self._links = None
+        self._anchors: Optional[ObAnchors] = None
 
-    def parse(self):
+    def parse(self, data: Optional[bytes] = None):
+        """
+        :param data: 已经读取的文件内容，见 `parse_note`
+        """
         if self._marks:
             return
         if self.vault.use_markdown_links:
             raise ValueError("Obsidian 仓库的链接设置没有开启 Wiki 链接格式。")
-        if self.exists:
-            marks = self._marks = ObMarkdown().parse(self.path)
-            self._tags = tags = marks.tags[:]
-            tags_in_meta = marks.meta.get('tags', [])
-            if isinstance(tags_in_meta, str):
-                tags_in_meta = tags_in_meta.split(',')
-            tags.extend(tags_in_meta)
-
-            for tag in tags:
-                self.vault.add_tag(tag, self)
-                if '/' in tag:  # 嵌套标签要逐个加上
-                    i = 0
-                    while True:
-                        i = tag.find('/', i)
-                        if i < 0:
-                            break
-                        self.vault.add_tag(tag[:i], self)
-                        i += 1
-            for link_name in marks.links:
-                self.vault.add_back_link(link_name, self)
+        if data is not None or self.exists:
+            marks = parse_note(self.path, self.vault.prescan, data)
+            with self.vault.writer():
+                # 其它线程可能同时解析了这篇笔记
+                if not self._marks:
+                    self.apply_marks(marks)
+
+    def apply_marks(self, marks: ObMarks):
+        """使用解析结果，并更新仓库的标签、反链、属性和任务索引
+
+        解析本身（`parse_note`）可以在其它线程或进程中完成，这里只在调用方的线程中修改索引。
+        """
+        with self.vault.writer() as index:
+            self._apply_marks(marks, index)
+
+    def _apply_marks(self, marks: ObMarks, index: ObIndexDraft):
+        self._marks = marks
+        self.vault.index_version += 1
+        if marks.headings or marks.blocks:
+            self._anchors = ObAnchors(
+                frozenset(sys.intern(normalize_heading(text)) for _, text in marks.headings),
+                frozenset(sys.intern(block) for block in marks.blocks),
+            )
+        else:
+            self._anchors = EMPTY_ANCHORS
+        if not marks.full:
+            self._tags = []
+            self.vault.parse_stats.skipped += 1
+            return
+        self.vault.parse_stats.parsed += 1
+        self._tags = tags = marks.tags[:]
+        tags_in_meta = marks.meta.get('tags') or []
+        if isinstance(tags_in_meta, str):
+            tags_in_meta = tags_in_meta.split(',')
+        tags.extend(tags_in_meta)
+
+        for tag in tags:
+            for t in iter_tag_levels(tag):
+                index.add_member('tags', t, self)
+        if marks.meta:
+            self.vault.properties.add(self, marks.meta)
+        if marks.tasks:
+            self.vault.tasks.add(self, marks.tasks)
+        for link in self.ob_links:
+            # 反链按链接目标记录，不含标题、块和别名
+            if link.target:
+                index.add_member('back_links', link.target, self)
 
     @property
     def tags(self):
         return self._tags
 
+    def has_tags(self, tags: Iterable[str]) -> bool:
+        """笔记是否有所有这些标签（嵌套标签的上级也算），只看笔记自身的解析结果，不依赖仓库的标签索引"""
+        own = {t for tag in self._tags or () for t in iter_tag_levels(tag)}
+        return all(t in own for t in tags)
+
     @property
     def links(self):
         if self._marks:
             return self._marks.links
 
+    @property
+    def embeds(self):
+        if self._marks:
+            return self._marks.embeds
+
+    @property
+    def content(self) -> str:
+        """正文内容（不含 Frontmatter），逐行提取的大笔记不保留正文，每次从文件读取"""
+        self.parse()
+        if self._marks is None:
+            return ''
+        if self._marks.streamed:
+            return read_note_body(self.path)
+        return self._marks.content
+
+    @property
+    def ob_links(self) -> List[ObLink]:
+        """解析后的链接对象"""
+        if not self._marks:
+            return []
+        links = self._marks.links
+        # 每一处链接各自记录是否是嵌入，同一个目标可能既链接又嵌入
+        embedded = self._marks.embedded or [False] * len(links)
+        return [ObLink.from_label(label, flag) for label, flag in zip(links, embedded)]
+
+    @property
+    def text_stats(self) -> TextStats:
+        """正文的字数、链接数等统计"""
+        self.parse()
+        if self._marks is None or self._marks.stats is None:
+            return EMPTY_STATS
+        return self._marks.stats
+
+    @property
+    def anchors(self) -> ObAnchors:
+        """笔记中的标题和块 ID"""
+        self.parse()
+        return self._anchors or EMPTY_ANCHORS
+
     @property
     def parsed(self):
         return self._marks is not None
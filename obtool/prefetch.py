@@ -0,0 +1,152 @@
+"""
+# 笔记预读
+
+仓库在 NFS、SMB 或者同步盘上时，每次打开和读取文件都有几毫秒的延迟，
+逐篇解析笔记时大部分时间都在等待读取。`ReadAhead` 用线程池提前读取后面的笔记，
+解析（CPU）和读取（I/O）同时进行，多个读取之间也同时进行。
+
+同时读取和已经读好等待解析的笔记数量不超过 `depth`，已经读好的字节数不超过 `max_bytes`，
+不会把整个仓库读入内存。结果按输入的顺序返回。
+
+`ReadAheadStats` 记录读取的数量、字节数、延迟和队列深度，用于调整 `depth`：
+如果解析经常等待读取（`wait_seconds` 较大）并且平均深度接近 `depth`，可以增加 `depth`。
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# 缺省的预读数量
+READ_AHEAD_DEPTH = 16
+# 已经读好、等待解析的字节数上限
+READ_AHEAD_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class ReadAheadStats:
+    """预读计数"""
+    files: int = 0              # 读取的文件数量
+    bytes: int = 0              # 读取的字节数
+    errors: int = 0             # 读取失败的数量，交给解析时再处理
+    skipped: int = 0            # 超过 `max_file_bytes` 没有读取的数量
+    read_seconds: float = 0.0   # 每个文件读取时间的总和
+    wait_seconds: float = 0.0   # 使用方等待读取的时间
+    elapsed: float = 0.0        # 从开始到结束的时间
+    max_depth: int = 0          # 最大的队列深度（正在读取和等待解析的数量）
+    depth_total: int = 0        # 每次取出时队列深度的总和，用于计算平均深度
+    takes: int = 0              # 取出的次数
+
+    @property
+    def throughput(self) -> float:
+        """每秒读取的字节数"""
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        """每个文件的平均读取时间（秒）"""
+        return self.read_seconds / self.files if self.files else 0.0
+
+    @property
+    def avg_depth(self) -> float:
+        return self.depth_total / self.takes if self.takes else 0.0
+
+
+class ReadAhead:
+    """用线程池按顺序预读文件"""
+
+    def __init__(self, depth: int = READ_AHEAD_DEPTH, workers: Optional[int] = None,
+                 max_bytes: int = READ_AHEAD_MAX_BYTES, max_file_bytes: Optional[int] = None):
+        """
+        :param depth: 同时读取和等待解析的文件数量上限
+        :param workers: 读取线程的数量，缺省同 `depth`，延迟高的文件系统上每个读取都占用一个线程
+        :param max_bytes: 已经读好、等待解析的字节数上限，超过时暂停提交新的读取
+        :param max_file_bytes: 超过这个大小的文件不读取，内容返回 None，由使用方自己处理
+        """
+        if depth < 1:
+            raise ValueError(f'预读数量必须大于 0: {depth}')
+        self.depth = depth
+        self.workers = workers or depth
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.stats = ReadAheadStats()
+        self._lock = threading.Lock()
+        self._ready_bytes = 0
+
+    def _read(self, path: Path) -> Optional[bytes]:
+        t0 = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                if self.max_file_bytes is not None and os.fstat(f.fileno()).st_size > self.max_file_bytes:
+                    with self._lock:
+                        self.stats.skipped += 1
+                    return None
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.stats.errors += 1
+            return None
+        seconds = time.perf_counter() - t0
+        with self._lock:
+            self.stats.files += 1
+            self.stats.bytes += len(data)
+            self.stats.read_seconds += seconds
+            self._ready_bytes += len(data)
+        return data
+
+    def iter(self, items: Iterable[T],
+             path_of: Callable[[T], Optional[Path]]) -> Iterator[Tuple[T, Optional[bytes]]]:
+        """按输入的顺序返回 (item, 文件内容)
+
+        :param path_of: 要读取的文件，返回 None 表示这一项不需要读取。
+            不需要读取和读取失败的，文件内容都是 None
+        """
+        stats = self.stats
+        t0 = time.perf_counter()
+        queue: Deque[Tuple[T, Optional[Future]]] = deque()
+        it = iter(items)
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='obtool-read') as executor:
+            try:
+                while True:
+                    while not exhausted and len(queue) < self.depth and self._ready_bytes < self.max_bytes:
+                        try:
+                            item = next(it)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        path = path_of(item)
+                        queue.append((item, executor.submit(self._read, path) if path else None))
+                    if not queue:
+                        break
+                    stats.max_depth = max(stats.max_depth, len(queue))
+                    stats.depth_total += len(queue)
+                    stats.takes += 1
+                    item, future = queue.popleft()
+                    data = None
+                    if future is not None:
+                        if not future.done():
+                            t_wait = time.perf_counter()
+                            data = future.result()
+                            stats.wait_seconds += time.perf_counter() - t_wait
+                        else:
+                            data = future.result()
+                        if data is not None:
+                            with self._lock:
+                                self._ready_bytes -= len(data)
+                    yield item, data
+            finally:
+                # 提前结束时取消还没有开始的读取
+                for _, future in queue:
+                    if future is not None:
+                        future.cancel()
+                stats.elapsed += time.perf_counter() - t0
@@ -0,0 +1,332 @@
+"""
+# Frontmatter 属性索引
+
+按属性（列）而不是按笔记保存 Frontmatter 中的值，并自动推断值的类型：
+
+- 数字、日期：保存为按值排序的数组，范围查询用二分查找；
+- 字符串、布尔值、列表中的元素：保存为 值 -> 笔记集合 的哈希索引。
+
+同一个属性在不同笔记中的类型可以不同，每种类型各自建立索引，
+查询时按查询值的类型选择对应的索引。
+
+查询语法：
+
+    status = done and date >= 2026-01-01
+    rating > 3 and tags != draft
+    author exists
+
+"""
+import bisect
+import datetime
+import math
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from obtool.utils import locked
+
+NUMBER = 'number'
+DATE = 'date'
+STRING = 'string'
+BOOL = 'bool'
+LIST = 'list'
+
+_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?')
+_CONDITION_RE = re.compile(r'^\s*(?P<key>[^\s=!<>]+)\s*'
+                           r'(?:(?P<op>>=|<=|!=|=|>|<)\s*(?P<value>.+?)|(?P<exists>exists))\s*$')
+# 条件之间的 and，引号中的 and 是值的一部分（匹配到引号时跳过）
+_AND_RE = re.compile(r'''("[^"]*"|'[^']*')|\s+and\s+''', re.IGNORECASE)
+_KIND_NAMES = {NUMBER: '数字', DATE: '日期', STRING: '字符串', BOOL: '布尔值', LIST: '列表'}
+
+
+def parse_date(text: str) -> Optional[datetime.datetime]:
+    if not _DATE_RE.fullmatch(text):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def normalize_value(value: Any) -> Optional[Tuple[str, Any]]:
+    """推断属性值的类型，返回 (类型, 用于索引的值)，无法索引的返回 None
+
+    日期统一为 datetime，以便和带时间的值比较。
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return BOOL, value
+    if isinstance(value, (int, float)):
+        # NaN 和任何值比较都不成立，无法放在排序的列中
+        return None if value != value else (NUMBER, value)
+    if isinstance(value, datetime.datetime):
+        return DATE, value.replace(tzinfo=None)
+    if isinstance(value, datetime.date):
+        return DATE, datetime.datetime(value.year, value.month, value.day)
+    if isinstance(value, (list, tuple, set)):
+        items = tuple(str(v).strip() for v in value if v is not None)
+        return LIST, items
+    if isinstance(value, str):
+        value = value.strip()
+        date = parse_date(value)
+        if date is not None:
+            return DATE, date
+        return STRING, value
+    return STRING, str(value)
+
+
+def split_conditions(expression: str) -> List[str]:
+    """按 and 切分查询条件，不切分引号中的 and：`genre = "rock and roll"` 是一个条件"""
+    conditions = []
+    start = 0
+    for m in _AND_RE.finditer(expression):
+        if m.group(1) is None:
+            conditions.append(expression[start:m.start()])
+            start = m.end()
+    conditions.append(expression[start:])
+    return conditions
+
+
+def parse_literal(text: str) -> Tuple[str, Any]:
+    """解析查询中的值"""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '\'"':
+        return STRING, text[1:-1]
+    lower = text.lower()
+    if lower in ('true', 'false'):
+        return BOOL, lower == 'true'
+    try:
+        return NUMBER, int(text)
+    except ValueError:
+        pass
+    try:
+        return NUMBER, float(text)
+    except ValueError:
+        pass
+    date = parse_date(text)
+    if date is not None:
+        return DATE, date
+    return STRING, text
+
+
+class SortedColumn:
+    """按值排序的列，修改时用二分查找插入、删除，查询前不需要重新排序"""
+
+    def __init__(self):
+        self.values: Dict[Hashable, Any] = {}
+        # (值, id(笔记), 笔记)，按值排序；值相同时按 id 排序，前两项是唯一的
+        self._order: List[Tuple[Any, int, Hashable]] = []
+
+    def add(self, item, value):
+        self.remove(item)
+        self.values[item] = value
+        bisect.insort(self._order, (value, id(item), item))
+
+    def remove(self, item):
+        if item not in self.values:
+            return
+        value = self.values.pop(item)
+        i = bisect.bisect_left(self._order, (value, id(item)))
+        if i < len(self._order) and self._order[i][2] is item:
+            del self._order[i]
+
+    def range(self, op: str, value) -> Set[Hashable]:
+        order = self._order
+        # (value,) 排在值相同的所有记录之前，(value, inf) 排在它们之后
+        first, after = (value,), (value, math.inf)
+        try:
+            if op == '=':
+                lo, hi = bisect.bisect_left(order, first), bisect.bisect_left(order, after)
+            elif op == '>':
+                lo, hi = bisect.bisect_left(order, after), len(order)
+            elif op == '>=':
+                lo, hi = bisect.bisect_left(order, first), len(order)
+            elif op == '<':
+                lo, hi = 0, bisect.bisect_left(order, first)
+            elif op == '<=':
+                lo, hi = 0, bisect.bisect_left(order, after)
+            else:
+                raise ValueError(f'不支持的比较: {op}')
+        except TypeError:
+            raise ValueError(f'无法比较的值: {value!r}')
+        return {item for _, _, item in order[lo:hi]}
+
+
+class HashColumn:
+    """值 -> 笔记集合"""
+
+    def __init__(self):
+        self.index: Dict[Any, Set[Hashable]] = defaultdict(set)
+        self.values: Dict[Hashable, Tuple[Any, ...]] = {}
+
+    def add(self, item, values: Iterable[Any]):
+        values = tuple(values)
+        self.values[item] = values
+        for v in values:
+            self.index[v].add(item)
+
+    def remove(self, item):
+        for v in self.values.pop(item, ()):
+            items = self.index.get(v)
+            if items is not None:
+                items.discard(item)
+                if not items:
+                    del self.index[v]
+
+    def get(self, value) -> Set[Hashable]:
+        return set(self.index.get(value, ()))
+
+
+@dataclass
+class PropertyColumn:
+    """一个属性的所有值，按类型分别建立索引"""
+    name: str
+    numbers: SortedColumn = field(default_factory=SortedColumn)
+    dates: SortedColumn = field(default_factory=SortedColumn)
+    strings: HashColumn = field(default_factory=HashColumn)      # 字符串和列表元素
+    bools: HashColumn = field(default_factory=HashColumn)
+    kinds: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    @property
+    def kind(self) -> str:
+        """最常见的类型"""
+        return max(self.kinds, key=self.kinds.get) if self.kinds else STRING
+
+    @property
+    def items(self) -> Set[Hashable]:
+        return (self.numbers.values.keys() | self.dates.values.keys()
+                | self.strings.values.keys() | self.bools.values.keys())
+
+    def add(self, item, kind: str, value):
+        self.kinds[kind] += 1
+        if kind == NUMBER:
+            self.numbers.add(item, value)
+        elif kind == DATE:
+            self.dates.add(item, value)
+        elif kind == BOOL:
+            self.bools.add(item, [value])
+        elif kind == LIST:
+            self.strings.add(item, value)
+        else:
+            self.strings.add(item, [value])
+
+    def remove(self, item, kind: str):
+        self.kinds[kind] -= 1
+        if not self.kinds[kind]:
+            del self.kinds[kind]
+        for index in (self.numbers, self.dates, self.strings, self.bools):
+            index.remove(item)
+
+    def select(self, op: str, kind: str, value) -> Set[Hashable]:
+        if op == '!=':
+            return self.items - self.select('=', kind, value)
+        if kind == NUMBER:
+            return self.numbers.range(op, value)
+        if kind == DATE:
+            return self.dates.range(op, value)
+        if op != '=':
+            raise ValueError(f'{self.name}: 只有数字和日期可以比较大小')
+        if kind == BOOL:
+            return self.bools.get(value)
+        return self.strings.get(value)
+
+    def sort_value(self, item):
+        """排序用的值，(类型序号, 值)，保证不同类型之间也可以比较"""
+        if item in self.numbers.values:
+            return 0, self.numbers.values[item]
+        if item in self.dates.values:
+            return 1, self.dates.values[item]
+        if item in self.bools.values:
+            return 2, self.bools.values[item]
+        if item in self.strings.values:
+            return 3, self.strings.values[item]
+        return None
+
+
+class PropertyIndex:
+    """仓库中所有笔记的 Frontmatter 属性索引"""
+
+    def __init__(self):
+        self.columns: Dict[str, PropertyColumn] = {}
+        # 笔记有哪些属性以及对应的类型，用于移除
+        self._kinds: Dict[Hashable, Tuple[Tuple[str, str], ...]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._kinds)
+
+    @locked
+    def add(self, item, meta: dict):
+        """添加一篇笔记的属性，已经存在时先移除"""
+        if item in self._kinds:
+            self.remove(item)
+        kinds = []
+        for key, value in meta.items():
+            normalized = normalize_value(value)
+            if normalized is None:
+                continue
+            kind, value = normalized
+            key = str(key)
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = PropertyColumn(key)
+            column.add(item, kind, value)
+            kinds.append((key, kind))
+        if kinds:
+            self._kinds[item] = tuple(kinds)
+
+    @locked
+    def remove(self, item):
+        for key, kind in self._kinds.pop(item, ()):
+            column = self.columns[key]
+            column.remove(item, kind)
+            if not column.kinds:
+                del self.columns[key]
+
+    @locked
+    def select(self, key: str, op: str, text: str) -> Set[Hashable]:
+        column = self.columns.get(key)
+        if column is None:
+            return set()
+        kind, value = parse_literal(text)
+        if {kind, column.kind} == {NUMBER, DATE}:
+            expected = _KIND_NAMES[column.kind]
+            raise ValueError(f'{key} 是{expected}，比较的值 {text} 不是{expected}')
+        return column.select(op, kind, value)
+
+    @locked
+    def query(self, expression: str) -> Set[Hashable]:
+        """按条件查询，条件之间用 and 连接"""
+        result = None
+        for condition in split_conditions(expression.strip()):
+            m = _CONDITION_RE.match(condition)
+            if not m:
+                raise ValueError(f'无法解析的条件: {condition}')
+            key = m.group('key')
+            if m.group('exists'):
+                column = self.columns.get(key)
+                matched = column.items if column else set()
+            else:
+                matched = self.select(key, m.group('op'), m.group('value'))
+            result = matched if result is None else result & matched
+            if not result:
+                break
+        return result or set()
+
+    @locked
+    def sort(self, items: Iterable[Hashable], key: str, reverse=False) -> List[Hashable]:
+        """按属性排序，没有该属性的排在最后"""
+        column = self.columns.get(key)
+        items = list(items)
+        if column is None:
+            return items
+        with_value = []
+        without = []
+        for item in items:
+            v = column.sort_value(item)
+            (without if v is None else with_value).append((v, item))
+        with_value.sort(key=lambda t: t[0], reverse=reverse)
+        return [item for _, item in with_value] + [item for _, item in without]
@@ -0,0 +1,188 @@
+"""
+# 按修改时间排序的文件索引
+
+查看最近修改的文件时，不必每次都读取所有文件的修改时间再排序。
+`MtimeIndex` 第一次使用时读取一次所有文件的修改时间和大小，按修改时间排好序，
+之后随仓库增量更新：新增、删除、改名的文件（映射的修改）以及重新解析的笔记（`ObVault.refresh_note`）。
+
+- 最近修改的 N 个、某个时间之后修改的：在排好序的列表中二分查找、切片；
+- 按大小或名称取前 N 个：用堆选择（`heapq.nlargest`），不排序整个仓库。
+
+遍历仓库时只读取目录项，不读取文件的修改时间，所以索引不在打开仓库时创建。
+在仓库外新增、修改的文件，用 `ObVault.refresh_mtime_index` 重新遍历仓库，
+按遍历时读取的修改时间更新（`revalidate`，只移动有变化的记录，不重新排序）。
+
+遍历时其它线程可能在修改索引，排序的列表是写时复制的（同 `ObVault.writer` 的快照），
+`iter_recent` 不复制列表。
+"""
+import bisect
+import datetime
+import heapq
+import itertools
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from obtool.properties import parse_date
+from obtool.utils import locked
+
+SORT_KEYS = ('mtime', 'size', 'name')
+# `revalidate` 时变化的文件超过总数的 1/REBUILD_FRACTION，重新排序
+REBUILD_FRACTION = 8
+
+_RELATIVE_RE = re.compile(r'(\d+)([mhdw])')
+_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+@dataclass(frozen=True)
+class FileStat:
+    path: Path
+    mtime_ns: int
+    size: int
+
+    @property
+    def mtime(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.mtime_ns / 1e9)
+
+
+def parse_since(text: str, now: Optional[datetime.datetime] = None) -> int:
+    """`--since` 的参数转换为纳秒时间戳
+
+    可以是日期（`2026-10-01`、`2026-10-01T08:00`），或者相对现在的时间（`30m`、`12h`、`7d`、`2w`）
+    """
+    text = text.strip()
+    m = _RELATIVE_RE.fullmatch(text)
+    if m:
+        delta = datetime.timedelta(**{_UNITS[m.group(2)]: int(m.group(1))})
+        when = (now or datetime.datetime.now()) - delta
+    else:
+        when = parse_date(text)
+        if when is None:
+            raise ValueError(f'无法识别的时间: {text}，请使用 YYYY-MM-DD 或 7d、12h 这样的相对时间')
+    return int(when.timestamp() * 10 ** 9)
+
+
+def _stat(path: Path) -> Optional[FileStat]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return FileStat(path, st.st_mtime_ns, st.st_size)
+
+
+class MtimeIndex:
+    """文件 -> 修改时间和大小，另外按修改时间排序保存"""
+
+    def __init__(self):
+        self._stats: Dict[Path, FileStat] = {}
+        # (修改时间, 路径, FileStat)，从旧到新；修改时间相同时按路径排序，前两项是唯一的
+        self._order: List[Tuple[int, Path, FileStat]] = []
+        # 列表正在被 `iter_recent` 遍历，修改前要先复制
+        self._shared = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, paths: Iterable[Path]) -> 'MtimeIndex':
+        """读取所有文件的修改时间，只排序一次"""
+        index = cls()
+        for path in paths:
+            stat = _stat(path)
+            if stat is not None:
+                index._stats[path] = stat
+        index._order = sorted((s.mtime_ns, s.path, s) for s in index._stats.values())
+        return index
+
+    def __len__(self):
+        return len(self._stats)
+
+    def __contains__(self, path: Path):
+        return path in self._stats
+
+    def get(self, path: Path) -> Optional[FileStat]:
+        return self._stats.get(path)
+
+    def _writable(self) -> List[Tuple[int, Path, FileStat]]:
+        if self._shared:
+            self._order = list(self._order)
+            self._shared = False
+        return self._order
+
+    @locked
+    def update(self, path: Path) -> Optional[FileStat]:
+        """重新读取文件的修改时间，文件不存在时移除"""
+        stat = _stat(path)
+        self._set(path, stat)
+        return stat
+
+    @locked
+    def remove(self, path: Path):
+        self._set(path, None)
+
+    def _set(self, path: Path, stat: Optional[FileStat]):
+        old = self._stats.pop(path, None)
+        if old is not None:
+            order = self._writable()
+            i = bisect.bisect_left(order, (old.mtime_ns, path))
+            if i < len(order) and order[i][2] is old:
+                del order[i]
+        if stat is not None:
+            self._stats[path] = stat
+            bisect.insort(self._writable(), (stat.mtime_ns, path, stat))
+
+    @locked
+    def revalidate(self, stats: Iterable[FileStat]) -> int:
+        """用重新遍历仓库时读取的修改时间和大小更新索引，不在其中的文件移除
+
+        :return: 有变化（新增、修改、删除）的文件数量
+        """
+        fresh = {s.path: s for s in stats}
+        changed = [s for p, s in fresh.items() if self._stats.get(p) != s]
+        removed = [p for p in self._stats if p not in fresh]
+        if len(changed) + len(removed) > len(self._stats) // REBUILD_FRACTION:
+            # 变化的太多，重新排序比逐个插入快
+            self._stats = fresh
+            self._order = sorted((s.mtime_ns, s.path, s) for s in fresh.values())
+            self._shared = False
+        else:
+            for path in removed:
+                self._set(path, None)
+            for stat in changed:
+                self._set(stat.path, stat)
+        return len(changed) + len(removed)
+
+    def iter_recent(self, since_ns: Optional[int] = None) -> Iterator[FileStat]:
+        """从新到旧，`since_ns` 指定时只到这个时间（含）为止"""
+        with self._lock:
+            order = self._order
+            lo = 0 if since_ns is None else bisect.bisect_left(order, (since_ns,))
+            # 遍历的是这一刻的列表，之后的修改在复制的列表上进行
+            self._shared = True
+        return (order[i][2] for i in range(len(order) - 1, lo - 1, -1))
+
+    def select(self, key: str = 'mtime', limit: Optional[int] = None, since_ns: Optional[int] = None,
+               predicate: Optional[Callable[[FileStat], bool]] = None) -> List[FileStat]:
+        """按 key 排序取前 limit 个
+
+        :param key: `mtime` 从新到旧，`size` 从大到小，`name` 按文件名
+        :param limit: 数量，不指定时返回全部（全部排序）
+        :param predicate: 只保留满足条件的文件
+        """
+        if key not in SORT_KEYS:
+            raise ValueError(f'不支持的排序: {key}，可选 {", ".join(SORT_KEYS)}')
+        candidates: Iterable[FileStat] = self.iter_recent(since_ns)
+        if predicate is not None:
+            candidates = filter(predicate, candidates)
+        if key == 'mtime':
+            # 本来就是按修改时间排好序的，取前 limit 个即可
+            return list(itertools.islice(candidates, limit))
+        if key == 'size':
+            sort_key, reverse = (lambda s: s.size), True
+        else:
+            sort_key, reverse = (lambda s: (s.path.name.lower(), str(s.path))), False
+        if limit is None:
+            return sorted(candidates, key=sort_key, reverse=reverse)
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return select(limit, candidates, key=sort_key)
@@ -0,0 +1,328 @@
+"""
+# 查询服务
+
+`ob serve` 启动后常驻内存，保留已经解析好的仓库索引，通过 Unix socket 回答查询，
+编辑器插件等频繁查询的程序不必每次都重新扫描和解析仓库。客户端见 `obtool.client`。
+
+协议：每行一个 JSON 请求，对应一行 JSON 响应：
+
+    {"vault": "MyVault", "op": "tags", "tag": "work"}
+    {"ok": true, "result": ["notes/a", "notes/b"]}
+
+    {"vault": "MyVault", "op": "nope"}
+    {"ok": false, "error": "不支持的操作: nope"}
+
+支持的操作见 `VaultServer` 中的 `op_*` 方法。
+
+仓库的修改通过定时轮询发现，轮询和重新解析都在后台线程中进行，
+查询读取的是仓库最新发布的索引快照（见 `ObVault.writer`），名称补全索引有自己的锁。
+查询也在线程池中执行（可能需要解析笔记或读取文件），不阻塞事件循环：
+
+- 文件夹的修改时间变化，说明其中有文件新增、删除或移动，同步这个文件夹；
+- 笔记的修改时间变化，重新解析这篇笔记。
+"""
+import asyncio
+import json
+import os
+import re
+import socket
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, cast
+
+from obtool.client import get_socket_path, MAX_REQUEST_SIZE
+from obtool.obsidian import ObVault, ObNote
+
+# 轮询的间隔（秒）
+POLL_INTERVAL = 2.0
+# 同时执行查询的线程数量
+QUERY_WORKERS = 4
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class WatchedVault:
+    """常驻内存的仓库，记录文件夹和笔记的修改时间用于发现变化"""
+
+    def __init__(self, vault: ObVault):
+        self.vault = vault
+        self.folder_mtimes: Dict[Path, Optional[int]] = {}
+        self.note_mtimes: Dict[Path, Optional[int]] = {}
+        self._record_folders()
+        for note in vault.iter_notes():
+            self.note_mtimes[note.path] = _mtime(note.path)
+
+    def _record_folders(self):
+        self.folder_mtimes = {f: _mtime(f) for f in [self.vault.path, *self.vault.folders]}
+
+    def poll(self) -> int:
+        """检查变化并更新索引，在后台线程中调用
+
+        单个文件夹或笔记出错（正在被修改、编码错误、Frontmatter 格式错误等）只给出警告，
+        不影响其它文件。出错的笔记在下次修改后再解析，出错的文件夹下次轮询时再同步。
+
+        :return: 有变化的文件数量
+        """
+        vault = self.vault
+        changed = 0
+        failed_folders = {}
+        changed_folders = [f for f, mtime in self.folder_mtimes.items() if _mtime(f) != mtime]
+        for folder in changed_folders:
+            try:
+                added, removed = vault.sync_folder(folder)
+            except Exception as e:
+                warnings.warn(f'同步文件夹 {folder} 失败: {e!r}')
+                failed_folders[folder] = self.folder_mtimes[folder]
+                continue
+            for ob_file in removed:
+                self.note_mtimes.pop(ob_file.path, None)
+            for ob_file in added:
+                if ob_file.is_note():
+                    self.note_mtimes[ob_file.path] = _mtime(ob_file.path)
+                    self._parse(cast(ObNote, ob_file))
+            changed += len(added) + len(removed)
+        if changed_folders:
+            self._record_folders()
+            self.folder_mtimes.update(failed_folders)
+
+        for path, mtime in list(self.note_mtimes.items()):
+            new_mtime = _mtime(path)
+            if new_mtime == mtime:
+                continue
+            self.note_mtimes[path] = new_mtime
+            note = vault.get_file_by_path(path)
+            if new_mtime is not None and note is not None:
+                if self._parse(cast(ObNote, note), refresh=True):
+                    changed += 1
+        return changed
+
+    def _parse(self, note: ObNote, refresh=False) -> bool:
+        try:
+            if refresh:
+                self.vault.refresh_note(note)
+            else:
+                note.parse()
+        except Exception as e:
+            warnings.warn(f'解析笔记 {note.path} 失败: {e!r}')
+            return False
+        return True
+
+
+class VaultServer:
+    """查询服务，每个仓库第一次被查询时加载"""
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL, parse_workers: int = 1):
+        self.poll_interval = poll_interval
+        self.parse_workers = parse_workers
+        self.vaults: Dict[str, WatchedVault] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        # 加载、轮询都在这个线程中进行，对仓库的修改不会同时发生
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='obtool-serve')
+        # 执行查询的线程，查询可能需要解析笔记（等待写锁）或者读取文件
+        self._query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS,
+                                                  thread_name_prefix='obtool-query')
+
+    def _load(self, name: str) -> WatchedVault:
+        vault = ObVault.open(name)
+        vault.parse_workers = self.parse_workers
+        vault.ensure_all_parsed()
+        return WatchedVault(vault)
+
+    async def get_vault(self, name: Optional[str]) -> ObVault:
+        if not name:
+            if len(self.vaults) != 1:
+                raise ValueError('请指定仓库名称')
+            name = next(iter(self.vaults))
+        watched = self.vaults.get(name)
+        if watched is not None:
+            return watched.vault
+        future = self._loading.get(name)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._loading[name] = loop.run_in_executor(self._executor, self._load, name)
+        try:
+            watched = await future
+        finally:
+            self._loading.pop(name, None)
+        self.vaults.setdefault(name, watched)
+        return self.vaults[name].vault
+
+    async def preload(self, names: Iterable[str]):
+        for name in names:
+            try:
+                await self.get_vault(name)
+            except Exception as e:  # 加载失败不影响其它仓库，查询时会再次尝试
+                warnings.warn(f'加载仓库 {name} 失败: {e!r}')
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for watched in list(self.vaults.values()):
+                try:
+                    await loop.run_in_executor(self._executor, watched.poll)
+                except Exception as e:
+                    # 单个文件的错误在 poll 中已经处理，这里是意外的错误，下次再检查
+                    warnings.warn(f'检查仓库 {watched.vault.name} 的变化失败: {e!r}')
+
+    async def handle(self, request: dict) -> Any:
+        op = request.get('op')
+        method = getattr(self, f'op_{op}', None)
+        if method is None:
+            raise ValueError(f'不支持的操作: {op}')
+        if op == 'ping':
+            return method(request)
+        vault = await self.get_vault(request.get('vault'))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._query_executor, method, vault, request)
+
+    @staticmethod
+    def op_ping(request: dict):
+        return 'pong'
+
+    @staticmethod
+    def op_tags(vault: ObVault, request: dict):
+        """不指定标签时返回所有标签及笔记数量，否则返回有这个标签的笔记"""
+        tags = vault.snapshot().tags
+        tag = request.get('tag')
+        if not tag:
+            return {t: len(notes) for t, notes in sorted(tags.items())}
+        return sorted(n.long_name for n in tags.get(tag, ()))
+
+    @staticmethod
+    def op_resolve(vault: ObVault, request: dict):
+        """解析链接，同 `ObVault.resolve_link`"""
+        source = None
+        if request.get('source'):
+            source = vault.get_file(request['source'])
+            if not isinstance(source, ObNote):
+                source = None
+        resolved = vault.resolve_link(request.get('target', ''), source)
+        ob_file = resolved.file
+        return {
+            'exists': ob_file is not None,
+            'name': ob_file.long_name if ob_file else None,
+            'path': ob_file.path.as_posix() if ob_file else None,
+            'anchor_found': resolved.anchor_found,
+        }
+
+    @staticmethod
+    def op_backlinks(vault: ObVault, request: dict):
+        """链接到指定文件的笔记"""
+        ob_file = vault.get_file(request.get('name', ''))
+        if isinstance(ob_file, list):
+            raise ValueError(f'有重名文件，请使用相对路径: {[f.long_name for f in ob_file]}')
+        if not ob_file.exists:
+            return []
+        result = set()
+        for note in vault.get_back_links_of(ob_file):
+            if any(vault.resolve_target(link.target, note) is ob_file for link in note.ob_links):
+                result.add(note.long_name)
+        return sorted(result)
+
+    @staticmethod
+    def op_search(vault: ObVault, request: dict):
+        """先按笔记名称补全，不够再搜索正文（不区分大小写）"""
+        text = request.get('query', '')
+        limit = int(request.get('limit', 20))
+        if not text:
+            return []
+        result: List[dict] = []
+        seen = set()
+        for name in vault.completion.notes.complete(text, limit):
+            ob_file = vault.get_file(name)
+            for f in ob_file if isinstance(ob_file, list) else [ob_file]:
+                result.append({'name': f.long_name, 'match': 'name'})
+                seen.add(f.long_name)
+        # 不用 casefold 之后再查找：casefold 可能改变长度（如 `ß` -> `ss`），位置和原文对不上
+        pattern = re.compile(re.escape(text), re.IGNORECASE)
+        for note in vault.iter_notes():
+            if len(result) >= limit:
+                break
+            if note.long_name in seen or not note.parsed:
+                continue
+            content = note.content
+            m = pattern.search(content)
+            if m:
+                i = m.start()
+                line = content.count('\n', 0, i) + 1
+                start = content.rfind('\n', 0, i) + 1
+                end = content.find('\n', i)
+                result.append({'name': note.long_name, 'match': 'content', 'line': line,
+                               'text': content[start:end if end >= 0 else None].strip()})
+        return result[:limit]
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # 超过长度限制
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('请求必须是 JSON 对象')
+                    response = {'ok': True, 'result': await self.handle(request)}
+                except Exception as e:  # 错误返回给客户端，服务继续运行
+                    response = {'ok': False, 'error': str(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: Optional[Path] = None, preload: Iterable[str] = (),
+                    on_ready=None):
+        socket_path = socket_path or get_socket_path()
+        _remove_stale_socket(socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=str(socket_path),
+                                                 limit=MAX_REQUEST_SIZE)
+        os.chmod(socket_path, 0o600)
+        watcher = asyncio.ensure_future(self.watch())
+        try:
+            await self.preload(preload)
+            if on_ready:
+                on_ready(socket_path)
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self._executor.shutdown(wait=False)
+            self._query_executor.shutdown(wait=False)
+            try:
+                socket_path.unlink()
+            except OSError:
+                pass
+
+
+def _remove_stale_socket(socket_path: Path):
+    """上次没有正常退出时留下的 socket 文件，如果服务仍在运行则报错"""
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if not socket_path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            socket_path.unlink()
+            return
+    raise RuntimeError(f'查询服务已经在运行: {socket_path}')
+
+
+def run_server(preload: Iterable[str] = (), poll_interval: float = POLL_INTERVAL,
+               parse_workers: int = 1, on_ready=None):
+    """启动查询服务，直到被中断"""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError('当前系统不支持 Unix socket')
+    server = VaultServer(poll_interval, parse_workers)
+    asyncio.run(server.serve(preload=preload, on_ready=on_ready))
@@ -0,0 +1,74 @@
+"""
+# 按文件夹分片加载
+
+大仓库中只在某个文件夹里工作时，不必遍历整个仓库、为每个文件建立映射。
+分片模式下（`ObVault(path, sharded=True)`），仓库按顶层文件夹分片，
+打开时只加载根目录下的文件，每个分片在第一次被用到时才遍历、建立映射，
+笔记的解析本来就是按需进行的。
+
+按名称查找文件（`ObVault.get_file`）需要知道所有同名的文件，所以打开时先建立全局的名称目录：
+只列出文件名，不创建路径和文件对象，记录每个名称出现在哪些分片中。
+查找时先加载这些分片，结果和一次加载整个仓库相同。
+
+遍历所有文件、标签、补全等需要整个仓库的操作会加载全部分片。
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from obtool.ignore import IgnoreMatcher
+
+
+class NameDirectory:
+    """文件名称 -> 包含这个名称的分片
+
+    名称同 `ObFile.name`：笔记不含 `.md` 后缀，其它文件包含后缀。
+    分片组合相同的名称共用一个元组，每个名称只占字典中的一项。
+    """
+
+    def __init__(self):
+        self.shards: List[str] = []
+        self._names: Dict[str, Tuple[str, ...]] = {}
+        self._groups: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name: str):
+        return name in self._names
+
+    def add(self, name: str, shard: str):
+        shards = self._names.get(name, ())
+        if shard in shards:
+            return
+        group = shards + (shard,)
+        self._names[name] = self._groups.setdefault(group, group)
+
+    def shards_of(self, name: str) -> Tuple[str, ...]:
+        return self._names.get(name, ())
+
+
+def build_directory(vault_path: Path, shards: Iterable[str],
+                    ignore: Optional[IgnoreMatcher] = None) -> NameDirectory:
+    """列出各个分片中的文件名称，跳过的文件和文件夹同 `ObVault._scan_folder`"""
+    directory = NameDirectory()
+    root = str(vault_path)
+    for shard in shards:
+        directory.shards.append(shard)
+        stack = [shard]
+        while stack:
+            rel_folder = stack.pop()
+            with os.scandir(os.path.join(root, rel_folder)) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith('.'):
+                        continue
+                    rel_name = rel_folder + '/' + name
+                    is_dir = entry.is_dir()
+                    if ignore and ignore.match(rel_name, is_dir):
+                        continue
+                    if is_dir:
+                        stack.append(rel_name)
+                    elif entry.is_file():
+                        directory.add(name[:-3] if name.endswith('.md') else name, shard)
+    return directory
@@ -0,0 +1,300 @@
+"""
+# 仓库快照和比较
+
+快照记录仓库中每个文件的相对路径、大小、修改时间、内容哈希，以及笔记的标签和链接目标，
+按路径排序，压缩（gzip JSON）保存在仓库缓存目录的 `snapshots` 文件夹中。
+
+比较两个快照（或者快照和仓库当前的状态）：
+
+1. 两边都按路径排好序，一次归并得到新增、删除和内容变化的文件；
+2. 删除和新增的文件再按内容哈希排序归并，哈希相同的配对为移动（改名）；
+3. 内容变化和移动的笔记比较前后的标签和链接，新增、删除的笔记的标签和链接全部算作增加、减少。
+
+创建快照时，大小和修改时间与最近一次快照相同的文件直接使用记录的哈希、标签和链接，
+只读取和解析有变化的文件。
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from obtool.obmark import ObLink, parse_note, STREAM_NOTE_SIZE
+from obtool.obsidian import ObVault
+from obtool.utils import get_cache_dir
+
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_SUFFIX = '.json.gz'
+SNAPSHOT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+_NAME_RE = re.compile(r'[\w.-]+')
+
+
+class SnapshotEntry(NamedTuple):
+    path: str                   # 相对仓库的路径
+    size: int
+    mtime_ns: int
+    hash: str                   # 内容哈希
+    # 笔记的标签（含 Frontmatter 中的）和链接目标，排序、去重后用换行连接，
+    # 只有变化的笔记才需要拆分比较，加载快照时不必为每篇笔记创建列表
+    tags: str = ''
+    links: str = ''
+
+    @property
+    def is_note(self) -> bool:
+        return self.path.endswith('.md')
+
+    @property
+    def tag_set(self) -> Set[str]:
+        return set(self.tags.split('\n')) if self.tags else set()
+
+    @property
+    def link_set(self) -> Set[str]:
+        return set(self.links.split('\n')) if self.links else set()
+
+
+@dataclass
+class VaultSnapshot:
+    name: str
+    created: datetime.datetime
+    entries: List[SnapshotEntry]    # 按路径排序
+    hashed: int = 0                 # 创建时重新读取的文件数量，其余的使用上次快照的记录
+
+    def to_json(self) -> dict:
+        return {
+            'version': SNAPSHOT_VERSION,
+            'name': self.name,
+            'created': self.created.isoformat(timespec='seconds'),
+            # 按列保存，加载时直接组合成记录
+            'files': {column: [getattr(e, column) for e in self.entries] for column in SnapshotEntry._fields},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'VaultSnapshot':
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f'不支持的快照版本: {data.get("version")}')
+        files = data['files']
+        entries = list(map(SnapshotEntry._make, zip(*(files[column] for column in SnapshotEntry._fields))))
+        return cls(data['name'], datetime.datetime.fromisoformat(data['created']), entries)
+
+
+def snapshot_dir(vault_path: Path) -> Path:
+    folder = get_cache_dir(vault_path).joinpath(SNAPSHOT_DIR)
+    folder.mkdir(exist_ok=True)
+    return folder
+
+
+def list_snapshots(vault_path: Path) -> List[Tuple[str, datetime.datetime, int]]:
+    """保存的快照：(名称, 保存时间, 文件大小)，按保存时间排序"""
+    result = []
+    for p in snapshot_dir(vault_path).glob('*' + SNAPSHOT_SUFFIX):
+        st = p.stat()
+        result.append((p.name[:-len(SNAPSHOT_SUFFIX)], datetime.datetime.fromtimestamp(st.st_mtime), st.st_size))
+    result.sort(key=lambda item: item[1])
+    return result
+
+
+def load_snapshot(vault_path: Path, name: str) -> VaultSnapshot:
+    path = snapshot_dir(vault_path).joinpath(name + SNAPSHOT_SUFFIX)
+    if not path.exists():
+        raise ValueError(f'快照不存在: {name}')
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return VaultSnapshot.from_json(json.load(f))
+
+
+def latest_snapshot(vault_path: Path) -> Optional[VaultSnapshot]:
+    snapshots = list_snapshots(vault_path)
+    if not snapshots:
+        return None
+    try:
+        return load_snapshot(vault_path, snapshots[-1][0])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_snapshot(vault_path: Path, snapshot: VaultSnapshot) -> Path:
+    if not _NAME_RE.fullmatch(snapshot.name):
+        raise ValueError(f'快照名称只能包含字母、数字、`_`、`-` 和 `.`: {snapshot.name}')
+    folder = snapshot_dir(vault_path)
+    path = folder.joinpath(snapshot.name + SNAPSHOT_SUFFIX)
+    tmp = folder.joinpath(f'.{snapshot.name}.tmp')
+    data = json.dumps(snapshot.to_json(), ensure_ascii=False, separators=(',', ':'))
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def _note_marks(path: Path, data: Optional[bytes], prescan: bool) -> Tuple[str, str]:
+    """笔记的标签和链接目标，直接解析文件，不使用（可能已经过时的）仓库索引"""
+    marks = parse_note(path, prescan, data)
+    tags = list(marks.tags)
+    tags_in_meta = marks.meta.get('tags') or []
+    if isinstance(tags_in_meta, str):
+        tags_in_meta = tags_in_meta.split(',')
+    tags.extend(str(t).strip() for t in tags_in_meta if t is not None)
+    targets = {ObLink.from_label(label).target for label in marks.links}
+    return '\n'.join(sorted(set(t for t in tags if t))), '\n'.join(sorted(t for t in targets if t))
+
+
+def _scan_file(path: Path, rel: str, size: int, mtime_ns: int, prescan: bool) -> SnapshotEntry:
+    h = hashlib.blake2b(digest_size=16)
+    is_note = rel.endswith('.md')
+    if is_note and size <= STREAM_NOTE_SIZE:
+        with open(path, 'rb') as f:
+            data = f.read()
+        h.update(data)
+        tags, links = _note_marks(path, data, prescan)
+        return SnapshotEntry(rel, size, mtime_ns, h.hexdigest(), tags, links)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    tags, links = _note_marks(path, None, prescan) if is_note else ('', '')
+    return SnapshotEntry(rel, size, mtime_ns, h.hexdigest(), tags, links)
+
+
+def take_snapshot(vault: ObVault, name: Optional[str] = None,
+                  previous: Optional[VaultSnapshot] = None) -> VaultSnapshot:
+    """记录仓库当前的状态
+
+    :param name: 快照名称，缺省使用当前时间
+    :param previous: 大小和修改时间没有变化的文件使用其中的记录
+    """
+    now = datetime.datetime.now()
+    known: Dict[str, SnapshotEntry] = {e.path: e for e in previous.entries} if previous else {}
+    entries = []
+    hashed = 0
+    for ob_file in vault.iter_files():
+        path = ob_file.path
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        rel = path.relative_to(vault.path).as_posix()
+        entry = known.get(rel)
+        if entry is None or entry.size != st.st_size or entry.mtime_ns != st.st_mtime_ns:
+            try:
+                entry = _scan_file(path, rel, st.st_size, st.st_mtime_ns, vault.prescan)
+            except OSError:
+                continue
+            hashed += 1
+        entries.append(entry)
+    entries.sort(key=lambda e: e.path)
+    return VaultSnapshot(name or now.strftime('%Y%m%d-%H%M%S'), now, entries, hashed)
+
+
+@dataclass
+class SnapshotDiff:
+    old: str
+    new: str
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    moved: List[Tuple[str, str]] = field(default_factory=list)      # (原路径, 新路径)
+    tags_added: Dict[str, List[str]] = field(default_factory=dict)  # 标签 -> 增加了这个标签的笔记
+    tags_removed: Dict[str, List[str]] = field(default_factory=dict)
+    links_added: List[Tuple[str, str]] = field(default_factory=list)    # (笔记, 链接目标)
+    links_removed: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.modified or self.moved
+                    or self.tags_added or self.tags_removed or self.links_added or self.links_removed)
+
+
+def _match_moves(removed: List[SnapshotEntry],
+                 added: List[SnapshotEntry]) -> Tuple[List[Tuple[SnapshotEntry, SnapshotEntry]],
+                                                      List[SnapshotEntry], List[SnapshotEntry]]:
+    """删除和新增的文件按哈希归并，哈希相同的依次配对
+
+    :return: 移动的 (原, 新)，剩下的删除，剩下的新增
+    """
+    old = sorted(removed, key=lambda e: (e.hash, e.path))
+    new = sorted(added, key=lambda e: (e.hash, e.path))
+    moves = []
+    rest_old = []
+    rest_new = []
+    i = j = 0
+    while i < len(old) and j < len(new):
+        if old[i].hash == new[j].hash:
+            moves.append((old[i], new[j]))
+            i += 1
+            j += 1
+        elif old[i].hash < new[j].hash:
+            rest_old.append(old[i])
+            i += 1
+        else:
+            rest_new.append(new[j])
+            j += 1
+    rest_old.extend(old[i:])
+    rest_new.extend(new[j:])
+    rest_old.sort(key=lambda e: e.path)
+    rest_new.sort(key=lambda e: e.path)
+    return moves, rest_old, rest_new
+
+
+def diff_snapshots(old: VaultSnapshot, new: VaultSnapshot) -> SnapshotDiff:
+    """比较两个快照，两边的记录都按路径排好序"""
+    result = SnapshotDiff(old.name, new.name)
+    removed: List[SnapshotEntry] = []
+    added: List[SnapshotEntry] = []
+    # (原, 新)，需要比较标签和链接的笔记
+    changed: List[Tuple[Optional[SnapshotEntry], Optional[SnapshotEntry]]] = []
+    a, b = old.entries, new.entries
+    i = j = 0
+    while i < len(a) and j < len(b):
+        x, y = a[i], b[j]
+        if x.path == y.path:
+            if x.hash != y.hash:
+                result.modified.append(y.path)
+                changed.append((x, y))
+            i += 1
+            j += 1
+        elif x.path < y.path:
+            removed.append(x)
+            i += 1
+        else:
+            added.append(y)
+            j += 1
+    removed.extend(a[i:])
+    added.extend(b[j:])
+
+    moves, removed, added = _match_moves(removed, added)
+    for x, y in moves:
+        result.moved.append((x.path, y.path))
+        changed.append((x, y))
+    result.removed = [e.path for e in removed]
+    result.added = [e.path for e in added]
+    changed.extend((x, None) for x in removed)
+    changed.extend((None, y) for y in added)
+
+    tags_added: Dict[str, List[str]] = {}
+    tags_removed: Dict[str, List[str]] = {}
+    for x, y in changed:
+        if not (x or y).is_note:
+            continue
+        note = (y or x).path[:-3]
+        old_tags = x.tag_set if x else set()
+        new_tags = y.tag_set if y else set()
+        for tag in new_tags - old_tags:
+            tags_added.setdefault(tag, []).append(note)
+        for tag in old_tags - new_tags:
+            tags_removed.setdefault(tag, []).append(note)
+        old_links = x.link_set if x else set()
+        new_links = y.link_set if y else set()
+        result.links_added.extend((note, t) for t in sorted(new_links - old_links))
+        result.links_removed.extend((note, t) for t in sorted(old_links - new_links))
+    result.tags_added = {t: sorted(notes) for t, notes in sorted(tags_added.items())}
+    result.tags_removed = {t: sorted(notes) for t, notes in sorted(tags_removed.items())}
+    result.links_added.sort()
+    result.links_removed.sort()
+    return result
+
+
+def iter_snapshot_names(vault_path: Path) -> Iterable[str]:
+    return (name for name, _, _ in list_snapshots(vault_path))
@@ -0,0 +1,127 @@
+"""
+# 标签共现统计
+
+把笔记和标签的关系存为稀疏矩阵（CSR 格式的两个数组），
+用 NumPy 向量化地统计每一对标签同时出现的笔记数量，
+再计算 Jaccard 或 PMI 相似度，给出相关标签的建议。
+
+结果按仓库索引的版本缓存，索引没有变化时查询只需要一次二分查找和一次排序。
+
+需要安装 NumPy。
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from obtool.obsidian import ObVault
+
+MEASURES = ('jaccard', 'pmi', 'count')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('标签共现统计需要安装 numpy: pip install numpy')
+
+
+def _is_relative(a: str, b: str) -> bool:
+    """嵌套标签的上下级关系，例如 `a` 和 `a/b`"""
+    return a.startswith(b + '/') or b.startswith(a + '/')
+
+
+@dataclass
+class TagCooccurrence:
+    tags: List[str]                 # 标签，按名称排序，下标即标签编号
+    counts: 'np.ndarray'            # 每个标签的笔记数量
+    pair_rows: 'np.ndarray'         # 共现的标签对 (row, col)，按 row、col 排序
+    pair_cols: 'np.ndarray'
+    pair_counts: 'np.ndarray'       # 共现的笔记数量
+    notes_count: int                # 有标签的笔记数量
+    index: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.index = {tag: i for i, tag in enumerate(self.tags)}
+
+    @classmethod
+    def build(cls, vault: ObVault) -> 'TagCooccurrence':
+        """从仓库的标签索引构建，嵌套标签的每一级都作为独立的标签"""
+        _require_numpy()
+        vault.ensure_all_parsed()
+        tags = sorted(vault.tags)
+        index = {tag: i for i, tag in enumerate(tags)}
+
+        # 笔记 x 标签 的稀疏矩阵：note_ids[k] 和 tag_ids[k] 表示第 k 个非零元素
+        note_ids = {}
+        entries_note = []
+        entries_tag = []
+        for tag, notes in vault.tags.items():
+            t = index[tag]
+            for note in notes:
+                entries_note.append(note_ids.setdefault(note, len(note_ids)))
+                entries_tag.append(t)
+        entries_note = np.asarray(entries_note, dtype=np.int64)
+        entries_tag = np.asarray(entries_tag, dtype=np.int64)
+        n_tags = len(tags)
+        counts = np.bincount(entries_tag, minlength=n_tags)
+
+        # 按笔记排序得到 CSR 格式
+        order = np.argsort(entries_note, kind='stable')
+        entries_note = entries_note[order]
+        entries_tag = entries_tag[order]
+        degree = np.bincount(entries_note, minlength=len(note_ids))
+        starts = np.concatenate(([0], np.cumsum(degree)[:-1]))
+
+        # 每个非零元素和它所在笔记的所有标签组成一对
+        entry_degree = degree[entries_note]
+        rows = np.repeat(entries_tag, entry_degree)
+        total = int(entry_degree.sum())
+        block_starts = np.repeat(np.cumsum(entry_degree) - entry_degree, entry_degree)
+        cols_pos = np.repeat(starts[entries_note], entry_degree) + (np.arange(total) - block_starts)
+        cols = entries_tag[cols_pos]
+        mask = rows != cols
+        codes, pair_counts = np.unique(rows[mask] * n_tags + cols[mask], return_counts=True)
+        return cls(tags, counts, codes // max(n_tags, 1), codes % max(n_tags, 1),
+                   pair_counts, len(note_ids))
+
+    def related(self, tag: str, limit: int = 10,
+                measure: str = 'jaccard') -> List[Tuple[str, int, float]]:
+        """和指定标签相关的标签
+
+        :param measure: `jaccard` 同时出现的笔记占两者并集的比例；
+            `pmi` 点互信息，同时出现的概率相对独立出现的比例的对数；
+            `count` 同时出现的笔记数量
+        :return: (标签, 同时出现的笔记数量, 相似度)，按相似度从高到低排序，
+            不包含嵌套标签的上下级
+        """
+        if measure not in MEASURES:
+            raise ValueError(f'不支持的相似度: {measure}，可选: {", ".join(MEASURES)}')
+        i = self.index.get(tag)
+        if i is None:
+            return []
+        lo, hi = np.searchsorted(self.pair_rows, [i, i + 1])
+        cols = self.pair_cols[lo:hi]
+        both = self.pair_counts[lo:hi].astype(np.float64)
+        if measure == 'jaccard':
+            score = both / (self.counts[i] + self.counts[cols] - both)
+        elif measure == 'pmi':
+            score = np.log(both * self.notes_count / (self.counts[i] * self.counts[cols]))
+        else:
+            score = both
+        order = np.argsort(-score, kind='stable')
+        result = []
+        for k in order:
+            other = self.tags[cols[k]]
+            if _is_relative(tag, other):
+                continue
+            result.append((other, int(both[k]), float(score[k])))
+            if len(result) >= limit:
+                break
+        return result
+
+
+def get_cooccurrence(vault: ObVault) -> TagCooccurrence:
+    """获取仓库的标签共现统计，按索引版本缓存"""
+    return vault.cached('tag_cooccurrence', TagCooccurrence.build)
@@ -0,0 +1,107 @@
+"""
+# 任务索引
+
+解析笔记时提取任务列表中的复选框（`- [ ]`、`- [x]`），按笔记保存，
+笔记重新解析或删除时增量更新。
+
+有截止日期（`📅 YYYY-MM-DD`）的任务另外按日期排序保存，
+查询逾期或某天之前到期的任务时只需要二分查找。
+"""
+import datetime
+import threading
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from obtool.obmark import ObTask
+from obtool.properties import SortedColumn
+from obtool.utils import locked
+
+STATUSES = ('open', 'done', 'all')
+
+
+class TaskIndex:
+    """仓库中所有笔记的任务"""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, Tuple[ObTask, ...]] = {}
+        # (笔记, 任务下标) -> 截止日期
+        self._due = SortedColumn()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return sum(len(tasks) for tasks in self._tasks.values())
+
+    @locked
+    def add(self, note, tasks: Iterable[ObTask]):
+        """设置一篇笔记的任务，替换原来的"""
+        self.remove(note)
+        tasks = tuple(tasks)
+        if not tasks:
+            return
+        self._tasks[note] = tasks
+        for i, task in enumerate(tasks):
+            if task.due is not None:
+                self._due.add((note, i), task.due)
+
+    @locked
+    def remove(self, note):
+        for i, task in enumerate(self._tasks.pop(note, ())):
+            if task.due is not None:
+                self._due.remove((note, i))
+
+    @locked
+    def get(self, note) -> Tuple[ObTask, ...]:
+        return self._tasks.get(note, ())
+
+    @locked
+    def query(self, status: str = 'open', due_before: Optional[datetime.date] = None,
+              overdue=False, tags: Iterable[str] = (),
+              today: Optional[datetime.date] = None) -> List[Tuple[Hashable, ObTask]]:
+        """查询任务
+
+        :param status: `open` 未完成，`done` 已完成，`all` 全部（包括取消的）
+        :param due_before: 只返回截止日期在此之前（含当天）的任务
+        :param overdue: 只返回已经逾期的任务，即截止日期在今天之前且未完成
+        :param tags: 任务文本中包含所有这些标签（包括下级标签）
+        :return: (笔记, 任务)，有截止日期的按日期排序，其它的按笔记顺序排在后面
+        """
+        if status not in STATUSES:
+            raise ValueError(f'不支持的任务状态: {status}，可选: {", ".join(STATUSES)}')
+        if overdue:
+            status = 'open'
+            today = today or datetime.date.today()
+            candidates = self._iter_due('<', today)
+        elif due_before is not None:
+            candidates = self._iter_due('<=', due_before)
+        else:
+            candidates = self._iter_all()
+        tags = tuple(tags)
+        result = []
+        for note, task in candidates:
+            if status == 'open' and not task.open:
+                continue
+            if status == 'done' and not task.done:
+                continue
+            if tags and not all(_has_tag(task, t) for t in tags):
+                continue
+            result.append((note, task))
+        return result
+
+    def _iter_due(self, op: str, day: datetime.date):
+        items = self._due.range(op, day)
+        for note, i in sorted(items, key=lambda k: (self._tasks[k[0]][k[1]].due, k[1])):
+            yield note, self._tasks[note][i]
+
+    def _iter_all(self):
+        dated = []
+        undated = []
+        for note, tasks in self._tasks.items():
+            for task in tasks:
+                (dated if task.due else undated).append((note, task))
+        dated.sort(key=lambda t: t[1].due)
+        yield from dated
+        yield from undated
+
+
+def _has_tag(task: ObTask, tag: str) -> bool:
+    tag = tag.lstrip('#')
+    return any(t == tag or t.startswith(tag + '/') for t in task.tags)
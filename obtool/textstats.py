@@ -0,0 +1,103 @@
+"""
+# 文本统计
+
+字数、字符数、链接数和阅读时间。中日文没有空格分词，每个汉字或假名算一个字，
+其它文字按连续的字母数字算一个词。
+
+统计在解析笔记时（包括预扫描跳过 Markdown 解析的笔记）用已经读入的正文计算，
+不经过 HTML 转换，结果保存在笔记的解析结果中；
+按文件夹和标签的汇总按仓库索引的版本缓存。
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from obtool.obsidian import ObVault
+
+# 每分钟阅读的词数（西文）和字数（中日文）
+WORDS_PER_MINUTE = 200
+CJK_PER_MINUTE = 300
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK_RE = re.compile(f'[{_CJK}]')
+_WORD_RE = re.compile(f'[^\\W{_CJK}]+')
+# [[wiki 链接]]、![[嵌入]] 和 [Markdown](链接)
+_LINK_RE = re.compile(r'\[\[.*?\]\]|\[[^\[\]\n]*\]\([^)\n]*\)')
+
+
+@dataclass(frozen=True)
+class TextStats:
+    words: int = 0      # 西文词数
+    cjk: int = 0        # 中日文字数
+    chars: int = 0      # 不含空白的字符数
+    links: int = 0      # 链接数
+    notes: int = 0      # 汇总的笔记数
+
+    def __add__(self, other: 'TextStats') -> 'TextStats':
+        return TextStats(self.words + other.words, self.cjk + other.cjk,
+                         self.chars + other.chars, self.links + other.links,
+                         self.notes + other.notes)
+
+    @property
+    def total_words(self) -> int:
+        """字数，西文词数加中日文字数"""
+        return self.words + self.cjk
+
+    @property
+    def reading_minutes(self) -> float:
+        return self.words / WORDS_PER_MINUTE + self.cjk / CJK_PER_MINUTE
+
+
+EMPTY_STATS = TextStats()
+
+
+def text_stats(text: str) -> TextStats:
+    """统计一篇笔记的正文"""
+    if not text:
+        return TextStats(notes=1)
+    return TextStats(
+        words=len(_WORD_RE.findall(text)),
+        cjk=len(_CJK_RE.findall(text)),
+        chars=sum(map(len, text.split())),
+        links=len(_LINK_RE.findall(text)),
+        notes=1,
+    )
+
+
+@dataclass
+class VaultTextStats:
+    total: TextStats
+    by_folder: Dict[Path, TextStats]    # 相对仓库根目录的文件夹，包含子文件夹中的笔记
+    by_tag: Dict[str, TextStats]        # 嵌套标签的每一级分别汇总
+
+
+def _build(vault: 'ObVault') -> VaultTextStats:
+    vault.ensure_all_parsed()
+    root = Path('.')
+    by_folder: Dict[Path, TextStats] = {root: EMPTY_STATS}
+    for folder in vault.folders:
+        by_folder[folder.relative_to(vault.path)] = EMPTY_STATS
+    # 先加到笔记所在的文件夹，再从最深的文件夹开始向上级汇总
+    total = EMPTY_STATS
+    for note in vault.iter_notes():
+        stats = note.text_stats
+        total += stats
+        parent = note.path.parent.relative_to(vault.path)
+        by_folder[parent] = by_folder.get(parent, EMPTY_STATS) + stats
+    for folder in sorted(by_folder, key=lambda p: len(p.parts), reverse=True):
+        if folder != root:
+            by_folder[folder.parent] = by_folder.get(folder.parent, EMPTY_STATS) + by_folder[folder]
+
+    by_tag: Dict[str, TextStats] = defaultdict(lambda: EMPTY_STATS)
+    for tag, notes in vault.tags.items():
+        for note in notes:
+            by_tag[tag] += note.text_stats
+    return VaultTextStats(total, by_folder, dict(by_tag))
+
+
+def get_vault_text_stats(vault: 'ObVault') -> VaultTextStats:
+    """仓库的文本统计汇总，按索引版本缓存"""
+    return vault.cached('text_stats', _build)
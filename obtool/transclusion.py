@@ -0,0 +1,298 @@
+"""
+# 嵌入展开
+
+`![[note]]`、`![[note#标题]]`、`![[note#^block]]` 嵌入其它笔记（的一部分），
+渲染时把嵌入的内容展开成 HTML，嵌入的内容中还有嵌入的继续展开。
+
+- 片段（笔记、标题下的内容或块）渲染后缓存，再次嵌入同一片段时不再解析；
+- 缓存的片段记录用到的所有笔记（包括嵌套嵌入的）的文件签名，任何一个变化时片段失效，
+  `invalidate` 只移除依赖这篇笔记的片段；
+- 循环嵌入和超过深度限制的嵌入不展开，保留为链接。
+
+片段中的链接先渲染成占位符，最后按所在的页面生成地址，同一个片段可以用在不同位置的页面中。
+"""
+import functools
+import html
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+from obtool.obmark import ObMarkdown, ObLink, read_note_body, normalize_heading, anchor_id, BLOCK_ID_RE, FENCE_RE
+from obtool.obsidian import ObVault, ObNote, ObFile
+
+# 缺省的最大嵌套深度
+MAX_DEPTH = 5
+
+_TOKEN_PREFIX = 'obtool-link:'
+_LINK_TOKEN_RE = re.compile(r'<a ([^>]*?)href="obtool-link:(\d+)"([^>]*)>([^<]*)</a>')
+# 单独成段的链接（展开为 <div>，不再放在 <p> 中），或者段落中的链接（展开为 <span>）
+_EMBED_RE = re.compile(r'<p>\s*(<a [^>]*href="obtool-link:\d+"[^>]*>[^<]*</a>)\s*</p>'
+                       r'|(<a [^>]*href="obtool-link:\d+"[^>]*>[^<]*</a>)')
+# 只有一个段落的片段，段落中嵌入时去掉 <p>
+_SINGLE_PARAGRAPH_RE = re.compile(r'\s*<p>((?:(?!</?p>).)*)</p>\s*', re.DOTALL)
+_HEADING_LINE_RE = re.compile(r'^(#{1,6}) +(.*?)[ #]*$')
+_LIST_ITEM_RE = re.compile(r'^[ \t]*(?:[-*+]|\d+[.)])[ \t]')
+
+FileSig = Optional[Tuple[int, int]]
+# (链接所在的笔记, 链接目标, `#标题` 或 `#^块`) -> 地址
+HrefBuilder = Callable[[Optional[ObNote], str, str], str]
+
+
+def _file_sig(path: Path) -> FileSig:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _body_lines(text: str) -> List[Tuple[str, bool]]:
+    """正文的每一行，以及是否在代码块中"""
+    result = []
+    fence = None
+    for line in text.split('\n'):
+        m = FENCE_RE.match(line)
+        if m:
+            marker = m.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            result.append((line, True))
+            continue
+        result.append((line, fence is not None))
+    return result
+
+
+def extract_section(text: str, heading: str) -> Optional[str]:
+    """标题和它下面的内容，直到同级或更高级的标题，找不到返回 None"""
+    wanted = normalize_heading(heading)
+    lines = _body_lines(text)
+    start = level = None
+    for i, (line, in_code) in enumerate(lines):
+        m = None if in_code else _HEADING_LINE_RE.match(line)
+        if not m:
+            continue
+        if start is None:
+            if normalize_heading(m.group(2)) == wanted:
+                start, level = i, len(m.group(1))
+        elif len(m.group(1)) <= level:
+            return '\n'.join(line for line, _ in lines[start:i])
+    if start is None:
+        return None
+    return '\n'.join(line for line, _ in lines[start:])
+
+
+def extract_block(text: str, block_id: str) -> Optional[str]:
+    """`^block_id` 所在的块：列表项是这一行，段落是这一行所在的整段，找不到返回 None"""
+    lines = _body_lines(text)
+    for i, (line, in_code) in enumerate(lines):
+        if in_code:
+            continue
+        m = BLOCK_ID_RE.search(line)
+        if not m or m.group(1) != block_id:
+            continue
+        line = line[:m.start()] + line[m.end():].rstrip()
+        if _LIST_ITEM_RE.match(line):
+            return line
+        start = i
+        while start > 0 and lines[start - 1][0].strip() and not lines[start - 1][1]:
+            start -= 1
+        return '\n'.join([l for l, _ in lines[start:i]] + [line])
+    return None
+
+
+@dataclass
+class _Fragment:
+    html: str
+    sources: Dict[Path, FileSig]    # 用到的所有笔记及其文件签名
+    height: int                     # 其中嵌入的层数，没有嵌入为 0
+
+
+@dataclass
+class TransclusionStats:
+    hits: int = 0           # 使用缓存的片段数量
+    rendered: int = 0       # 渲染的片段数量
+    invalidated: int = 0    # 因为笔记变化而失效的片段数量
+    cycles: int = 0         # 没有展开的循环嵌入
+    too_deep: int = 0       # 超过深度限制没有展开的嵌入
+    missing: int = 0        # 找不到目标（笔记、标题或块）或者目标不是笔记，没有展开的嵌入
+
+
+class Transcluder:
+    """渲染笔记并展开其中的嵌入，片段缓存在实例中，可以跨多次 `render` 使用"""
+
+    def __init__(self, vault: ObVault, build_href: Optional[HrefBuilder] = None,
+                 max_depth: int = MAX_DEPTH):
+        """
+        :param build_href: 生成链接地址，缺省使用目标笔记的相对路径，目标不存在时为 `#`
+        :param max_depth: 最大嵌套深度，超过时不再展开
+        """
+        self.vault = vault
+        self.build_href = build_href or self._default_href
+        self.max_depth = max_depth
+        self.stats = TransclusionStats()
+        self._cache: Dict[Tuple[Path, str], _Fragment] = {}
+        # 笔记 -> 用到这篇笔记的片段
+        self._dependents: Dict[Path, Set[Tuple[Path, str]]] = {}
+        # 片段中的链接，占位符是在这个列表中的序号
+        self._links: List[Tuple[Optional[ObNote], str, str]] = []
+        self._link_ids: Dict[Tuple[Optional[ObNote], str, str], int] = {}
+        # 一次 `render` 中文件签名只读取一次
+        self._sigs: Dict[Path, FileSig] = {}
+        # 渲染过的页面用到的笔记
+        self._page_sources: Dict[Path, Dict[Path, FileSig]] = {}
+
+    def _default_href(self, source: Optional[ObNote], target: str, end: str) -> str:
+        ob_file = self.vault.resolve_target(target, source)
+        if ob_file is None:
+            return '#'
+        href = quote(ob_file.long_name + ('.html' if ob_file.is_note() else ''))
+        if end.startswith('#'):
+            href += '#' + quote(anchor_id(end[1:]))
+        return href
+
+    def _sig(self, path: Path) -> FileSig:
+        if path not in self._sigs:
+            self._sigs[path] = _file_sig(path)
+        return self._sigs[path]
+
+    def _link_token(self, source: Optional[ObNote], label: str, base: str, end: str) -> str:
+        """作为 `ObsidianLinkExtension` 的 `build_url` 使用"""
+        key = (source, label.rstrip('\\').strip(), end)
+        i = self._link_ids.get(key)
+        if i is None:
+            i = self._link_ids[key] = len(self._links)
+            self._links.append(key)
+        return f'{_TOKEN_PREFIX}{i}'
+
+    def invalidate(self, note: ObFile) -> int:
+        """笔记变化后移除依赖它的片段，返回移除的数量"""
+        return self._invalidate(note.path)
+
+    def _invalidate(self, path: Path) -> int:
+        count = 0
+        for key in self._dependents.pop(path, ()):
+            if self._cache.pop(key, None) is not None:
+                count += 1
+        self.stats.invalidated += count
+        self._sigs.pop(path, None)
+        return count
+
+    def sources_of(self, note: ObNote) -> Dict[Path, FileSig]:
+        """最近一次 `render` 这篇笔记时用到的所有笔记（包括自己）"""
+        return dict(self._page_sources.get(note.path, {}))
+
+    def render(self, note: ObNote, build_href: Optional[HrefBuilder] = None) -> str:
+        """渲染笔记，展开所有嵌入
+
+        :param build_href: 这个页面中链接地址的生成方式，缺省使用初始化时指定的
+        """
+        self._sigs.clear()
+        body, sources, _, _ = self._fragment(note, '', ())
+        self._page_sources[note.path] = sources
+        return self._resolve_links(body if body is not None else '', build_href or self.build_href)
+
+    def _cached(self, key: Tuple[Path, str]) -> Optional[_Fragment]:
+        fragment = self._cache.get(key)
+        if fragment is None:
+            return None
+        changed = [p for p, sig in fragment.sources.items() if self._sig(p) != sig]
+        if not changed:
+            return fragment
+        # 这个片段也在变化的笔记的依赖中，一起移除
+        for path in changed:
+            self._invalidate(path)
+        return None
+
+    def _fragment(self, note: ObNote, anchor: str,
+                  stack: Tuple[Tuple[Path, str], ...]) -> Tuple[Optional[str], Dict[Path, FileSig], bool, int]:
+        """渲染笔记的一部分：`anchor` 为空是整篇笔记，`^` 开头是块，否则是标题
+
+        :param stack: 外层的片段，长度就是这个片段嵌套的层数
+        :return: HTML（找不到时为 None），用到的笔记，是否完整展开（完整展开的才缓存），嵌入的层数
+        """
+        key = (note.path, anchor)
+        fragment = self._cached(key)
+        # 缓存的片段放在这里不能超过深度限制，否则重新渲染（不完整，也不缓存）
+        if fragment is not None and len(stack) + fragment.height <= self.max_depth:
+            self.stats.hits += 1
+            return fragment.html, fragment.sources, True, fragment.height
+
+        sources = {note.path: self._sig(note.path)}
+        try:
+            text = read_note_body(note.path)
+        except OSError:
+            return None, sources, True, 0
+        if anchor.startswith('^'):
+            text = extract_block(text, anchor[1:])
+        elif anchor:
+            text = extract_section(text, ObLink.from_label('#' + anchor).heading)
+        if text is None:
+            return None, sources, True, 0
+
+        self.stats.rendered += 1
+        markdown = ObMarkdown(link_config={
+            'base_url': '',
+            'end_url': '',
+            'build_url': functools.partial(self._link_token, note),
+        }, tag_config={'as_link': False}, anchors=True)
+        body = markdown.convert(text)
+        complete = True
+        height = 0
+        stack = stack + (key,)
+
+        def _expand(m: 're.Match') -> str:
+            """展开嵌入的链接，`m` 是单独成段的链接或者任意位置的链接"""
+            nonlocal complete, height
+            link_m = _LINK_TOKEN_RE.match(m.group(1) or m.group(2))
+            if link_m is None or 'embed="true"' not in link_m.group(1) + link_m.group(3):
+                return m.group(0)
+            source, target, end = self._links[int(link_m.group(2))]
+            embedded = self.vault.resolve_target(target, source)
+            if embedded is None or not embedded.is_note():
+                self.stats.missing += 1
+                return m.group(0)
+            sub_anchor = end[1:] if end.startswith('#') else ''
+            sub_key = (embedded.path, sub_anchor)
+            if sub_key in stack:
+                self.stats.cycles += 1
+                complete = False
+                return m.group(0)
+            if len(stack) > self.max_depth:
+                self.stats.too_deep += 1
+                complete = False
+                return m.group(0)
+            sub_html, sub_sources, sub_complete, sub_height = self._fragment(embedded, sub_anchor, stack)
+            sources.update(sub_sources)
+            complete = complete and sub_complete
+            if sub_html is None:
+                self.stats.missing += 1
+                return m.group(0)
+            height = max(height, sub_height + 1)
+            src = html.escape(embedded.long_name + end, quote=True)
+            if m.group(1):
+                return f'<div class="embed" data-src="{src}">\n{sub_html}\n</div>'
+            # 段落中的嵌入不能用 <div>，只有一个段落的片段去掉 <p>
+            single = _SINGLE_PARAGRAPH_RE.fullmatch(sub_html)
+            if single:
+                sub_html = single.group(1)
+            return f'<span class="embed" data-src="{src}">{sub_html}</span>'
+
+        # 只替换一遍，展开的内容中没有展开的链接（循环、过深）保持原样
+        body = _EMBED_RE.sub(_expand, body)
+        if complete:
+            self._cache[key] = _Fragment(body, sources, height)
+            for path in sources:
+                self._dependents.setdefault(path, set()).add(key)
+        return body, sources, complete, height
+
+    def _resolve_links(self, body: str, build_href: HrefBuilder) -> str:
+        """把占位符替换成链接地址"""
+        def _sub(m: 're.Match') -> str:
+            source, target, end = self._links[int(m.group(2))]
+            href = html.escape(build_href(source, target, end), quote=True)
+            return f'<a {m.group(1)}href="{href}"{m.group(3)}>{m.group(4)}</a>'
+        return _LINK_TOKEN_RE.sub(_sub, body)
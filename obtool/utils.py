@@ -1,11 +1,28 @@
+import functools
+import hashlib
 import os
+import stat
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Tuple
+
 import pyperclip
 
 
 WIN = sys.platform.startswith("win")
 
 
+def locked(method):
+    """在对象的 `_lock` 中执行，索引可能在解析的线程中修改，同时在其它线程中查询"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 def get_ob_uri_from_clip():
     txt = pyperclip.paste()
     if txt.startswith('obsidian://'):
@@ -64,3 +81,82 @@ def get_app_dir(app_name: str, roaming: bool = True, force_posix: bool = False)
         os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
         _posixify(app_name),
     )
+
+
+def get_cache_dir(vault_path: Path) -> Path:
+    """仓库的缓存目录，不同路径的同名仓库互不干扰"""
+    vault_path = Path(vault_path).absolute()
+    digest = hashlib.sha1(vault_path.as_posix().encode('utf-8')).hexdigest()[:10]
+    cache_dir = Path(get_app_dir('obtool')).joinpath('cache', f'{vault_path.name}-{digest}')
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _get_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# 只在导入时读取一次，os.umask 会临时修改进程的设置，不能在写文件的线程中调用
+_UMASK = _get_umask()
+
+
+def _file_mode(path: Path) -> int:
+    """替换后文件的权限：保持原文件的权限，新文件和普通创建的文件相同"""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def _write_temp(path: Path, text: str) -> str:
+    """在目标文件同一目录下写临时文件，保证之后的 os.replace 是原子操作
+
+    mkstemp 创建的文件权限是 0600，替换后会保留，所以先改为目标文件的权限
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        os.chmod(tmp, _file_mode(path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def atomic_write(path: Path, text: str):
+    """原子写入文本文件：先写临时文件再替换"""
+    os.replace(_write_temp(path, text), path)
+
+
+def atomic_write_batch(items: Iterable[Tuple[Path, str]], workers: int = 1):
+    """批量原子写入
+
+    先把所有内容写到临时文件，全部成功后才逐个替换，
+    写临时文件阶段出错则不会修改任何文件。
+
+    :param workers: 大于 1 时在线程池中写临时文件
+    """
+    temps = []
+    if workers > 1:
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_temp, path, text) for path, text in items]
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        temps = [(f.result(), path) for f, (path, _) in zip(futures, items) if f.exception() is None]
+        if errors:
+            for tmp, _ in temps:
+                os.unlink(tmp)
+            raise errors[0]
+    else:
+        try:
+            for path, text in items:
+                temps.append((_write_temp(path, text), path))
+        except BaseException:
+            for tmp, _ in temps:
+                os.unlink(tmp)
+            raise
+    for tmp, path in temps:
+        os.replace(tmp, path)
@@ -1,16 +1,30 @@
+import datetime
 import functools
 from pathlib import Path
-from typing import List, Iterable, cast, Union
+from typing import List, Iterable, Optional, Tuple, cast, Union
 
 from rich import get_console, print
+from rich.markup import escape
 from rich.text import Text
 from rich.columns import Columns
 from rich.table import Table
 from rich.tree import Tree
 from rich.progress import track
+from rich.live import Live
+from rich.syntax import Syntax
+from rich.filesize import decimal
 
 from .banner import print_banner
-from .obsidian import ObVaultState, ObVault, ObFile, ObNote
+from .obsidian import ObVaultState, ObVault, ObFile, ObNote, ObRenameResult, ObBatchEditResult
+from .export import ExportResult
+from .graph import GraphExportResult
+from .attachments import AttachmentReport
+from .dupes import DupesResult
+from .obmark import ObTask
+from .textstats import get_vault_text_stats
+from .memory import VaultMemoryReport, PhaseMemory
+from .recent import FileStat
+from .snapshot import SnapshotDiff
 
 console = get_console()
 
@@ -44,6 +58,33 @@ def display_filenames(file_names: Iterable[str]):
     console.print(columns)
 
 
+def display_filenames_live(file_names: Iterable[str]):
+    """边生成边展示文件名，适用于需要边解析边查找的情况"""
+    names = []
+    with Live(Columns(names, equal=True, expand=True), console=console,
+              refresh_per_second=8) as live:
+        for name in file_names:
+            names.append(name)
+            live.update(Columns(names, equal=True, expand=True))
+
+
+def display_file_stats(vault: ObVault, stats: Iterable[FileStat]):
+    """展示文件的修改时间和大小"""
+    table = Table(box=None, show_edge=False)
+    table.add_column('修改时间')
+    table.add_column('大小', justify='right')
+    table.add_column('文件')
+    count = 0
+    for stat in stats:
+        table.add_row(stat.mtime.strftime('%Y-%m-%d %H:%M'), decimal(stat.size),
+                      stat.path.relative_to(vault.path).as_posix())
+        count += 1
+    if count:
+        console.print(table)
+    else:
+        print('没有符合条件的文件。')
+
+
 def display_vault_folders(vault: ObVault):
     """显示文件夹
 
@@ -72,6 +113,8 @@ def display_file_stat(vault: ObVault, name: str, show_back_links=False):
         ob_file = cast(ObNote, ob_file)
         ob_file.parse()
         table.add_row('标签', ','.join(ob_file.tags))
+        text_stats = ob_file.text_stats
+        table.add_row('字数', f'{text_stats.total_words:,}（阅读 {_format_minutes(text_stats.reading_minutes)}）')
         table.add_row('链接', '\n'.join(ob_file.links))
         if show_back_links:
             vault.ensure_all_parsed()
@@ -90,6 +133,12 @@ def display_vault_stat(vault: ObVault, show_tags=False, show_same_names=False):
     table.add_row('📁 文件夹数量', str(len(vault.folders)))
     table.add_row('📄 总文件数量', str(len(vault.files)))
     table.add_row('📝 总笔记数量', str(len(vault.notes)))
+    walk_stats = vault.walk_stats
+    if walk_stats.pruned_folders or walk_stats.ignored_files:
+        table.add_row('🙈 忽略文件夹', str(walk_stats.pruned_folders))
+        table.add_row('🙈 忽略文件', str(walk_stats.ignored_files))
+    if walk_stats.reused_folders:
+        table.add_row('⚡ 未变化的文件夹', str(walk_stats.reused_folders))
     console.print(table)
 
     print()
@@ -118,15 +167,334 @@ def display_vault_stat(vault: ObVault, show_tags=False, show_same_names=False):
     if show_tags:
         vault.ensure_all_parsed()
 
-        print(f'🏷 标签数量：{len(vault.tags)}')
-        tags_table = Table(title="", box=None)
-        tags_table.add_column("标签")
-        tags_table.add_column("数量", justify="center", style="cyan")
-        tags = list(vault.tags.items())
-        tags.sort(key=lambda t: len(t[1]), reverse=True)
-        for tag, tagged_notes in tags:
-            tags_table.add_row(f'{tag}', f'{len(tagged_notes)}')
-        print(tags_table)
+        stats = vault.parse_stats
+        if stats.skipped:
+            print(f'预扫描跳过 {stats.skipped} 篇没有标记的笔记，'
+                  f'完整解析 {stats.parsed} 篇。')
+        display_read_ahead_stats(vault)
+        display_tags(vault)
+
+
+def display_read_ahead_stats(vault: ObVault):
+    """显示最近一次解析的预读计数"""
+    stats = vault.read_ahead_stats
+    if stats is None or not stats.files:
+        return
+    print(f'预读 {stats.files} 篇笔记（{decimal(stats.bytes)}），'
+          f'{decimal(int(stats.throughput))}/s，平均读取 {stats.avg_latency * 1000:.1f} ms，'
+          f'等待读取 {stats.wait_seconds:.2f} 秒，'
+          f'队列深度平均 {stats.avg_depth:.1f} / 最大 {stats.max_depth}')
+    if stats.errors:
+        print(f'[red]{stats.errors}[/] 篇笔记读取失败')
+
+
+def display_tags(vault: ObVault):
+    """显示所有标签及数量"""
+    vault.ensure_all_parsed()
+    print(f'🏷 标签数量：{len(vault.tags)}')
+    tags_table = Table(title="", box=None)
+    tags_table.add_column("标签")
+    tags_table.add_column("数量", justify="center", style="cyan")
+    tags = list(vault.tags.items())
+    tags.sort(key=lambda t: len(t[1]), reverse=True)
+    for tag, tagged_notes in tags:
+        tags_table.add_row(f'{tag}', f'{len(tagged_notes)}')
+    print(tags_table)
+
+
+def display_related_tags(tag: str, related: List[Tuple[str, int, float]], measure: str):
+    """显示相关标签"""
+    if not related:
+        print(f'没有和 {tag} 同时使用的标签。')
+        return
+    table = Table(title=f"和 {tag} 相关的标签", box=None)
+    table.add_column("标签")
+    table.add_column("共同笔记", justify="right", style="cyan")
+    table.add_column(measure, justify="right", style="cyan")
+    for other, both, score in related:
+        table.add_row(other, str(both), f'{score:.3f}')
+    console.print(table)
+
+
+def display_dangling_anchors(vault: ObVault):
+    """显示指向不存在的标题或块的链接"""
+    print()
+    table = Table(title="", box=None)
+    table.add_column("笔记")
+    table.add_column("链接")
+    table.add_column("缺失", style="red")
+    count = 0
+    for note, resolved in vault.iter_dangling_anchors():
+        link = resolved.link
+        anchor = f'^{link.block}' if link.block else link.section
+        table.add_row(note.long_name, resolved.file.name, anchor)
+        count += 1
+    if count:
+        console.print(table)
+    print(f'共 {count} 个链接指向不存在的标题或块。')
+
+
+def display_rename_result(result: ObRenameResult):
+    """显示重命名结果"""
+    print(f'{result.old_name} -> [cyan]{result.file.long_name}[/]')
+    print(f'修改了 {len(result.changed_notes)} 篇笔记中的 {result.links} 个链接。')
+    for note in result.changed_notes:
+        print(f'  {note.long_name}')
+
+
+def display_dupes(result: DupesResult, limit=50):
+    """显示内容相近的笔记"""
+    print()
+    print(f'比较了 {result.notes} 篇笔记（重新计算 {result.computed} 篇），'
+          f'候选 {result.candidates} 对，相近的 {len(result.pairs)} 对。')
+    if not result.pairs:
+        return
+    table = Table(title="", box=None)
+    table.add_column("相似度", justify="right", style="cyan")
+    table.add_column("笔记")
+    table.add_column("笔记")
+    for a, b, similarity in result.pairs[:limit]:
+        table.add_row(f'{similarity:.0%}', a.long_name, b.long_name)
+    console.print(table)
+
+
+def display_tasks(tasks: List[Tuple[ObNote, ObTask]], limit=100):
+    """显示任务列表"""
+    print()
+    if not tasks:
+        print('没有符合条件的任务。')
+        return
+    today = datetime.date.today()
+    table = Table(title="", box=None)
+    table.add_column("", justify="center")
+    table.add_column("任务")
+    table.add_column("截止", style="cyan")
+    table.add_column("位置", style="dim")
+    for note, task in tasks[:limit]:
+        due = ''
+        if task.due:
+            due = task.due.isoformat()
+            if task.open and task.due < today:
+                due = f'[red]{due}[/red]'
+        table.add_row(Text(f'[{task.status}]'), Text(task.text), due, f'{note.long_name}:{task.line}')
+    console.print(table)
+    if len(tasks) > limit:
+        print(f'共 {len(tasks)} 项，只显示前 {limit} 项。')
+
+
+def _format_minutes(minutes: float) -> str:
+    if minutes < 1:
+        return '不到 1 分钟'
+    if minutes < 60:
+        return f'{minutes:.0f} 分钟'
+    return f'{minutes / 60:.1f} 小时'
+
+
+def display_text_stats(vault: ObVault, limit=20):
+    """显示字数统计，按文件夹和标签汇总"""
+    stats = get_vault_text_stats(vault)
+    total = stats.total
+    print()
+    table = Table(title="", box=None,
+                  show_header=False, show_edge=False)
+    table.add_column()
+    table.add_column(justify="right", style="cyan")
+    table.add_row('📝 笔记数量', str(total.notes))
+    table.add_row('🔤 字数', f'{total.total_words:,}')
+    table.add_row('   其中中日文字数', f'{total.cjk:,}')
+    table.add_row('🔡 字符数（不含空白）', f'{total.chars:,}')
+    table.add_row('🔗 链接数', f'{total.links:,}')
+    table.add_row('⏱ 阅读时间', _format_minutes(total.reading_minutes))
+    console.print(table)
+
+    for title, items in (('按文件夹统计', ((p.as_posix(), s) for p, s in stats.by_folder.items()
+                                           if p != Path('.'))),
+                         ('按标签统计', ((f'#{t}', s) for t, s in stats.by_tag.items()))):
+        items = sorted(items, key=lambda kv: kv[1].total_words, reverse=True)[:limit]
+        if not items:
+            continue
+        print()
+        table = Table(title=title, box=None, show_edge=False)
+        table.add_column("")
+        table.add_column("笔记", justify="right")
+        table.add_column("字数", justify="right", style="cyan")
+        table.add_column("链接", justify="right")
+        table.add_column("阅读时间", justify="right")
+        for name, s in items:
+            table.add_row(name, str(s.notes), f'{s.total_words:,}', str(s.links),
+                          _format_minutes(s.reading_minutes))
+        console.print(table)
+
+
+def display_memory_report(report: VaultMemoryReport, phases: Optional[List[PhaseMemory]] = None):
+    """显示仓库各个结构占用的内存"""
+    print()
+    print(f'笔记 {report.notes} 篇，已解析 {report.parsed} 篇，合计 {decimal(report.total)}。')
+    table = Table(title="", box=None, show_edge=False)
+    table.add_column("结构")
+    table.add_column("大小", justify="right", style="cyan")
+    table.add_column("占比", justify="right")
+    table.add_column("每篇笔记", justify="right")
+    total = report.total or 1
+    for name, size in report.sizes.items():
+        table.add_row(name, decimal(size), f'{size / total:.1%}', decimal(int(report.per_note(name))))
+    console.print(table)
+    if not phases:
+        return
+    print()
+    table = Table(title="加载阶段 (tracemalloc)", box=None, show_edge=False)
+    table.add_column("阶段")
+    table.add_column("新增", justify="right", style="cyan")
+    table.add_column("峰值", justify="right")
+    table.add_column("耗时", justify="right")
+    table.add_column("分配最多的位置")
+    for phase in phases:
+        top = '\n'.join(f'{decimal(size)}  {where}' for where, size in phase.top)
+        table.add_row(phase.name, decimal(max(phase.allocated, 0)), decimal(phase.peak),
+                      f'{phase.seconds:.2f}s', top)
+    console.print(table)
+
+
+def display_batch_edit_result(result: ObBatchEditResult, show_diff=False, limit=50):
+    """显示批量修改的结果，预览时显示修改内容（unified diff）"""
+    print()
+    if not result.changes:
+        print(f'没有需要修改的笔记（检查了 {result.unchanged} 篇）。')
+        return
+    verb = '将修改' if result.dry_run else '已修改'
+    print(f'{verb} {len(result.changes)} 篇笔记，{result.unchanged} 篇没有变化。')
+    if show_diff:
+        diff = ''.join(result.iter_diff())
+        console.print(Syntax(diff, 'diff', background_color='default'))
+        if result.dry_run:
+            print('这是预览，去掉 --dry-run 后写入。')
+        return
+    for note in result.changed_notes[:limit]:
+        print(f'  {escape(note.long_name)}')
+    if len(result.changes) > limit:
+        print(f'  ……还有 {len(result.changes) - limit} 篇')
+
+
+def display_export_result(result: ExportResult):
+    """显示导出结果"""
+    print()
+    table = Table(title="", box=None,
+                  show_header=False, show_edge=False)
+    table.add_column()
+    table.add_column(justify="right", style="cyan")
+    table.add_row('📁 输出目录', str(result.out_dir))
+    table.add_row('📝 渲染笔记', str(len(result.rendered)))
+    table.add_row('⏭ 未变化笔记', str(result.skipped))
+    table.add_row('📎 复制附件', str(result.copied))
+    table.add_row('🗑 删除过期文件', str(result.removed))
+    embeds = result.embeds
+    if embeds is not None:
+        table.add_row('🧩 渲染嵌入片段', str(embeds.rendered))
+        table.add_row('♻ 复用嵌入片段', str(embeds.hits))
+        if embeds.cycles or embeds.too_deep:
+            table.add_row('🔁 未展开的嵌入（循环/过深）', f'{embeds.cycles}/{embeds.too_deep}')
+        if embeds.missing:
+            table.add_row('❓ 找不到的嵌入', str(embeds.missing))
+    console.print(table)
+
+
+def display_snapshot_list(snapshots: List[Tuple[str, datetime.datetime, int]]):
+    """显示保存的快照"""
+    if not snapshots:
+        print('还没有保存快照，使用 diff --save 保存。')
+        return
+    table = Table(box=None, show_edge=False)
+    table.add_column('名称')
+    table.add_column('保存时间')
+    table.add_column('大小', justify='right')
+    for name, saved, size in snapshots:
+        table.add_row(name, saved.strftime('%Y-%m-%d %H:%M:%S'), decimal(size))
+    console.print(table)
+
+
+def display_snapshot_diff(diff: SnapshotDiff, limit=100):
+    """显示两个快照之间的变化，每一类最多显示 limit 项"""
+    print()
+    print(f'{diff.old} → {diff.new}')
+    if diff.empty:
+        print('没有变化。')
+        return
+    table = Table(title="", box=None,
+                  show_header=False, show_edge=False)
+    table.add_column()
+    table.add_column(justify="right", style="cyan")
+    table.add_row('➕ 新增', str(len(diff.added)))
+    table.add_row('➖ 删除', str(len(diff.removed)))
+    table.add_row('✏ 修改', str(len(diff.modified)))
+    table.add_row('🚚 移动', str(len(diff.moved)))
+    table.add_row('🏷 标签增加/减少', f'{sum(map(len, diff.tags_added.values()))}'
+                                   f'/{sum(map(len, diff.tags_removed.values()))}')
+    table.add_row('🔗 链接增加/减少', f'{len(diff.links_added)}/{len(diff.links_removed)}')
+    console.print(table)
+
+    def _section(title: str, lines: List[str]):
+        if not lines:
+            return
+        print()
+        print(f'{title}：')
+        for line in lines[:limit]:
+            print(f'  {escape(line)}')
+        if len(lines) > limit:
+            print(f'  ……还有 {len(lines) - limit} 项')
+
+    _section('新增', diff.added)
+    _section('删除', diff.removed)
+    _section('修改', diff.modified)
+    _section('移动', [f'{old} → {new}' for old, new in diff.moved])
+    _section('增加的标签', [f'#{tag}: {", ".join(notes)}' for tag, notes in diff.tags_added.items()])
+    _section('减少的标签', [f'#{tag}: {", ".join(notes)}' for tag, notes in diff.tags_removed.items()])
+    _section('增加的链接', [f'{note} → [[{target}]]' for note, target in diff.links_added])
+    _section('减少的链接', [f'{note} → [[{target}]]' for note, target in diff.links_removed])
+
+
+def display_graph_export_result(result: GraphExportResult):
+    """显示导出图的结果"""
+    print()
+    table = Table(title="", box=None,
+                  show_header=False, show_edge=False)
+    table.add_column()
+    table.add_column(justify="right", style="cyan")
+    table.add_row('📄 输出文件', f'{result.path} ({result.format})')
+    table.add_row('⚪ 节点', f'{result.nodes:,}')
+    table.add_row('➖ 边', f'{result.edges:,}')
+    if result.unresolved:
+        table.add_row('❓ 找不到目标的链接', f'{result.unresolved:,}')
+    console.print(table)
+
+
+def display_attachment_report(report: AttachmentReport,
+                              show_unused=False, show_duplicates=False):
+    """显示附件分析结果"""
+    print()
+    table = Table(title="", box=None,
+                  show_header=False, show_edge=False)
+    table.add_column()
+    table.add_column(justify="right", style="cyan")
+    table.add_row('📎 附件数量', f'{len(report.attachments)} ({decimal(report.total_size)})')
+    table.add_row('🚫 未引用附件', f'{len(report.unused)} ({decimal(report.unused_size)})')
+    table.add_row('👯 重复附件分组', f'{len(report.duplicates)}')
+    table.add_row('♻ 可回收空间', decimal(report.reclaimable))
+    table.add_row('📖 实际读取', decimal(report.bytes_read))
+    console.print(table)
+
+    if show_unused and report.unused:
+        print()
+        print('未引用的附件：')
+        for f in report.unused:
+            print(f'  {f.path.as_posix()}')
+    if show_duplicates:
+        for group in report.duplicates:
+            print()
+            print(f'{decimal(report.sizes[group[0]])} x {len(group)}:')
+            for f in group:
+                print(f'  {f.path.as_posix()}')
+    if not (show_unused and show_duplicates):
+        print(f'\n使用 [cyan]--unused[/] / [cyan]--duplicates[/] 选项显示详细列表\n')
 
 
 def setup_vault(vault: ObVault):
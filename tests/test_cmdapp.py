@@ -0,0 +1,35 @@
+"""命令行中依赖解析结果的命令"""
+import json
+
+import pytest
+
+from obtool import cmdapp
+from obtool.obsidian import ObVault
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    tmp_path.joinpath('.obsidian').mkdir()
+    tmp_path.joinpath('.obsidian', 'app.json').write_text(json.dumps({}), encoding='utf-8')
+    for i in range(20):
+        tags = '#work/daily' if i % 2 else '#home'
+        tmp_path.joinpath(f'n{i}.md').write_text(f'# Note {i}\n\n{tags}\n', encoding='utf-8')
+    monkeypatch.setattr(cmdapp, 'get_vaults_list', lambda: [])
+    app = cmdapp.App()
+    app.vault = ObVault(tmp_path)
+    return app
+
+
+def test_ls_tag_on_cold_vault(app, monkeypatch):
+    """还没有解析的仓库边解析边筛选，第一次就能列出所有笔记"""
+    shown = []
+    monkeypatch.setattr(cmdapp.views, 'display_filenames_live', lambda names: shown.extend(names))
+    assert not app.vault.all_parsed
+    app.onecmd('ls -t work')
+    assert sorted(shown) == sorted(f'n{i}' for i in range(1, 20, 2))
+
+    # 第二次使用已经建立的标签索引
+    shown_again = []
+    monkeypatch.setattr(cmdapp.views, 'display_filenames', lambda names: shown_again.extend(names))
+    app.onecmd('ls -t work/daily')
+    assert sorted(shown_again) == sorted(shown)
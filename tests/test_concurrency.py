@@ -0,0 +1,134 @@
+"""并发解析和查询：其它线程读到的快照始终是一致的"""
+import json
+import random
+import threading
+from pathlib import Path
+
+import pytest
+
+from obtool.obsidian import ObVault
+
+NOTES = 300
+TAGS = ['alpha', 'beta', 'gamma/one', 'gamma/two', 'delta']
+
+
+def _make_vault(root: Path) -> dict:
+    """创建测试仓库，返回每篇笔记的标签（含父标签）和链接目标"""
+    root.joinpath('.obsidian').mkdir(parents=True)
+    root.joinpath('.obsidian', 'app.json').write_text(json.dumps({}), encoding='utf-8')
+    rng = random.Random(39)
+    expected = {}
+    for i in range(NOTES):
+        tags = rng.sample(TAGS, rng.randint(0, 3))
+        targets = sorted({f'n{rng.randrange(NOTES)}' for _ in range(rng.randint(0, 4))})
+        body = ' '.join(f'#{t}' for t in tags) + '\n\n' + ' '.join(f'[[{t}]]' for t in targets) + '\n'
+        root.joinpath(f'n{i}.md').write_text(f'# Note {i}\n\n{body}', encoding='utf-8')
+        levels = {t.rsplit('/', 1)[0] for t in tags} | set(tags)
+        expected[f'n{i}'] = (levels, set(targets))
+    return expected
+
+
+@pytest.fixture
+def vault_and_expected(tmp_path):
+    expected = _make_vault(tmp_path)
+    return ObVault(tmp_path), expected
+
+
+def _check_snapshot(snapshot, expected: dict):
+    """快照中的标签、反链只包含已经在映射中的笔记，和笔记内容一致，并且每篇笔记要么全部在、要么全部不在"""
+    files = set(snapshot.map.values())
+    indexed_tags = {}
+    indexed_links = {}
+    for tag, notes in snapshot.tags.items():
+        assert notes, f'空的标签 {tag}'
+        for note in notes:
+            assert note in files
+            assert tag in expected[note.name][0]
+            indexed_tags.setdefault(note.name, set()).add(tag)
+    for target, notes in snapshot.back_links.items():
+        assert notes, f'空的反链 {target}'
+        for note in notes:
+            assert note in files
+            assert target in expected[note.name][1]
+            indexed_links.setdefault(note.name, set()).add(target)
+    for name, tags in indexed_tags.items():
+        assert tags == expected[name][0], f'{name} 的标签只有一部分在快照中'
+    for name, targets in indexed_links.items():
+        assert targets == expected[name][1], f'{name} 的链接只有一部分在快照中'
+
+
+def test_snapshots_stay_consistent_while_parsing(vault_and_expected):
+    vault, expected = vault_and_expected
+    notes = list(vault.iter_notes())
+    stop = threading.Event()
+    errors = []
+
+    def _reader():
+        last_version = -1
+        try:
+            while not stop.is_set():
+                snapshot = vault.snapshot()
+                assert snapshot.version >= last_version, 'index_version 不能变小'
+                last_version = snapshot.version
+                _check_snapshot(snapshot, expected)
+        except BaseException as e:  # noqa
+            errors.append(e)
+
+    def _refresher():
+        rng = random.Random(1)
+        try:
+            while not stop.is_set():
+                vault.refresh_note(rng.choice(notes))
+        except BaseException as e:  # noqa
+            errors.append(e)
+
+    readers = [threading.Thread(target=_reader) for _ in range(4)]
+    refresher = threading.Thread(target=_refresher)
+    for t in readers + [refresher]:
+        t.start()
+    try:
+        parsed = list(vault.iter_parsed(workers=4))
+        parsed += list(vault.iter_parsed(workers=1))
+    finally:
+        stop.set()
+        for t in readers + [refresher]:
+            t.join()
+    assert not errors, errors[0]
+    assert len(parsed) == 2 * NOTES
+
+    snapshot = vault.snapshot()
+    _check_snapshot(snapshot, expected)
+    assert snapshot.version == vault.index_version
+    for name, (tags, targets) in expected.items():
+        note = snapshot.map[name]
+        for tag in tags:
+            assert note in snapshot.tags[tag]
+        for target in targets:
+            assert note in snapshot.back_links[target]
+
+
+def test_abandoned_iteration_releases_writer(vault_and_expected):
+    vault, expected = vault_and_expected
+    it = vault.iter_parsed(workers=2)
+    for _ in range(10):
+        next(it)
+
+    # 没有结束的遍历不能阻塞其它线程的修改
+    done = threading.Event()
+    note = next(iter(vault.iter_notes()))
+
+    def _refresh():
+        vault.refresh_note(note)
+        done.set()
+
+    t = threading.Thread(target=_refresh)
+    t.start()
+    t.join(timeout=10)
+    assert done.is_set()
+
+    # 在其它线程中结束遍历也可以
+    t = threading.Thread(target=it.close)
+    t.start()
+    t.join(timeout=10)
+    assert not t.is_alive()
+    _check_snapshot(vault.snapshot(), expected)
@@ -0,0 +1,27 @@
+"""Frontmatter 属性查询"""
+import pytest
+
+from obtool.properties import PropertyIndex, split_conditions
+
+
+def test_split_conditions_keeps_quoted_and():
+    assert split_conditions('genre = "rock and roll" AND rating > 3') == ['genre = "rock and roll"', 'rating > 3']
+    assert split_conditions("title = 'this and that'") == ["title = 'this and that'"]
+
+
+@pytest.fixture
+def index():
+    index = PropertyIndex()
+    index.add('a', {'genre': 'rock and roll', 'rating': 5})
+    index.add('b', {'genre': 'rock', 'rating': 2})
+    index.add('c', {'genre': 'rock and roll', 'rating': 1})
+    return index
+
+
+def test_query_quoted_value(index):
+    assert index.query('genre = "rock and roll"') == {'a', 'c'}
+    assert index.query('genre = "rock and roll" and rating > 3') == {'a'}
+
+
+def test_sort_desc(index):
+    assert index.sort('abc', 'rating', reverse=True) == ['a', 'b', 'c']
@@ -0,0 +1,31 @@
+"""按修改时间排序的文件索引：在外部新增、修改、删除的文件"""
+import json
+import os
+
+from obtool.obsidian import ObVault
+
+
+def test_refresh_mtime_index(tmp_path):
+    tmp_path.joinpath('.obsidian').mkdir()
+    tmp_path.joinpath('.obsidian', 'app.json').write_text(json.dumps({}), encoding='utf-8')
+    for i in range(20):
+        path = tmp_path.joinpath(f'n{i}.md')
+        path.write_text('x', encoding='utf-8')
+        os.utime(path, (1000 + i, 1000 + i))
+    vault = ObVault(tmp_path)
+    assert [s.path.name for s in vault.mtime_index.select('mtime', 2)] == ['n19.md', 'n18.md']
+    recent = vault.mtime_index.iter_recent()
+    next(recent)
+
+    tmp_path.joinpath('n3.md').write_text('edited', encoding='utf-8')
+    tmp_path.joinpath('sub').mkdir()
+    tmp_path.joinpath('sub', 'new.md').write_text('new', encoding='utf-8')
+    os.utime(tmp_path.joinpath('sub', 'new.md'), (5000, 5000))
+    tmp_path.joinpath('n19.md').unlink()
+
+    index = vault.refresh_mtime_index()
+    assert [s.path.name for s in index.select('mtime', 3)] == ['n3.md', 'new.md', 'n18.md']
+    assert len(index) == 20
+    assert vault.get_file('new').exists
+    # 刷新之前开始的遍历不受影响
+    assert len(list(recent)) == 19
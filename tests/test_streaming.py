@@ -0,0 +1,46 @@
+"""大笔记逐行提取：内存占用和文件大小无关"""
+import tracemalloc
+from pathlib import Path
+
+from obtool.obmark import STREAM_NOTE_SIZE, parse_note
+
+# 笔记的大小是逐行提取阈值的 4 倍，内存峰值不能超过这个固定的上限
+NOTE_SIZE = 4 * STREAM_NOTE_SIZE
+PEAK_LIMIT = 4 * 1024 * 1024
+LINE = 'Lorem ipsum dolor sit amet, 中文内容 consectetur adipiscing elit.\n'
+SECTION_EVERY = 2000
+
+
+def _write_big_note(path: Path) -> int:
+    """生成大笔记，返回其中链接的数量"""
+    links = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('---\ntitle: big\n---\n# Big\n')
+        i = 0
+        while f.tell() < NOTE_SIZE:
+            i += 1
+            if i % SECTION_EVERY == 0:
+                f.write(f'## Section {i}\n\n[[target {i}]] #tag{i}\n\n')
+                links += 1
+            f.write(LINE)
+    return links
+
+
+def test_parse_big_note_peak_memory(tmp_path):
+    path = tmp_path.joinpath('big.md')
+    links = _write_big_note(path)
+    assert path.stat().st_size > NOTE_SIZE
+
+    tracemalloc.start()
+    try:
+        marks = parse_note(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert marks.streamed
+    assert marks.meta == {'title': 'big'}
+    assert len(marks.links) == links
+    assert len(marks.headings) == links + 1
+    assert marks.stats.words > 0
+    assert peak < PEAK_LIMIT, f'峰值 {peak} 字节'